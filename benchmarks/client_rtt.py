@@ -0,0 +1,61 @@
+import time
+import statistics
+
+from netframe import Server, Client, Message, OwnedMessage, ServerApp, ContextT, Config
+
+
+IP = "127.0.0.1"
+PORT = 50020
+ROUND_TRIPS = 20000
+BURST = 1000
+PAYLOAD_SIZES = (16, 1024, 64*1024)
+
+
+class EchoApp(ServerApp):
+    def __init__(self, context: ContextT): ...
+
+    def on_message(self, msg: OwnedMessage):
+        msg.owner.send(msg.msg)
+
+
+def rtt(client: Client, payloadSize: int) -> list[float]:
+    msg = Message()
+    msg.append(bytes(payloadSize))
+
+    samples = []
+    for _ in range(ROUND_TRIPS):
+        start = time.perf_counter()
+        client.send(msg)
+        client.recv()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def throughput(client: Client, payloadSize: int) -> float:
+    '''Sends msgs in bursts, returns msgs echoed per second'''
+    msg = Message()
+    msg.append(bytes(payloadSize))
+
+    start = time.perf_counter()
+    for _ in range(ROUND_TRIPS // BURST):
+        for _ in range(BURST):
+            client.send(msg)
+        for _ in range(BURST):
+            client.recv()
+    return ROUND_TRIPS / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    server = Server(Config(EchoApp, ip=IP, port=PORT))
+    server.start()
+
+    client = Client()
+    client.connect(IP, PORT)
+    for size in PAYLOAD_SIZES:
+        samples = sorted(rtt(client, size))
+        print(f"payload {size:>6} B: median {statistics.median(samples)*1e6:7.1f} us, "
+              f"p99 {samples[int(len(samples)*0.99)]*1e6:7.1f} us, "
+              f"burst of {BURST}: {throughput(client, size):8.0f} msg/s")
+    client.shutdown()
+
+    server.stop()
\ No newline at end of file
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import asyncio
+import statistics
+
+from netframe import Server, AsyncClient, Message, OwnedMessage, ServerApp, ContextT, Config
+
+
+IP = "127.0.0.1"
+PORT = 50021
+WORKER_NUM = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+CONNECTIONS = 64
+DURATION = 10
+PAYLOAD_SIZE = 256
+
+
+class EchoApp(ServerApp):
+    def __init__(self, context: ContextT): ...
+
+    def on_message(self, msg: OwnedMessage):
+        msg.owner.send(msg.msg)
+
+
+async def echo_loop(client: AsyncClient, deadline: float, samples: list[float]):
+    '''Sends msgs one after another, every msg is sent once the previous one is echoed'''
+    msg = Message()
+    msg.append(bytes(PAYLOAD_SIZE))
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await client.send(msg)
+        await client.recv()
+        samples.append(time.perf_counter() - start)
+
+
+async def measure() -> list[float]:
+    clients = [AsyncClient() for _ in range(CONNECTIONS)]
+    for client in clients:
+        await client.connect(IP, PORT)
+
+    samples: list[float] = []
+    deadline = time.perf_counter() + DURATION
+    await asyncio.gather(*(echo_loop(client, deadline, samples) for client in clients))
+
+    for client in clients:
+        await client.shutdown()
+    return samples
+
+
+if __name__ == "__main__":
+    policies = sys.argv[1:] or ["none", "auto"]
+    for policy in policies:
+        config = Config(EchoApp, ip=IP, port=PORT, workerNum=WORKER_NUM, 
+                        cpuAffinity="auto" if policy == "auto" else None)
+        server = Server(config)
+        server.start()
+        time.sleep(1)
+
+        samples = sorted(asyncio.run(measure()))
+        print(f"affinity {policy:>4}: {WORKER_NUM} workers, {CONNECTIONS} connections, "
+              f"{len(samples)/DURATION:8.0f} msg/s, median {statistics.median(samples)*1e6:7.1f} us, "
+              f"p99 {samples[int(len(samples)*0.99)]*1e6:7.1f} us, "
+              f"p99.9 {samples[int(len(samples)*0.999)]*1e6:7.1f} us")
+
+        server.stop()
+        time.sleep(1)
\ No newline at end of file
@@ -0,0 +1,61 @@
+import timeit
+import tracemalloc
+
+from netframe import Message, OwnedMessage
+try:
+    from netframe import MessagePool
+except ImportError:
+    MessagePool = None
+
+
+MSG_COUNT = 100000
+FRAME = Message(Message.Header(id=1, size=32), bytearray(32)).pack()
+
+
+def memory_per_message() -> float:
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    msgs = [OwnedMessage(None, Message(Message.Header(1, 32), bytearray(32))) for _ in range(MSG_COUNT)]
+    end = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    allocated = sum(stat.size_diff for stat in end.compare_to(start, 'filename'))
+    del msgs
+    return allocated / MSG_COUNT
+
+
+def header_codec():
+    hdr = Message.Header()
+    for _ in range(MSG_COUNT):
+        hdr.unpack(FRAME)
+        hdr.pack()
+
+
+def receive_loop():
+    # what the receive path does for every frame
+    for _ in range(MSG_COUNT):
+        msg = Message()
+        msg.hdr.unpack(FRAME)
+        msg.payload = bytearray(FRAME[Message.Header.HEADER_LEN:])
+        OwnedMessage(None, msg)
+
+
+def receive_loop_pooled():
+    pool = MessagePool(1024)
+    for _ in range(MSG_COUNT):
+        msg = pool.get(*Message.Header.CODEC.unpack_from(FRAME), bytearray(FRAME[Message.Header.HEADER_LEN:]))
+        OwnedMessage(None, msg)
+        msg.release()
+
+
+def run(name: str, func):
+    best = min(timeit.repeat(func, number=1, repeat=5))
+    print(f"{name:<28}{best / MSG_COUNT * 1e9:10.1f} ns/msg")
+
+
+if __name__ == "__main__":
+    print(f"{'memory':<28}{memory_per_message():10.1f} bytes/msg")
+    run("header pack + unpack", header_codec)
+    run("receive loop", receive_loop)
+    if MessagePool is not None:
+        run("receive loop, pooled", receive_loop_pooled)
@@ -0,0 +1,64 @@
+import os
+import timeit
+
+from netframe import Message
+
+
+FIELD_COUNT = 10000
+FIELDS = [os.urandom(16).hex().encode() for _ in range(FIELD_COUNT)]
+FILE = os.urandom(64 * 1024 * 1024)
+
+
+def build_append():
+    msg = Message()
+    for field in FIELDS:
+        msg.append(len(field).to_bytes(1, 'little'))
+        msg.append(field)
+    return msg.pack()
+
+
+def build_reserve():
+    msg = Message()
+    msg.reserve(sum(1 + len(field) for field in FIELDS))
+    for field in FIELDS:
+        msg.append(len(field).to_bytes(1, 'little'))
+        msg.append(field)
+    return msg.pack_buffers()
+
+
+def build_chunks():
+    msg = Message()
+    for field in FIELDS:
+        msg.append(len(field).to_bytes(1, 'little'), copy=False)
+        msg.append(field, copy=False)
+    return msg.pack_buffers()
+
+
+def build_file_append():
+    msg = Message()
+    msg.append(len(FILE).to_bytes(4, 'little'))
+    msg.append(FILE)
+    return msg.pack()
+
+
+def build_file_chunks():
+    msg = Message()
+    msg.append(len(FILE).to_bytes(4, 'little'))
+    msg.append(FILE, copy=False)
+    return msg.pack_buffers()
+
+
+def run(name: str, func, number: int):
+    best = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{name:<32}{best*1e3:10.3f} ms")
+
+
+if __name__ == "__main__":
+    print(f"{FIELD_COUNT} small fields:")
+    run("append + pack", build_append, 20)
+    run("reserve + append + pack_buffers", build_reserve, 20)
+    run("append(copy=False) + pack_buffers", build_chunks, 20)
+
+    print(f"\n{len(FILE) >> 20} MiB file:")
+    run("append + pack", build_file_append, 5)
+    run("append(copy=False) + pack_buffers", build_file_chunks, 5)
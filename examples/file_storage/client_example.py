@@ -10,32 +10,24 @@ def req_add(client: Client, filename: str, size: int):
     req = fs_add()
     req.filename = filename
     req.file = os.urandom(size)
-    client.send(req.pack())
-
-    handle_resp(client.recv(), [PROTOCOL.ACK])
+    handle_resp(client.request(req.pack()).result(), [PROTOCOL.ACK])
 
 
 def req_get(client: Client, filename: str):
     req = fs_get()
     req.filename = filename
-    client.send(req.pack())
-
-    handle_resp(client.recv(), [PROTOCOL.GET_RESP, PROTOCOL.ACK])
+    handle_resp(client.request(req.pack()).result(), [PROTOCOL.GET_RESP, PROTOCOL.ACK])
 
 
 def req_del(client: Client, filename: str):
     req = fs_del()
     req.filename = filename
-    client.send(req.pack())
-
-    handle_resp(client.recv(), [PROTOCOL.ACK])
+    handle_resp(client.request(req.pack()).result(), [PROTOCOL.ACK])
 
 
 def req_list(client: Client):
     pkt = fs_list()
-    client.send(pkt.pack())
-
-    handle_resp(client.recv(), [PROTOCOL.LIST_RESP])
+    handle_resp(client.request(pkt.pack()).result(), [PROTOCOL.LIST_RESP])
 
 
 def handle_resp(resp: Message, expected: list[int]):
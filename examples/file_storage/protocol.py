@@ -43,21 +43,27 @@ class fs_file_op(fs_packet):
     def unpack(self, msg: Message):
         self.id = msg.hdr.id
         fileNameLen = int.from_bytes(msg.pop(FILE_NAME_FIELD_SIZE), 'little')
-        self.filename = msg.pop(fileNameLen).decode()
+        self.filename = str(msg.pop(fileNameLen), 'utf-8')
 
 
 class fs_file_transfer(fs_file_op):
     def __init__(self, id) -> None:
         super().__init__(id)
-        self.file: bytes = b''
+        self.file: bytes | memoryview = b''
 
     def pack(self) -> Message:
         msg = super().pack()
         msg.append(len(self.file).to_bytes(FILE_LEN_FIELD_SIZE, 'little'))
-        msg.append(self.file)
+        msg.append(self.file, copy=False)
 
         return msg
 
+    def pack_prefix(self, fileLen: int) -> bytes:
+        '''Packs the fields that precede the file, so the file can be sent separately'''
+        filenameBytes = self.filename.encode()
+        return len(filenameBytes).to_bytes(FILE_NAME_FIELD_SIZE, 'little') + filenameBytes + \
+               fileLen.to_bytes(FILE_LEN_FIELD_SIZE, 'little')
+
     def unpack(self, msg: Message):
         super().unpack(msg)
         fileLen = int.from_bytes(msg.pop(FILE_LEN_FIELD_SIZE), 'little')
@@ -102,11 +108,12 @@ class fs_list_resp(fs_packet):
     def pack(self):
         msg = super().pack()
         msg.append(len(self.filenameToSize).to_bytes(self.FILE_COUNT_FIELD_SIZE, 'little'))
+        # fields are freshly created objects, no need to copy them
         for filename, size in self.filenameToSize.items():
             filenameBytes = filename.encode()
-            msg.append(len(filenameBytes).to_bytes(FILE_NAME_FIELD_SIZE, 'little'))
-            msg.append(filenameBytes)
-            msg.append(size.to_bytes(FILE_LEN_FIELD_SIZE, 'little'))
+            msg.append(len(filenameBytes).to_bytes(FILE_NAME_FIELD_SIZE, 'little'), copy=False)
+            msg.append(filenameBytes, copy=False)
+            msg.append(size.to_bytes(FILE_LEN_FIELD_SIZE, 'little'), copy=False)
 
         return msg
 
@@ -116,7 +123,7 @@ class fs_list_resp(fs_packet):
         fileCount = int.from_bytes(msg.pop(self.FILE_COUNT_FIELD_SIZE), 'little')
         for _ in range(fileCount):
             filenameLen = int.from_bytes(msg.pop(FILE_NAME_FIELD_SIZE), 'little')
-            filename = msg.pop(filenameLen).decode()
+            filename = str(msg.pop(filenameLen), 'utf-8')
             size = int.from_bytes(msg.pop(FILE_LEN_FIELD_SIZE), 'little')
             
             self.filenameToSize[filename] = size
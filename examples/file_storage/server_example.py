@@ -3,14 +3,19 @@ import sys
 import time
 import multiprocessing
 
-from netframe import Server, Connection, OwnedMessage, Config, ServerApp, ContextT
+from netframe import Server, Connection, OwnedMessage, Config, ServerApp, ContextT, RECV_ENGINE, SharedCache
 from protocol import PROTOCOL, fs_add, fs_del, fs_get, fs_get_resp, fs_list_resp, fs_ack
 
 
+# files up to that size are kept in the cache shared by workers
+CACHED_FILE_MAX_SIZE = 64 * 1024
+
 class App(ServerApp):
     def __init__(self, context: ContextT):
         self.storageLock = context['lock']
         self.storagePath = context['path']
+        # changed only under storageLock, so it always matches the disk, but read without it
+        self.cache: SharedCache = context[SharedCache.CONTEXT_KEY]
 
         self.handlers = { 
             getattr(PROTOCOL, f"{cmd.upper()}") : getattr(self, f"handle_{cmd}")
@@ -29,9 +34,14 @@ class App(ServerApp):
 
 
     def on_message(self, msg: OwnedMessage):
+        # fields are extracted as views of the payload, e.g. uploaded file isn't copied
+        msg.msg.zeroCopy = True
+
         defaultHandler = lambda msg: msg.owner.shutdown()
         handler = self.handlers.get(msg.msg.hdr.id, defaultHandler)
         handler(msg)
+
+        msg.msg.release()
         
 
     def handle_add(self, msg: OwnedMessage):
@@ -46,9 +56,11 @@ class App(ServerApp):
             if not os.path.exists(path):
                 with open(path, 'wb') as file:
                     file.write(req.file)
+                if len(req.file) <= CACHED_FILE_MAX_SIZE:
+                    self.cache.set(req.filename, req.file)
                 resp.rc = fs_ack.RC.OK
 
-        msg.owner.send(resp.pack())
+        msg.reply(resp.pack())
 
 
     def handle_del(self, msg: OwnedMessage):
@@ -62,27 +74,50 @@ class App(ServerApp):
         with self.storageLock:
             if os.path.exists(path):
                 os.remove(path)
+                self.cache.delete(req.filename)
                 resp.rc = fs_ack.RC.OK
 
-        msg.owner.send(resp.pack())
+        msg.reply(resp.pack())
 
 
     def handle_get(self, msg: OwnedMessage):
         req = fs_get()
         req.unpack(msg.msg)
 
+        # hot files are served by any worker without the lock and the disk
+        data = self.cache.get(req.filename)
+        if data is not None:
+            self.reply_file(msg, req.filename, data)
+            return
+
         path = os.path.join(self.storagePath, req.filename)
         with self.storageLock:
+            if os.path.exists(path) and os.path.getsize(path) <= CACHED_FILE_MAX_SIZE:
+                with open(path, 'rb') as file:
+                    data = file.read()
+                self.cache.set(req.filename, data)
+                self.reply_file(msg, req.filename, data)
+                return
+
             if os.path.exists(path):
                 resp = fs_get_resp()
                 resp.filename = req.filename
-                with open(path, 'rb') as file:
-                    resp.file = file.read()
-            else:
-                resp = fs_ack()
-                resp.rc = fs_ack.RC.FILE_NOT_FOUND
+                # file is sent straight from the disk with sendfile, the file is opened 
+                # right away, so on POSIX it can be safely deleted once the lock is released
+                prefix = resp.pack_prefix(os.path.getsize(path))
+                msg.owner.send_file(resp.id, path, prefix=prefix, corrId=msg.msg.hdr.corrId)
+                return
+
+        resp = fs_ack()
+        resp.rc = fs_ack.RC.FILE_NOT_FOUND
+        msg.reply(resp.pack())
+
 
-        msg.owner.send(resp.pack())
+    def reply_file(self, msg: OwnedMessage, filename: str, data: bytes):
+        resp = fs_get_resp()
+        resp.filename = filename
+        resp.file = data
+        msg.reply(resp.pack())
 
 
     def handle_list(self, msg: OwnedMessage):
@@ -93,7 +128,7 @@ class App(ServerApp):
                 path = os.path.join(self.storagePath, filename)
                 resp.filenameToSize[filename] = os.path.getsize(path)
 
-        msg.owner.send(resp.pack())
+        msg.reply(resp.pack())
 
 
 if __name__ == "__main__":
@@ -110,7 +145,7 @@ if __name__ == "__main__":
     context['lock'] = multiprocessing.Lock()
     context['path'] = path
 
-    config = Config(App, context, workerNum=4)
+    config = Config(App, context, workerNum=4, recvEngine=RECV_ENGINE.BUFFERED, sharedCacheSize=64*1024*1024)
     server = Server(config)
     server.start()
 
@@ -1,7 +1,12 @@
-from .server import Server
+from .server import Server, ServerStats
+from .load_table import WorkerLoad
 from .connection import Connection
-from .message import Message, OwnedMessage
+from .compression import CompressionStats
+from .shared_cache import SharedCache, SharedCacheStats
+from .message import Message, OwnedMessage, MessagePool
 from .client import Client
-from .config import Config, ServerApp, ContextT
+from .async_client import AsyncClient
+from .client_pool import ClientPool, ClientPoolStats
+from .config import Config, ServerApp, ContextT, RECV_ENGINE, SLOW_CONSUMER_POLICY, offload
 
-__all__ = ['Server', 'Connection', 'Message', 'OwnedMessage', 'Client', 'Config', 'ServerApp', 'ContextT']
\ No newline at end of file
+__all__ = ['Server', 'ServerStats', 'WorkerLoad', 'Connection', 'CompressionStats', 'SharedCache', 'SharedCacheStats', 'Message', 'OwnedMessage', 'MessagePool', 'Client', 'AsyncClient', 'ClientPool', 'ClientPoolStats', 'Config', 'ServerApp', 'ContextT', 'RECV_ENGINE', 'SLOW_CONSUMER_POLICY', 'offload']
\ No newline at end of file
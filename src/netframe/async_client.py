@@ -0,0 +1,221 @@
+import asyncio
+import logging
+
+from netframe.config import RECV_ENGINE
+from netframe.message import Message, OwnedMessage
+from netframe.connection import Connection, ConnOwner
+from netframe.buffered_connection import FrameProtocol
+from netframe.compression import CompressionStats
+from netframe.util import setup_logging
+
+
+class AsyncClient(ConnOwner):
+    '''
+    Client that runs the connection directly in the caller's event loop,
+    without a worker process. All methods must be called from the same loop
+    '''
+
+    # default amount of bytes waiting to be sent at which send() starts to wait
+    SEND_BUFFER_SIZE = 1024*1024
+
+    def __init__(self, recvEngine: RECV_ENGINE = RECV_ENGINE.STREAM,
+                       recvBufferSize: int = 64*1024,
+                       compressMinSize: int = 0,
+                       compressLevel: int = 1,
+                       compressContext: bool = False,
+                       sendBufferSize: int = SEND_BUFFER_SIZE):
+        '''
+        Parameters:
+            recvEngine: selects how the connection receives data, see Config
+            recvBufferSize: initial size of the receive buffer used by RECV_ENGINE.BUFFERED
+            compressMinSize, compressLevel, compressContext: compression of sent msgs, see Config
+            sendBufferSize: once more than that waits to be sent, send() waits until 
+                            a quarter of it is left, 0 disables the limit
+        '''
+        self._recvEngine = recvEngine
+        self._recvBufferSize = recvBufferSize
+        self._sendBufferSize = sendBufferSize
+        self._compressMinSize = compressMinSize
+        self._compressLevel = compressLevel
+        self._compressContext = compressContext
+        self._compressionStats = CompressionStats()
+
+        self._connection: Connection | None = None
+        # received msgs, None signals that connection is lost
+        self._inQueue = asyncio.Queue[Message | None]()
+
+        # requests waiting for a response, by correlation id
+        self._requests: dict[int, asyncio.Future[Message]] = {}
+        self._nextCorrId = 0
+
+        setup_logging()
+        self._logger = logging.getLogger("netframe.error")
+
+
+    async def connect(self, ip: str, port: int):
+        if self._connection is not None:
+            raise RuntimeError("Client already connected")
+
+        try:
+            if self._recvEngine == RECV_ENGINE.BUFFERED:
+                connected = asyncio.get_running_loop().create_future()
+                await asyncio.get_running_loop().create_connection(
+                    lambda: FrameProtocol(self, connected.set_result, self._recvBufferSize), ip, port)
+                connection = await connected
+            else:
+                reader, writer = await asyncio.open_connection(ip, port)
+                connection = Connection(reader, writer, self)
+        except Exception as e:
+            self._logger.error(f"Connect failed: {e}")
+            raise
+
+        self._inQueue = asyncio.Queue[Message | None]()
+        self._connection = connection
+        # the socket is still read while the server doesn't keep up, it 
+        # may wait for its msgs to be received before it reads more
+        self._connection.set_write_limits(self._sendBufferSize, self._sendBufferSize // 4, pauseReading=False)
+        self._connection.set_compression(self._compressMinSize, self._compressLevel, self._compressContext, 
+                                         stats=self._compressionStats)
+        self._connection.recv()
+
+
+    async def send(self, msg: Message):
+        '''Schedules msg for sending, waits first while too much is waiting to be sent already'''
+        if self._connection is None:
+            raise RuntimeError("Client is not connected")
+
+        connection = self._connection
+        await connection.wait_writable()
+        if not connection.isActive:
+            raise ConnectionResetError("Connection lost")
+
+        connection.send(msg)
+
+
+    async def recv(self, timeout: float | None=None) -> Message:
+        '''
+        Waits for a new msg at most timeout seconds, throws TimeoutError if
+        it has not arrived by that time
+        '''
+        if self._connection is None:
+            raise RuntimeError("Client is not connected")
+
+        try:
+            msg = await asyncio.wait_for(self._inQueue.get(), timeout)
+        except asyncio.TimeoutError:
+            # before 3.11 it isn't the builtin TimeoutError
+            raise TimeoutError("Timed out waiting for a msg") from None
+        if msg is None:
+            # keep the mark for subsequent calls
+            self._inQueue.put_nowait(None)
+            raise ConnectionResetError("Connection lost")
+
+        return msg
+
+
+    def request(self, msg: Message, timeout: float | None=None) -> asyncio.Future[Message]:
+        '''
+        Sends msg tagged with a new correlation id, returns a future that is 
+        resolved with the response, see Client.request()
+        '''
+        if self._connection is None:
+            raise RuntimeError("Client is not connected")
+        if not self._connection.isActive:
+            raise ConnectionResetError("Connection lost")
+
+        corrId = self._nextCorrId
+        while corrId in self._requests:
+            corrId = (corrId + 1) % Message.Header.CORR_ID_LIMIT
+        self._nextCorrId = (corrId + 1) % Message.Header.CORR_ID_LIMIT
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._requests[corrId] = future
+        timer = None
+        if timeout is not None:
+            timer = loop.call_later(timeout, self._expire_request, corrId)
+        def cleanup(_: asyncio.Future):
+            # the future could be resolved, expired or cancelled by user
+            self._requests.pop(corrId, None)
+            if timer is not None:
+                timer.cancel()
+        future.add_done_callback(cleanup)
+
+        msg.hdr.corrId = corrId
+        try:
+            self._connection.send(msg)
+        except ValueError:
+            # removes the request and its timer
+            future.cancel()
+            raise
+        return future
+
+
+    async def shutdown(self, timeout: float | None=None):
+        '''
+        Sends all scheduled msgs and closes the connection. Waits for the
+        peer to close its side within timeout, aborts the connection after
+        timeout expires
+        '''
+        if self._connection is None:
+            raise RuntimeError("Client is not connected")
+
+        connection, self._connection = self._connection, None
+        connection.shutdown()
+        try:
+            await asyncio.wait_for(connection.wait_closed(), timeout)
+        except asyncio.TimeoutError:
+            connection.abort()
+            await connection.wait_closed()
+
+        self._fail_requests(ConnectionResetError("Connection closed"))
+
+
+    def compression_stats(self) -> CompressionStats:
+        '''Returns compression counters of all connections made by the client'''
+        return self._compressionStats
+
+
+    def pending_requests(self) -> int:
+        '''Number of requests waiting for a response'''
+        return len(self._requests)
+
+
+    # ConnOwner protocol method
+    def process_msg(self, msg: OwnedMessage):
+        if not self._resolve_request(msg.msg):
+            self._inQueue.put_nowait(msg.msg)
+
+
+    # ConnOwner protocol method
+    def process_disconnect(self, conn: Connection):
+        self._fail_requests(ConnectionResetError("Connection lost"))
+        self._inQueue.put_nowait(None)
+
+
+    def _resolve_request(self, msg: Message) -> bool:
+        '''
+        Returns False if msg isn't a response. Late response to a request
+        that has timed out or was cancelled is dropped
+        '''
+        if msg.hdr.corrId is None:
+            return False
+
+        future = self._requests.pop(msg.hdr.corrId, None)
+        # cancelled future stays in _requests until its done callback runs
+        if future is not None and not future.done():
+            future.set_result(msg)
+        return True
+
+
+    def _fail_requests(self, exc: BaseException):
+        requests, self._requests = self._requests, {}
+        for future in requests.values():
+            if not future.done():
+                future.set_exception(exc)
+
+
+    def _expire_request(self, corrId: int):
+        future = self._requests.pop(corrId, None)
+        if future is not None and not future.done():
+            future.set_exception(TimeoutError("Request timed out"))
\ No newline at end of file
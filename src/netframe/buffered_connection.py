@@ -0,0 +1,314 @@
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Iterable
+
+import zlib
+import asyncio
+
+from netframe.message import Message, MessagePool, OwnedMessage
+from netframe.recv_buffer import RecvBuffer
+from netframe.connection import Connection, ConnOwner
+
+
+class FrameProtocol(asyncio.BufferedProtocol):
+    '''
+    Receive engine built on asyncio.BufferedProtocol. Socket data is read
+    straight into a preallocated per-connection buffer and every complete
+    frame found after a read is handed to the connection. Also serves as
+    the connection's writer, mirroring the parts of asyncio.StreamWriter
+    that Connection relies on
+    '''
+
+    def __init__(self, owner: ConnOwner,
+                       onConnect: Callable[[Connection], Any],
+                       bufferSize: int,
+                       pool: MessagePool | None = None):
+        '''
+        Parameters:
+            owner: owner of the connection that is going to be created
+            onConnect: called with the new connection once transport is established
+            bufferSize: initial size of the receive buffer
+            pool: if set, received messages are taken from it
+        '''
+        self._owner = owner
+        self._onConnect = onConnect
+        self._recvBuffer = RecvBuffer(bufferSize, pool)
+
+        self.transport: asyncio.Transport
+        self._connection: BufferedConnection
+
+        self._discarding = False
+        self._eof = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._lostExc: BaseException | None = None
+
+        self._writePaused = False
+        self._drainWaiters: list[asyncio.Future] = []
+
+
+    # asyncio.BufferedProtocol methods
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        assert isinstance(transport, asyncio.Transport)
+        self.transport = transport
+        # nothing is read until the owner decides to accept the connection
+        self.transport.pause_reading()
+
+        self._connection = BufferedConnection(self, self._owner)
+        self._onConnect(self._connection)
+
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self._recvBuffer.get_buffer(sizehint)
+
+
+    def buffer_updated(self, nbytes: int):
+        inPlace = self._recvBuffer.receiving_in_place()
+        self._recvBuffer.buffer_updated(nbytes)
+        if self._discarding:
+            self._recvBuffer.clear()
+        elif inPlace:
+            # transport holds a view of the payload until this method returns,
+            # defer the delivery, so the payload can be resized by the owner
+            asyncio.get_running_loop().call_soon(self._connection._process_frames)
+        else:
+            self._connection._process_frames()
+
+
+    def eof_received(self) -> bool:
+        self._eof.set()
+        self._connection._process_frames()
+        # keep the transport open, connection closes it on shutdown
+        return True
+
+
+    def connection_lost(self, exc: Exception | None):
+        self._lostExc = exc if exc else ConnectionResetError("Connection lost")
+        for waiter in self._drainWaiters:
+            if not waiter.done():
+                waiter.set_exception(self._lostExc)
+        self._drainWaiters.clear()
+
+        self._eof.set()
+        self._closed.set()
+        self._connection._process_frames()
+
+
+    def pause_writing(self):
+        self._writePaused = True
+
+
+    def resume_writing(self):
+        self._writePaused = False
+        for waiter in self._drainWaiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._drainWaiters.clear()
+
+
+    # receive side, used by BufferedConnection
+
+    def pop_frame(self) -> Message | None:
+        return self._recvBuffer.pop_frame()
+
+
+    def pop_chunk(self) -> bytes | None:
+        return self._recvBuffer.pop_chunk()
+
+
+    def streaming(self) -> bool:
+        return self._recvBuffer.streaming()
+
+
+    def set_stream_threshold(self, threshold: int):
+        self._recvBuffer.streamThreshold = threshold
+
+
+    def at_eof(self) -> bool:
+        return self._eof.is_set()
+
+
+    def pause_reading(self):
+        self.transport.pause_reading()
+
+
+    def resume_reading(self):
+        self.transport.resume_reading()
+
+
+    async def discard_incoming(self):
+        '''Throws away incoming data until peer closes the connection'''
+        self._discarding = True
+        self._recvBuffer.clear()
+        self.transport.resume_reading()
+        await self._eof.wait()
+
+
+    # writer side, used by Connection
+
+    def write(self, data: bytes):
+        self.transport.write(data)
+
+
+    def writelines(self, data: Iterable[bytes]):
+        self.transport.writelines(data)
+
+
+    async def drain(self):
+        if self._lostExc is not None:
+            raise ConnectionResetError("Connection lost")
+        if not self._writePaused:
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._drainWaiters.append(waiter)
+        await waiter
+
+
+    def close(self):
+        self.transport.close()
+
+
+    def is_closing(self) -> bool:
+        return self.transport.is_closing()
+
+
+    async def wait_closed(self):
+        await self._closed.wait()
+
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        return self.transport.get_extra_info(name, default)
+
+
+class BufferedConnection(Connection):
+    '''
+    Connection that receives data via FrameProtocol instead of StreamReader.
+    Frames are delivered to the owner as soon as they are parsed, all the
+    frames from a single socket read are delivered at once via process_msgs()
+    '''
+
+    def __init__(self, protocol: FrameProtocol, owner: ConnOwner):
+        super().__init__(None, protocol, owner) # type: ignore[arg-type]
+        self._protocol = protocol
+        self._receiving = False
+
+        # msg which payload is being streamed and whether the owner knows about it
+        self._streamMsg: OwnedMessage | None = None
+        self._streamStarted = False
+
+
+    def recv(self):
+        if self._receiving or not self.isActive:
+            return
+
+        self._receiving = True
+        self._protocol.resume_reading()
+        # frames that arrived before the connection was accepted
+        self._process_frames()
+
+
+    def _pause_reading(self):
+        # frames that are already received stay buffered
+        self._readingPaused = True
+        self._protocol.pause_reading()
+
+
+    def _resume_reading(self):
+        self._readingPaused = False
+        if self._receiving and self.isActive:
+            self._protocol.resume_reading()
+            # frames received before the pause
+            asyncio.get_running_loop().call_soon(self._process_frames)
+
+
+    def set_stream_threshold(self, threshold: int):
+        super().set_stream_threshold(threshold)
+        self._protocol.set_stream_threshold(threshold)
+
+
+    def _process_frames(self):
+        msgs: list[OwnedMessage] = []
+        while self._receiving and self.isActive and not self._readingPaused:
+            if self._streamMsg is not None:
+                if not self._process_stream():
+                    break
+                continue
+
+            frame = self._protocol.pop_frame()
+            if frame is None:
+                break
+
+            if self._protocol.streaming():
+                self._streamMsg = OwnedMessage(self, frame)
+                self._streamStarted = False
+                # msgs received before the streamed one go first
+                if msgs:
+                    self._owner.process_msgs(msgs)
+                    msgs = []
+                continue
+
+            if frame.hdr.compressed:
+                try:
+                    self._inflate_msg(frame)
+                except zlib.error:
+                    # the rest of the connection's data can't be decompressed either
+                    self._shutdown(self.SHUTDOWN_REASON.CONNECTION_BREAKUP)
+                    break
+            msgs.append(OwnedMessage(self, frame))
+
+        if msgs:
+            self._owner.process_msgs(msgs)
+
+        # all complete frames are delivered, the rest is lost with the connection
+        if self._receiving and self.isActive and not self._readingPaused and self._protocol.at_eof():
+            self._shutdown(self.SHUTDOWN_REASON.CONNECTION_BREAKUP)
+
+
+    def _process_stream(self) -> bool:
+        '''Passes the next part of the streamed msg to the owner, returns False if it isn't received yet'''
+        msg = self._streamMsg
+        assert msg is not None
+
+        if not self._streamStarted:
+            self._streamStarted = True
+            self._wait_for(self._owner.process_msg_start(msg))
+        elif self._protocol.streaming():
+            chunk = self._protocol.pop_chunk()
+            if chunk is None:
+                return False
+            if msg.msg.hdr.compressed:
+                try:
+                    chunk = self._inflate(chunk, self._maxInflatedSize)
+                except zlib.error:
+                    self._shutdown(self.SHUTDOWN_REASON.CONNECTION_BREAKUP)
+                    return False
+                if not chunk:
+                    return True
+            self._wait_for(self._owner.process_msg_chunk(msg, chunk))
+        else:
+            self._streamMsg = None
+            if msg.msg.hdr.compressed:
+                self._compressionStats.decompressedMsgs += 1
+            self._wait_for(self._owner.process_msg_end(msg))
+
+        return True
+
+
+    def _wait_for(self, result: Awaitable | None):
+        '''Pauses reading until the owner is done with a part of the streamed msg'''
+        if result is None:
+            return
+
+        self.pause_reading()
+        self._schedule(self._resume_after(result))
+
+
+    async def _resume_after(self, result: Awaitable):
+        try:
+            await result
+        finally:
+            self.resume_reading()
+
+
+    async def _discard_incoming(self):
+        await self._protocol.discard_incoming()
\ No newline at end of file
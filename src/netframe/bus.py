@@ -0,0 +1,263 @@
+import sys
+import struct
+import asyncio
+import logging
+import threading
+
+from typing import Callable
+from collections import deque
+
+from netframe.message import Message
+from netframe.recv_buffer import RecvBuffer
+from netframe.shm_ring import ShmPipe, ShmRingReader, ShmRingWriter
+
+
+class WorkerBus:
+    '''
+    Shared memory rings that connect a server worker with every other one,
+    used to pass msgs to connections served by other workers and msgs 
+    published to topics their connections subscribe to. Every ring
+    has a single writer and a single reader. Frames queued during one loop
+    tick are written to each ring at once, so a burst of msgs costs one
+    copy and at most one wake-up of the receiving worker
+    '''
+
+    # kinds of frames, stored in the id field of the frame header
+    SEND = 0
+    PUBLISH = 1
+
+    # connection id that precedes the packed msg in the payload of a SEND frame
+    CONN_ID = struct.Struct('<Q')
+    # length of the topic that precedes the topic and the packed msg in the payload of a PUBLISH frame
+    TOPIC_LEN = struct.Struct('<H')
+
+    # initial size of the buffer incoming frames are parsed in
+    RECV_BUFFER_SIZE = 64*1024
+    # frames waiting for space in a full ring may take that many times its
+    # capacity, newer ones are dropped once the limit is reached
+    BACKLOG_FACTOR = 4
+    # how often a full ring is checked for free space where
+    # the loop can't watch the ring's handle, seconds
+    RETRY_INTERVAL = 0.01
+
+    @staticmethod
+    def create_mesh(workerNum: int, capacity: int) -> dict[tuple[int, int], tuple[ShmRingReader, ShmRingWriter]]:
+        '''Creates a ring for every ordered pair of workers, returns them by (source, destination)'''
+        return {(src, dst): ShmPipe(capacity) for src in range(workerNum) for dst in range(workerNum) if src != dst}
+
+
+    @staticmethod
+    def of_worker(mesh: dict[tuple[int, int], tuple[ShmRingReader, ShmRingWriter]], workerId: int) -> 'WorkerBus':
+        '''Takes the ends of the rings that belong to the worker'''
+        return WorkerBus({src: reader for (src, dst), (reader, _) in mesh.items() if dst == workerId},
+                         {dst: writer for (src, dst), (_, writer) in mesh.items() if src == workerId})
+
+
+    def __init__(self, readers: dict[int, ShmRingReader], writers: dict[int, ShmRingWriter]):
+        '''
+        Parameters:
+            readers: ends of the rings other workers write to, by their ids
+            writers: ends of the rings other workers read from, by their ids
+        '''
+        self._readers = readers
+        self._writers = writers
+
+
+    def start(self, deliver: Callable[[int, Message], None], deliverPublished: Callable[[str, bytes], None]):
+        '''
+        Starts receiving frames in the running loop. deliver is called with
+        the connection id and the msg of every received SEND frame, 
+        deliverPublished - with the topic and the packed msg of every PUBLISH one
+        '''
+        self._loop = asyncio.get_running_loop()
+        self._deliver = deliver
+        self._deliverPublished = deliverPublished
+        self._logger = logging.getLogger("netframe.error")
+
+        # frames waiting to be written and their total size, by destination
+        self._pending = {dst: deque[tuple[int, list[bytes | bytearray | memoryview]]]() for dst in self._writers}
+        self._pendingSize = dict.fromkeys(self._writers, 0)
+        # destinations which rings are full and that drop new frames
+        self._blocked = set[int]()
+        self._dropping = set[int]()
+        self._flushScheduled = False
+
+        self._recvBuffers = {src: RecvBuffer(self.RECV_BUFFER_SIZE) for src in self._readers}
+        self._readThreads: list[threading.Thread] = []
+        for src, reader in self._readers.items():
+            # whatever was sent to the previous worker with this id is meant for its connections
+            reader.skip()
+            if sys.platform == "win32":
+                # the loop can't watch pipe handles, every ring is read by its own thread
+                thread = threading.Thread(target=self._read_blocking, args=(src,), daemon=True)
+                thread.start()
+                self._readThreads.append(thread)
+            else:
+                self._loop.add_reader(reader.fileno(), self._read, src)
+                self._read(src)
+
+
+    def stop(self):
+        '''
+        Stops receiving, frames that aren't written yet are lost. The rings
+        aren't closed, since they are taken by the next worker with this id
+        '''
+        for src, reader in self._readers.items():
+            if sys.platform == "win32":
+                reader.interrupt()
+            else:
+                self._loop.remove_reader(reader.fileno())
+        for thread in self._readThreads:
+            thread.join()
+        for dst in self._blocked:
+            if sys.platform != "win32":
+                self._loop.remove_reader(self._writers[dst].fileno())
+
+        for reader in self._readers.values():
+            reader.release()
+        for writer in self._writers.values():
+            writer.release()
+
+
+    def send(self, workerId: int, connId: int, msg: Message):
+        '''
+        Queues msg for the connection served by another worker. Msgs are
+        dropped if that worker doesn't keep up or isn't running. Throws
+        ValueError if msg doesn't fit into the ring
+        '''
+        if workerId not in self._writers:
+            raise ValueError(f"There is no worker {workerId}")
+
+        hdr = self._frame_header(self.SEND, self.CONN_ID.size + msg.hdr.packed_len() + msg.hdr.size)
+        self._queue(workerId, hdr.packed_len() + hdr.size, [hdr.pack(), self.CONN_ID.pack(connId), *msg.pack_buffers()])
+
+
+    def publish(self, workerIds: list[int], topic: str, packed: bytes):
+        '''
+        Queues msg packed with Message.pack() for subscribers of the topic
+        served by the workers, the same buffers are written to every ring.
+        Throws ValueError if msg doesn't fit into the ring
+        '''
+        topicBytes = topic.encode()
+        hdr = self._frame_header(self.PUBLISH, self.TOPIC_LEN.size + len(topicBytes) + len(packed))
+        frame = [hdr.pack(), self.TOPIC_LEN.pack(len(topicBytes)), topicBytes, packed]
+        for workerId in workerIds:
+            self._queue(workerId, hdr.packed_len() + hdr.size, frame)
+
+
+    def _frame_header(self, kind: int, size: int) -> Message.Header:
+        hdr = Message.Header(kind, size)
+        # all rings have the same capacity
+        capacity = next(iter(self._writers.values())).capacity
+        if hdr.packed_len() + size > capacity:
+            raise ValueError(f"Message of {hdr.packed_len() + size} bytes doesn't fit into the bus, "
+                             f"see Config.busCapacity")
+        return hdr
+
+
+    def _queue(self, dst: int, size: int, frame: list[bytes | bytearray | memoryview]):
+        if self._pendingSize[dst] + size > self.BACKLOG_FACTOR * self._writers[dst].capacity:
+            if dst not in self._dropping:
+                self._dropping.add(dst)
+                self._logger.error(f"Worker {dst} doesn't keep up with msgs sent over the bus, dropping them")
+            return
+
+        self._pending[dst].append((size, frame))
+        self._pendingSize[dst] += size
+        if not self._flushScheduled and dst not in self._blocked:
+            self._flushScheduled = True
+            self._loop.call_soon(self._flush)
+
+
+    def _flush(self):
+        self._flushScheduled = False
+        for dst, frames in self._pending.items():
+            if frames and dst not in self._blocked:
+                self._flush_to(dst)
+
+
+    def _flush_to(self, dst: int):
+        frames = self._pending[dst]
+        writer = self._writers[dst]
+        try:
+            n = writer.try_write_frames(frame for _, frame in frames)
+        except BrokenPipeError:
+            # server is stopping
+            n = len(frames)
+
+        for _ in range(n):
+            size, _ = frames.popleft()
+            self._pendingSize[dst] -= size
+
+        if not frames:
+            self._dropping.discard(dst)
+            return
+
+        # the rest waits until the receiving worker frees some space
+        self._blocked.add(dst)
+        if sys.platform == "win32":
+            self._loop.call_later(self.RETRY_INTERVAL, self._on_writable, dst)
+        else:
+            self._loop.add_reader(writer.fileno(), self._on_writable, dst)
+
+
+    def _on_writable(self, dst: int):
+        if sys.platform != "win32":
+            self._loop.remove_reader(self._writers[dst].fileno())
+        self._blocked.discard(dst)
+        self._flush_to(dst)
+
+
+    def _read(self, src: int):
+        buffer = self._recvBuffers[src]
+        n = self._readers[src].try_read_into(buffer.get_buffer())
+        if n is None:
+            # ring is empty, the handle will become readable once the other worker writes more
+            return
+        if n == 0:
+            # server is stopping
+            self._loop.remove_reader(self._readers[src].fileno())
+            return
+
+        self._deliver_frames(self._pop_frames(src, n))
+        # give other callbacks a chance to run before reading more
+        self._loop.call_soon(self._read, src)
+
+
+    def _read_blocking(self, src: int):
+        buffer = self._recvBuffers[src]
+        while True:
+            try:
+                n = self._readers[src].read_into(buffer.get_buffer())
+            except InterruptedError:
+                return
+            if n == 0:
+                return
+
+            frames = self._pop_frames(src, n)
+            if frames:
+                self._loop.call_soon_threadsafe(self._deliver_frames, frames)
+
+
+    def _pop_frames(self, src: int, n: int) -> list[Message]:
+        buffer = self._recvBuffers[src]
+        buffer.buffer_updated(n)
+
+        frames = []
+        while (frame := buffer.pop_frame()) is not None:
+            frames.append(frame)
+        return frames
+
+
+    def _deliver_frames(self, frames: list[Message]):
+        for frame in frames:
+            if frame.hdr.id == self.SEND:
+                connId = self.CONN_ID.unpack_from(frame.payload)[0]
+                msg = Message()
+                msg.unpack(memoryview(frame.payload)[self.CONN_ID.size:])
+                self._deliver(connId, msg)
+            elif frame.hdr.id == self.PUBLISH:
+                topicLen = self.TOPIC_LEN.unpack_from(frame.payload)[0]
+                topicEnd = self.TOPIC_LEN.size + topicLen
+                topic = frame.payload[self.TOPIC_LEN.size : topicEnd].decode()
+                self._deliverPublished(topic, bytes(memoryview(frame.payload)[topicEnd:]))
\ No newline at end of file
@@ -1,21 +1,73 @@
+import time
+import heapq
 import queue
 import socket
 import logging
+import threading
 
-from multiprocessing import Pipe
+from contextlib import suppress
+from concurrent.futures import Future, InvalidStateError
 
 from netframe.message import Message
+from netframe.recv_buffer import RecvBuffer
+from netframe.shm_ring import ShmPipe
 from netframe.util import setup_logging
 from netframe.worker_pool import WorkerPool
 from netframe.client_worker import ClientWorker
 
 
+# how often dispatcher waiting for space in the queue of received msgs
+# checks request deadlines and whether Client is shutting down, seconds
+DISPATCH_POLL_INTERVAL = 0.1
+
+
 class Client:
-    def __init__(self):
-        self._inQueueRead,  self._inQueueWrite  = Pipe()
-        self._outQueueRead, self._outQueueWrite = Pipe()
+    # default size of the shared memory rings that carry msgs between Client and its worker
+    QUEUE_CAPACITY = 1024*1024
+    # default max amount of received msgs that aren't responses kept for recv()
+    RECV_QUEUE_SIZE = 1024
+    # initial size of the buffer incoming msgs are parsed in
+    RECV_BUFFER_SIZE = 64*1024
+
+    def __init__(self, cpuAffinity: set[int] | None = None,
+                       inQueueCapacity: int = QUEUE_CAPACITY,
+                       outQueueCapacity: int = QUEUE_CAPACITY,
+                       recvQueueSize: int = RECV_QUEUE_SIZE,
+                       compressMinSize: int = 0,
+                       compressLevel: int = 1,
+                       compressContext: bool = False):
+        '''
+        Parameters:
+            cpuAffinity: if set, the worker process is pinned to these CPUs, see Config
+            inQueueCapacity: bytes of received msgs buffered for recv(), once 
+                             they are full the worker stops reading from the socket
+            outQueueCapacity: bytes of msgs buffered for sending, send() blocks 
+                              once they are full
+            recvQueueSize: max amount of msgs that aren't responses kept 
+                           for recv() once request() is used
+            compressMinSize, compressLevel, compressContext: compression of sent msgs, see Config
+        '''
+        if inQueueCapacity < 1 or outQueueCapacity < 1 or recvQueueSize < 1:
+            raise ValueError("Queue capacities must be positive")
+
+        self._cpuAffinity = cpuAffinity
+        self._compression = (compressMinSize, compressLevel, compressContext)
+        self._inQueueRead,  self._inQueueWrite  = ShmPipe(inQueueCapacity)
+        self._outQueueRead, self._outQueueWrite = ShmPipe(outQueueCapacity)
+        self._inBuffer = RecvBuffer(self.RECV_BUFFER_SIZE)
         self._worker = WorkerPool(workerNum=1)
 
+        # once the first request is made, all incoming msgs are read by the dispatcher 
+        # thread, it resolves requests and passes the rest of the msgs to recv()
+        self._dispatcher: threading.Thread | None = None
+        self._received = queue.Queue[Message | None](recvQueueSize)
+        self._closing = threading.Event()
+        self._requestsLock = threading.Lock()
+        self._requests: dict[int, Future[Message]] = {}
+        # (deadline, corrId) of requests with a timeout
+        self._deadlines: list[tuple[float, int]] = []
+        self._nextCorrId = 0
+
         setup_logging()
         self._logger = logging.getLogger("netframe.error")
 
@@ -40,11 +92,17 @@ class Client:
 
         # launch client worker process
         self._worker.start(target=ClientWorker.run, 
-                           args=(serverSock, self._inQueueWrite, self._outQueueRead))
+                           args=(serverSock, self._inQueueWrite, self._outQueueRead, self._cpuAffinity, 
+                                 self._compression))
+
+        # worker process finishing is the same as closing its ends of the queues
+        for sentinel in self._worker.sentinels():
+            self._inQueueRead.watch(sentinel)
+            self._outQueueWrite.watch(sentinel)
 
-        # close resources not needed in this proc
-        self._inQueueWrite.close()
-        self._outQueueRead.close()
+        # release resources not needed in this proc
+        self._inQueueWrite.release()
+        self._outQueueRead.release()
         serverSock.close()
 
 
@@ -53,8 +111,8 @@ class Client:
             raise RuntimeError("Client is not connected")
         
         try:
-            self._outQueueWrite.send(msg)
-        except (BrokenPipeError, OSError):
+            self._outQueueWrite.write(msg.pack_buffers())
+        except BrokenPipeError:
             raise ConnectionResetError("Connection lost")
         
 
@@ -62,16 +120,61 @@ class Client:
         if not self._worker.is_started():
             raise RuntimeError("Client is not connected")
 
-        try:
-            if timeout != None and self._inQueueRead.poll(timeout) == False:
+        if self._dispatcher is None:
+            try:
+                return self._recv(timeout)
+            except TimeoutError:
                 raise queue.Empty
-            msg = self._inQueueRead.recv()
-        except (EOFError, OSError):
+
+        msg = self._received.get(timeout=timeout)
+        if msg is None:
+            # keep the mark for subsequent calls
+            self._received.put(None)
             raise ConnectionResetError("Connection lost")
-        
         return msg
 
 
+    def request(self, msg: Message, timeout: float | None=None) -> Future[Message]:
+        '''
+        Sends msg tagged with a new correlation id, returns a future that is 
+        resolved with the response, see OwnedMessage.reply(). Any number of 
+        requests can be in flight at once, responses may arrive in any order.
+        If timeout is set and the response has not arrived in timeout seconds,
+        the future fails with TimeoutError. Msgs that aren't responses
+        are still received with recv()
+        '''
+        if not self._worker.is_started():
+            raise RuntimeError("Client is not connected")
+
+        future = Future[Message]()
+        with self._requestsLock:
+            corrId = self._nextCorrId
+            while corrId in self._requests:
+                corrId = (corrId + 1) % Message.Header.CORR_ID_LIMIT
+            self._nextCorrId = (corrId + 1) % Message.Header.CORR_ID_LIMIT
+
+            self._requests[corrId] = future
+            if timeout is not None:
+                heapq.heappush(self._deadlines, (time.monotonic() + timeout, corrId))
+
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self._dispatcher.start()
+        elif timeout is not None:
+            # dispatcher may be waiting for an earlier deadline
+            self._inQueueRead.interrupt()
+
+        msg.hdr.corrId = corrId
+        try:
+            self.send(msg)
+        except (ConnectionResetError, ValueError):
+            with self._requestsLock:
+                self._requests.pop(corrId, None)
+            raise
+
+        return future
+
+
     def shutdown(self, timeout: float | None=None):
         ''' 
         Waits for client worker process to finish within timeout, 
@@ -80,7 +183,90 @@ class Client:
         if not self._worker.is_started():
             raise RuntimeError("Client is not connected")
         
+        self._closing.set()
         self._inQueueRead.close()
         self._outQueueWrite.close()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+
+        self._worker.stop(timeout)
+
+        self._inQueueRead.release(unlink=True)
+        self._outQueueWrite.release(unlink=True)
+
+
+    def _recv(self, timeout: float | None) -> Message:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while (msg := self._inBuffer.pop_frame()) is None:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            n = self._inQueueRead.read_into(self._inBuffer.get_buffer(), remaining)
+            if n == 0:
+                raise ConnectionResetError("Connection lost")
+            self._inBuffer.buffer_updated(n)
+        
+        return msg
+
+
+    def _dispatch(self):
+        while True:
+            try:
+                msg = self._recv(self._expire_requests())
+            except (TimeoutError, InterruptedError):
+                continue
+            except ConnectionResetError:
+                break
+
+            if msg.hdr.corrId is None:
+                if not self._put_received(msg):
+                    break
+                continue
+
+            with self._requestsLock:
+                future = self._requests.pop(msg.hdr.corrId, None)
+            # late response to a request that has timed out is dropped
+            if future is None:
+                continue
+
+            # the future could be cancelled by user
+            with suppress(InvalidStateError):
+                future.set_result(msg)
+
+        with self._requestsLock:
+            requests, self._requests = self._requests, {}
+        for future in requests.values():
+            with suppress(InvalidStateError):
+                future.set_exception(ConnectionResetError("Connection lost"))
+        self._put_received(None)
+
+
+    def _put_received(self, msg: Message | None) -> bool:
+        '''
+        Passes msg to recv(). While user doesn't call recv() and the queue 
+        is full, nothing more is read from inQueue, so it fills up and the 
+        worker stops reading from the socket. Returns False if Client is 
+        shutting down
+        '''
+        while not self._closing.is_set():
+            try:
+                self._received.put(msg, timeout=DISPATCH_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                self._expire_requests()
+        return False
+
+
+    def _expire_requests(self) -> float | None:
+        '''Fails requests which deadline has passed, returns time left till the next deadline'''
+        expired = []
+        with self._requestsLock:
+            now = time.monotonic()
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, corrId = heapq.heappop(self._deadlines)
+                if (future := self._requests.pop(corrId, None)) is not None:
+                    expired.append(future)
+            timeout = self._deadlines[0][0] - now if self._deadlines else None
 
-        self._worker.stop(timeout)
\ No newline at end of file
+        for future in expired:
+            with suppress(InvalidStateError):
+                future.set_exception(TimeoutError("Request timed out"))
+        return timeout
\ No newline at end of file
@@ -0,0 +1,192 @@
+import asyncio
+
+from dataclasses import dataclass, field
+
+from netframe.config import RECV_ENGINE
+from netframe.message import Message, OwnedMessage
+from netframe.connection import Connection
+from netframe.async_client import AsyncClient
+
+
+@dataclass
+class ClientPoolStats:
+    # connections that are currently established
+    connections: int = 0
+    # connections closed by server or lost due to a network error
+    lostConnections: int = 0
+    # requests waiting for a response, in total and on every established connection
+    inFlight: int = 0
+    inFlightPerConnection: list[int] = field(default_factory=list)
+    # requests sent and their outcomes
+    requests: int = 0
+    responses: int = 0
+    timeouts: int = 0
+    failures: int = 0
+    # msgs sent with send() and msgs that aren't responses received with recv()
+    msgsSent: int = 0
+    msgsReceived: int = 0
+
+
+class _PooledClient(AsyncClient):
+    '''AsyncClient that passes received msgs and connection loss to its pool'''
+
+    def __init__(self, pool: 'ClientPool', recvEngine: RECV_ENGINE, recvBufferSize: int, 
+                       compressMinSize: int, compressLevel: int, compressContext: bool, sendBufferSize: int):
+        super().__init__(recvEngine, recvBufferSize, compressMinSize, compressLevel, compressContext, sendBufferSize)
+        self._pool = pool
+
+
+    # ConnOwner protocol method
+    def process_msg(self, msg: OwnedMessage):
+        if not self._resolve_request(msg.msg):
+            self._pool._on_msg(msg.msg)
+
+
+    # ConnOwner protocol method
+    def process_disconnect(self, conn: Connection):
+        self._fail_requests(ConnectionResetError("Connection lost"))
+        self._pool._on_disconnect(self)
+
+
+class ClientPool:
+    '''
+    Keeps a number of connections to one or several servers in the caller's
+    event loop. Every msg is sent over the connection with the fewest
+    requests waiting for a response. All methods must be called from the same loop
+    '''
+
+    def __init__(self, endpoints: list[tuple[str, int]],
+                       size: int,
+                       recvEngine: RECV_ENGINE = RECV_ENGINE.STREAM,
+                       recvBufferSize: int = 64*1024,
+                       compressMinSize: int = 0,
+                       compressLevel: int = 1,
+                       compressContext: bool = False,
+                       sendBufferSize: int = AsyncClient.SEND_BUFFER_SIZE):
+        '''
+        Parameters:
+            endpoints: (ip, port) of servers, connections are spread evenly among them
+            size: number of connections
+            recvEngine, recvBufferSize, compressMinSize, compressLevel, compressContext: see Config
+            sendBufferSize: see AsyncClient, applies to every connection
+        '''
+        if not endpoints or size < 1:
+            raise ValueError("Pool needs at least one endpoint and one connection")
+
+        self._endpoints = endpoints
+        self._size = size
+        self._clientArgs = (recvEngine, recvBufferSize, compressMinSize, compressLevel, compressContext, sendBufferSize)
+        # clients are created anew by every connect(), so it can be retried after a failure
+        self._clients: list[_PooledClient] = []
+        # established connections, selection starts from a different one every time
+        self._connected: list[_PooledClient] = []
+        self._next = 0
+
+        # msgs that aren't responses, None signals that all connections are lost
+        self._inQueue = asyncio.Queue[Message | None]()
+        self._stats = ClientPoolStats()
+
+
+    async def connect(self):
+        if self._clients:
+            raise RuntimeError("Pool already connected")
+
+        self._clients = [_PooledClient(self, *self._clientArgs) for _ in range(self._size)]
+        self._inQueue = asyncio.Queue[Message | None]()
+        results = await asyncio.gather(*(client.connect(*self._endpoints[i % len(self._endpoints)])
+                                         for i, client in enumerate(self._clients)),
+                                       return_exceptions=True)
+        self._connected = [client for client, res in zip(self._clients, results) if res is None]
+        errors = [res for res in results if res is not None]
+        if errors:
+            await self.shutdown()
+            raise errors[0]
+
+
+    async def send(self, msg: Message):
+        await self._pick().send(msg)
+        self._stats.msgsSent += 1
+
+
+    def request(self, msg: Message, timeout: float | None=None) -> asyncio.Future[Message]:
+        '''See Client.request()'''
+        future = self._pick().request(msg, timeout)
+        self._stats.requests += 1
+        future.add_done_callback(self._on_request_done)
+        return future
+
+
+    async def recv(self, timeout: float | None=None) -> Message:
+        '''
+        Waits for a msg that isn't a response from any of the connections,
+        see AsyncClient.recv()
+        '''
+        if not self._clients:
+            raise RuntimeError("Pool is not connected")
+
+        try:
+            msg = await asyncio.wait_for(self._inQueue.get(), timeout)
+        except asyncio.TimeoutError:
+            # before 3.11 it isn't the builtin TimeoutError
+            raise TimeoutError("Timed out waiting for a msg") from None
+        if msg is None:
+            # keep the mark for subsequent calls
+            self._inQueue.put_nowait(None)
+            raise ConnectionResetError("All connections are lost")
+
+        return msg
+
+
+    async def shutdown(self, timeout: float | None=None):
+        connected, self._connected = self._connected, []
+        await asyncio.gather(*(client.shutdown(timeout) for client in connected))
+        self._clients.clear()
+
+
+    def stats(self) -> ClientPoolStats:
+        stats = ClientPoolStats(**vars(self._stats))
+        stats.connections = len(self._connected)
+        stats.inFlightPerConnection = [client.pending_requests() for client in self._connected]
+        stats.inFlight = sum(stats.inFlightPerConnection)
+        return stats
+
+
+    def _pick(self) -> AsyncClient:
+        '''Returns the connection with the fewest requests waiting for a response'''
+        if not self._clients:
+            raise RuntimeError("Pool is not connected")
+        if not self._connected:
+            raise ConnectionResetError("All connections are lost")
+
+        # start from the next connection every time, so ties are spread evenly
+        self._next = (self._next + 1) % len(self._connected)
+        candidates = self._connected[self._next:] + self._connected[:self._next]
+        return min(candidates, key=lambda client: client.pending_requests())
+
+
+    def _on_msg(self, msg: Message):
+        self._stats.msgsReceived += 1
+        self._inQueue.put_nowait(msg)
+
+
+    def _on_disconnect(self, client: _PooledClient):
+        if client not in self._connected:
+            return
+
+        self._stats.lostConnections += 1
+        self._connected.remove(client)
+        if not self._connected:
+            self._inQueue.put_nowait(None)
+
+
+    def _on_request_done(self, future: asyncio.Future):
+        if future.cancelled():
+            return
+
+        exc = future.exception()
+        if exc is None:
+            self._stats.responses += 1
+        elif isinstance(exc, TimeoutError):
+            self._stats.timeouts += 1
+        else:
+            self._stats.failures += 1
\ No newline at end of file
@@ -3,15 +3,16 @@ import sys
 import socket
 import asyncio
 import logging
-import functools
+import multiprocessing
 
-from multiprocessing import Pipe
-from multiprocessing.connection import wait, Connection as PipeHndl
+from collections import deque
 from contextlib import suppress
 
-from netframe.message import OwnedMessage
+from netframe.message import Message, OwnedMessage
+from netframe.recv_buffer import RecvBuffer
+from netframe.shm_ring import ShmRingReader, ShmRingWriter
 from netframe.connection import Connection, ConnOwner
-from netframe.util import loop_policy_setup
+from netframe.util import loop_policy_setup, pin_to_cpus
 if sys.platform == "win32":
     from netframe.util import win_socket_share
 
@@ -22,30 +23,53 @@ class ClientWorker(ConnOwner):
     Manages TCP connection between server and client.
     '''
     
+    # initial size of the buffer outgoing msgs are parsed in
+    RECV_BUFFER_SIZE = 64*1024
+
     @staticmethod
     def run(serverSock: socket.socket,
-            inQueue:  PipeHndl,
-            outQueue: PipeHndl):
+            inQueue:  ShmRingWriter,
+            outQueue: ShmRingReader,
+            cpuAffinity: set[int] | None = None,
+            compression: tuple[int, int, bool] = (0, 1, False)):
         
         if sys.platform == "win32":
             serverSock = win_socket_share(serverSock)
 
-        worker = ClientWorker(serverSock, inQueue, outQueue)
+        if cpuAffinity is not None:
+            pin_to_cpus([cpuAffinity], 0)
+
+        worker = ClientWorker(serverSock, inQueue, outQueue, compression)
         worker.start_client()
 
 
     def __init__(self, serverSock: socket.socket,
-                       inQueue:  PipeHndl,
-                       outQueue: PipeHndl):
+                       inQueue:  ShmRingWriter,
+                       outQueue: ShmRingReader,
+                       compression: tuple[int, int, bool] = (0, 1, False)):
         '''
         Parameters:
             serverSock: socket that respresents already established connection between client and server
             inQueue:  queue for incoming msgs. Filled by ClientWorker, consumed by Client
             outQueue: queue for outgoing msgs. Filled by Client, consumed by ClientWorker
+            compression: min size, level and whether context is kept, see Connection.set_compression()
         '''
         self._serverSock = serverSock
         self._inQueue  = inQueue
         self._outQueue = outQueue
+        self._compression = compression
+
+        # msgs that don't fit into inQueue at the moment, 
+        # the connection isn't read while there are any
+        self._inBacklog = deque[bytes | bytearray | memoryview]()
+        self._inBacklogFlushed: asyncio.Future | None = None
+        self._inQueueClosing = False
+
+        # Client's process finishing is the same as closing its ends of the queues
+        self._parent = multiprocessing.parent_process()
+        if self._parent is not None:
+            self._inQueue.watch(self._parent.sentinel)
+            self._outQueue.watch(self._parent.sentinel)
         
         self._logger = logging.getLogger("netframe.error")
         
@@ -58,51 +82,179 @@ class ClientWorker(ConnOwner):
     async def _start_client(self):
         reader, writer = await asyncio.open_connection(sock=self._serverSock)
         self._connection = Connection(reader, writer, self)
+        # msgs aren't taken from outQueue while server doesn't keep up with them,
+        # the socket is still read, server may wait for its msgs to be received
+        # before it reads more, so only a full inQueue pauses reading
+        self._connection.set_write_limits(self._outQueue.capacity, self._outQueue.capacity // 4,
+                                          pauseReading=False)
+        self._connection.set_compression(*self._compression)
+        self._outPaused = False
         self._connection.recv()
         
         self._logger.info(f"Started client process({os.getpid()})")
         
-        # launch outQ consumer thread, it will run until Client 
-        # calls shutdown() or we lose connection with server
         self._loop = asyncio.get_event_loop()
-        # this pipe is used to gracefully stop the thread
-        self._outThreadStopSignalSender, self._outThreadStopSignalRecver = Pipe()
-        await self._loop.run_in_executor(None, self._schedule_out_msgs)
+        self._outBuffer = RecvBuffer(self.RECV_BUFFER_SIZE)
+        if sys.platform == "win32":
+            # proactor loop can't watch the queues' handles, so launch outQ consumer 
+            # thread, it will run until Client calls shutdown() or we lose connection with server
+            await self._loop.run_in_executor(None, self._schedule_out_msgs)
+        else:
+            # queues are served by the loop itself whenever Client wakes it up
+            if self._parent is not None:
+                self._loop.add_reader(self._parent.sentinel, self._on_client_lost)
+
+            self._outQueueDone = self._loop.create_future()
+            self._loop.add_reader(self._outQueue.fileno(), self._read_out_msgs)
+            self._read_out_msgs()
+            await self._outQueueDone
+            self._loop.remove_reader(self._outQueue.fileno())
 
         if self._connection.isActive:
             self._connection.shutdown()
             tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
             await asyncio.wait(tasks)
 
+        # msgs received before the connection was closed must reach Client
+        if self._inBacklog:
+            self._inBacklogFlushed = self._loop.create_future()
+            await self._inBacklogFlushed
+
+        if sys.platform != "win32" and self._parent is not None:
+            self._loop.remove_reader(self._parent.sentinel)
+        self._inQueue.release()
+        self._outQueue.release()
+
         self._logger.info(f"Finished client process({os.getpid()})")
 
 
     # ConnOwner protocol method
     def process_msg(self, msg: OwnedMessage):
-        with suppress(BrokenPipeError):
-            self._inQueue.send(msg.msg)
+        self._write_in_msgs(msg.msg.pack_buffers())
+
+
+    # ConnOwner protocol method
+    def process_msgs(self, msgs: list[OwnedMessage]):
+        # pass all msgs to Client at once
+        self._write_in_msgs([buf for msg in msgs for buf in msg.msg.pack_buffers()])
 
 
     # ConnOwner protocol method
     def process_disconnect(self, conn: Connection):
-        # signal Client that connection is lost
+        # signal Client that connection is lost, after it gets everything received before
+        self._inQueueClosing = True
+        if not self._inBacklog:
+            self._inQueue.close()
+
+        # signal outQ consumer to stop
+        self._outQueue.close()
+        if self._outPaused:
+            self._outPaused = False
+            self._loop.call_soon(self._read_out_msgs)
+
+
+    # ConnOwner protocol method
+    def process_slow(self, conn: Connection, slow: bool):
+        # proactor loop's outQ consumer thread blocks on the queue, so it's not paused
+        if sys.platform == "win32":
+            return
+
+        self._outPaused = slow
+        if slow:
+            self._loop.remove_reader(self._outQueue.fileno())
+        elif not self._outQueueDone.done():
+            self._loop.add_reader(self._outQueue.fileno(), self._read_out_msgs)
+            self._read_out_msgs()
+
+
+    def _on_client_lost(self):
+        # Client's process is finished without calling shutdown()
         self._inQueue.close()
+        self._outQueue.close()
 
-        # signal outQ consumer thread to stop
-        self._outThreadStopSignalSender.close()
+
+    def _write_in_msgs(self, buffers: list[bytes | bytearray | memoryview]):
+        if sys.platform == "win32":
+            with suppress(BrokenPipeError):
+                self._inQueue.write(buffers)
+            return
+
+        if self._inBacklog:
+            self._inBacklog += buffers
+            return
+
+        try:
+            rest = self._inQueue.try_write(buffers)
+        except BrokenPipeError:
+            return
+        if rest:
+            # Client doesn't keep up, the rest waits until it frees some space
+            self._inBacklog += rest
+            self._loop.add_reader(self._inQueue.fileno(), self._flush_in_backlog)
+            self._connection.pause_reading()
+
+
+    def _flush_in_backlog(self):
+        try:
+            rest = self._inQueue.try_write(self._inBacklog)
+        except BrokenPipeError:
+            rest = []
+        self._inBacklog = deque(rest)
+        if rest:
+            return
+
+        self._loop.remove_reader(self._inQueue.fileno())
+        self._connection.resume_reading()
+        if self._inQueueClosing:
+            self._inQueue.close()
+        if self._inBacklogFlushed is not None:
+            self._inBacklogFlushed.set_result(None)
+
+
+    def _read_out_msgs(self):
+        if self._outPaused:
+            return
+
+        n = self._outQueue.try_read_into(self._outBuffer.get_buffer())
+        if n is None:
+            # queue is empty, the handle will become readable once Client sends more
+            return
+        if n == 0:
+            # Client called shutdown() or connection with server is lost
+            self._finish_out_msgs()
+            return
+
+        self._send_msgs(self._pop_out_msgs(n))
+        # give other callbacks a chance to run before reading more
+        self._loop.call_soon(self._read_out_msgs)
+
+
+    def _finish_out_msgs(self):
+        if not self._outQueueDone.done():
+            self._outQueueDone.set_result(None)
 
 
     def _schedule_out_msgs(self):
         while True:
-            ready = wait([self._outQueue, self._outThreadStopSignalRecver])
-            if self._outThreadStopSignalRecver in ready:
-                # lost connection with server
+            n = self._outQueue.read_into(self._outBuffer.get_buffer())
+            if n == 0:
+                # Client called shutdown() or connection with server is lost
                 break
 
-            try:
-                msg = self._outQueue.recv()
-            except EOFError:
-                # Client called shutdown()
-                break
+            msgs = self._pop_out_msgs(n)
+            if msgs:
+                self._loop.call_soon_threadsafe(self._send_msgs, msgs)
+
+
+    def _pop_out_msgs(self, n: int) -> list[Message]:
+        self._outBuffer.buffer_updated(n)
+
+        msgs = []
+        while (msg := self._outBuffer.pop_frame()) is not None:
+            msgs.append(msg)
+        return msgs
+
 
-            self._loop.call_soon_threadsafe(functools.partial(self._connection.send, msg=msg))
\ No newline at end of file
+    def _send_msgs(self, msgs: list[Message]):
+        for msg in msgs:
+            self._connection.send(msg)
\ No newline at end of file
@@ -0,0 +1,70 @@
+import time
+import zlib
+
+from dataclasses import dataclass
+
+
+@dataclass
+class CompressionStats:
+    # msgs compressed before sending and their payload size before and after
+    compressedMsgs: int = 0
+    bytesIn: int = 0
+    bytesOut: int = 0
+    # msgs decompressed after receiving
+    decompressedMsgs: int = 0
+    # CPU time spent on compression and decompression, seconds
+    compressTime: float = 0
+    decompressTime: float = 0
+
+
+    def bytes_saved(self) -> int:
+        return self.bytesIn - self.bytesOut
+
+
+class Deflater:
+    '''
+    Compresses payloads of msgs sent over one connection with raw deflate.
+    Every payload ends with a sync flush, so it ends at a byte boundary and
+    can be decompressed as soon as it's received. If keepContext is set, 
+    payloads are compressed as one stream, so data repeated across msgs 
+    (e.g. JSON keys) is compressed better, at the cost of ~256 KiB per connection
+    '''
+
+    def __init__(self, level: int, keepContext: bool):
+        self.level = level
+        self.keepContext = keepContext
+        self._compressor = zlib.compressobj(level, wbits=-zlib.MAX_WBITS) if keepContext else None
+
+
+    def deflate(self, buffers: list[bytes | bytearray | memoryview]) -> tuple[bytes, float]:
+        '''
+        Returns the compressed payload and CPU time it took. Thread-safe as
+        long as calls don't overlap, so it can be run in a thread pool
+        '''
+        start = time.thread_time()
+        compressor = self._compressor or zlib.compressobj(self.level, wbits=-zlib.MAX_WBITS)
+        data = b''.join([compressor.compress(buf) for buf in buffers] + [compressor.flush(zlib.Z_SYNC_FLUSH)])
+        return data, time.thread_time() - start
+
+
+class Inflater:
+    '''
+    Decompresses payloads of msgs received over one connection. Payloads of 
+    the connection are decompressed as one stream, so it can read msgs of a
+    Deflater with keepContext set as well as without it
+    '''
+
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(wbits=-zlib.MAX_WBITS)
+
+
+    def inflate(self, data: bytes | bytearray | memoryview, maxSize: int = 0) -> tuple[bytes, float]:
+        '''
+        Returns the decompressed data and CPU time it took. Throws zlib.error
+        if data is corrupted or decompresses into more than maxSize bytes
+        '''
+        start = time.thread_time()
+        result = self._decompressor.decompress(data, maxSize)
+        if self._decompressor.unconsumed_tail:
+            raise zlib.error("Decompressed msg is too large")
+        return result, time.thread_time() - start
\ No newline at end of file
@@ -1,8 +1,10 @@
 from __future__ import annotations
-from typing import Protocol, Type, Any, TYPE_CHECKING
+from typing import Protocol, Type, Any, Literal, Callable, TYPE_CHECKING
 from dataclasses import dataclass, field
+from enum import Enum, auto
 
 import socket
+import asyncio
 
 from netframe.message import OwnedMessage
 if TYPE_CHECKING:
@@ -10,6 +12,8 @@ if TYPE_CHECKING:
 
 ContextT = dict[str, Any]
 
+# every callback except __init__ can be defined with async def, async
+# callbacks are run as tasks in the worker's event loop
 class ServerApp(Protocol):
     def __init__(self, context: ContextT):
         pass
@@ -23,6 +27,62 @@ class ServerApp(Protocol):
     def on_message(self, msg: OwnedMessage):
         pass
 
+    # optional, called when a client doesn't keep up with the data sent to it
+    # (slow=True) and once it catches up, see Config.writeHighWater
+    def on_slow_client(self, client: Connection, slow: bool):
+        pass
+
+    # optional, if on_message_chunk is implemented, msgs which payload exceeds
+    # Config.streamThreshold are passed to these three instead of on_message:
+    # with the header as soon as it arrives, with every received part of the
+    # payload and once the whole payload is received
+    def on_message_start(self, msg: OwnedMessage):
+        pass
+
+    def on_message_chunk(self, msg: OwnedMessage, chunk: bytes):
+        pass
+
+    def on_message_end(self, msg: OwnedMessage):
+        pass
+
+    # optional, if implemented it's called instead of on_message 
+    # with all msgs received by the worker during one loop tick
+    def on_messages(self, batch: list[OwnedMessage]):
+        for msg in batch:
+            self.on_message(msg)
+
+
+def offload(handler: Callable) -> Callable:
+    '''
+    Marks ServerApp.on_message() to be run in the worker's offload thread pool 
+    instead of its event loop, so CPU-bound handlers don't stall other 
+    connections. The handler must not use the connection, msgs it returns 
+    are sent back as replies from the event loop
+    '''
+    if asyncio.iscoroutinefunction(handler):
+        raise TypeError("Async handlers can't be offloaded")
+
+    handler._netframeOffload = True
+    return handler
+
+
+class SLOW_CONSUMER_POLICY(Enum):
+    # reading from the connection is paused until the peer catches up
+    BLOCK = auto()
+    # same as BLOCK, but msgs that aren't written to the socket yet are 
+    # dropped, oldest first, to keep the connection below its high water mark
+    DROP_OLDEST = auto()
+    # connection is aborted, unsent data is lost
+    DISCONNECT = auto()
+
+
+class RECV_ENGINE(Enum):
+    # asyncio.StreamReader, every frame is read with two readexactly() calls
+    STREAM = auto()
+    # asyncio.BufferedProtocol, socket data is received into a preallocated 
+    # per-connection buffer and all complete frames are parsed out of each read
+    BUFFERED = auto()
+
 
 @dataclass
 class Config:
@@ -32,4 +92,97 @@ class Config:
     ip: str = socket.gethostbyname(socket.gethostname())
     port: int = 54314
 
-    workerNum: int = 1
\ No newline at end of file
+    workerNum: int = 1
+    # workers that finish unexpectedly (crash, get killed) are launched again 
+    # with the same listen socket, after a delay that grows if it happens in a row
+    respawnWorkers: bool = True
+    # every worker listens on its own socket bound with SO_REUSEPORT, so new
+    # connections are spread among workers by the kernel instead of going to 
+    # whichever worker wakes up first. Requires Linux or another platform 
+    # that balances connections between SO_REUSEPORT sockets
+    reusePort: bool = False
+    # a worker stops accepting new connections while it serves at least 
+    # acceptPauseConnections connections or its event loop lags behind by at 
+    # least acceptPauseLag seconds, provided some other worker is below both 
+    # limits. 0 disables the limit, both are ignored if reusePort is set
+    acceptPauseConnections: int = 0
+    acceptPauseLag: float = 0
+
+    # if maxWorkerNum > workerNum, the number of workers varies between workerNum
+    # and maxWorkerNum: a worker is added when average CPU utilization of
+    # workers stays above scaleUpUtilization for scalePeriod seconds and one
+    # is retired when it stays below scaleDownUtilization. Retired worker stops
+    # accepting and waits at most drainTimeout seconds for its connections to
+    # be closed by clients before closing them itself. Not supported with reusePort
+    maxWorkerNum: int = 0
+    scaleUpUtilization: float = 0.75
+    scaleDownUtilization: float = 0.25
+    scalePeriod: float = 10
+    drainTimeout: float = 60
+
+    # CPUs workers are pinned to: None - workers aren't pinned, "auto" - one 
+    # worker per physical core, spread evenly among NUMA nodes, list of CPU
+    # sets - i-th worker is pinned to cpuAffinity[i % len(cpuAffinity)]. 
+    # Supported on Linux only, ignored with a warning on other platforms
+    cpuAffinity: list[set[int]] | Literal["auto"] | None = None
+
+    recvEngine: RECV_ENGINE = RECV_ENGINE.STREAM
+    # initial size of per-connection receive buffer, used by RECV_ENGINE.BUFFERED
+    recvBufferSize: int = 64 * 1024
+
+    # max amount of free msgs kept by each worker for reuse, 0 disables pooling
+    messagePoolSize: int = 0
+
+    # once more than writeHighWater bytes wait to be sent to a client, reading
+    # from it is paused and slowConsumerPolicy is applied until less than 
+    # writeLowWater bytes are left, 0 disables the limits
+    writeHighWater: int = 0
+    writeLowWater: int = 0
+    slowConsumerPolicy: SLOW_CONSUMER_POLICY = SLOW_CONSUMER_POLICY.BLOCK
+
+    # msgs which payload exceeds that are passed to on_message_chunk() as 
+    # they arrive, if app implements it, 0 disables streaming
+    streamThreshold: int = 1024 * 1024
+
+    # payloads of sent msgs of at least compressMinSize bytes are compressed 
+    # with zlib at compressLevel, 0 disables compression. Peers decompress them
+    # transparently, compressed msgs are marked in the header. With 
+    # compressContext msgs of a connection are compressed as one stream, so 
+    # data repeated across msgs compresses better, at the cost of ~256 KiB per
+    # connection. Payloads of at least compressOffloadSize bytes are compressed
+    # in a thread pool, so the event loop isn't blocked. Received msg (or chunk
+    # of a streamed one) that decompresses into more than maxInflatedSize bytes
+    # closes the connection, so a small frame can't exhaust the worker's memory
+    compressMinSize: int = 0
+    compressLevel: int = 1
+    compressContext: bool = False
+    compressOffloadSize: int = 256 * 1024
+    maxInflatedSize: int = 64 * 1024 * 1024
+
+    # capacity of every shared memory ring of the bus that passes msgs sent 
+    # with Server.send_to() to connections of other workers. A ring is 
+    # created for every ordered pair of workers (up to maxWorkerNum), a msg 
+    # must fit into a ring. 0 disables the bus, then only connections of 
+    # the calling worker can be reached
+    busCapacity: int = 0
+
+    # size of the SharedCache created by Server and passed to ServerApp in 
+    # context[SharedCache.CONTEXT_KEY], so workers share hot data without
+    # a global lock or trips to the disk, 0 disables the cache
+    sharedCacheSize: int = 0
+
+    # max amount of async on_message() calls running at once for one connection.
+    # With 1, msgs of a connection are handled one by one in the order they
+    # arrive, with more, handling of the next msgs starts before the previous
+    # ones are done. Connection isn't read while its msgs wait for their turn.
+    # A streamed msg (see streamThreshold) waits for all the previous ones
+    # to be handled, the next ones wait for its on_message_end()
+    messageConcurrency: int = 1
+
+    # threads in every worker's pool that runs on_message() marked with @offload,
+    # 0 picks ThreadPoolExecutor's default
+    offloadThreads: int = 0
+
+    # max amount of msgs every worker passes to its offload pool at once, 
+    # the rest wait in their connections' queues
+    offloadQueueSize: int = 256
\ No newline at end of file
@@ -1,12 +1,18 @@
 from __future__ import annotations
-from typing import Protocol, Coroutine
+from typing import Protocol, Coroutine, Awaitable, BinaryIO, Iterable
 from contextlib import suppress
+from collections import deque
 from enum import Enum, auto
 
+import os
+import zlib
 import socket
 import asyncio
+import logging
 
-from netframe.message import Message, OwnedMessage
+from netframe.message import Message, MessagePool, OwnedMessage
+from netframe.config import SLOW_CONSUMER_POLICY
+from netframe.compression import CompressionStats, Deflater, Inflater
 
 
 class ConnOwner(Protocol):
@@ -16,12 +22,68 @@ class ConnOwner(Protocol):
     def process_msg(self, msg: OwnedMessage):
         pass
 
+    # called with all messages parsed out of a single read
+    def process_msgs(self, msgs: list[OwnedMessage]):
+        for msg in msgs:
+            self.process_msg(msg)
+
     # called when connection is lost either due to a network 
     # error or graceful TCP shutdown initiated by other party
     # isn't called when shutdown is initiated by owner 
     def process_disconnect(self, conn: Connection):
         pass
 
+    # called once connection is closed, whoever initiated the shutdown
+    def process_close(self, conn: Connection):
+        pass
+
+    # called instead of process_msg() for msgs which payload exceeds the 
+    # stream threshold, see Connection.set_stream_threshold(): with the msg
+    # that has only the header, with every received part of the payload and
+    # once the whole payload is received. If an awaitable is returned, 
+    # nothing more is read from the connection until it is done
+    def process_msg_start(self, msg: OwnedMessage) -> Awaitable | None:
+        pass
+
+    def process_msg_chunk(self, msg: OwnedMessage, chunk: bytes) -> Awaitable | None:
+        pass
+
+    def process_msg_end(self, msg: OwnedMessage) -> Awaitable | None:
+        pass
+
+    # called when data waiting to be sent over the connection goes
+    # above its high water mark (slow=True) and below the low one
+    def process_slow(self, conn: Connection, slow: bool):
+        pass
+
+    # called when the connection subscribes to a topic (subscribe=True) 
+    # or unsubscribes from it, see Connection.subscribe()
+    def process_subscribe(self, conn: Connection, topic: str, subscribe: bool):
+        pass
+
+
+def _read_file(file: BinaryIO, offset: int, size: int) -> bytes:
+    file.seek(offset)
+    return file.read(size)
+
+
+class _QueuedFile:
+    '''File queued with send_file(), sent right after its header'''
+
+    def __init__(self, hdr: Message.Header, prefix: bytes, file: BinaryIO, offset: int, ownsFile: bool):
+        self.hdr = hdr
+        # part of the payload that precedes the file
+        self.prefix = prefix
+        self.file = file
+        self.offset = offset
+        # files opened by the connection are closed once sent or dropped
+        self.ownsFile = ownsFile
+
+
+    def close(self):
+        if self.ownsFile:
+            self.file.close()
+
 
 class Connection:
     '''
@@ -29,47 +91,289 @@ class Connection:
     receiving data and closing the connection.
     '''
 
+    # max size of the parts streamed payloads are read in
+    STREAM_CHUNK_SIZE = 64*1024
+    # size of the parts files are read in where sendfile isn't available
+    FILE_CHUNK_SIZE = 256*1024
+    # payloads at least that large are compressed in a thread pool
+    COMPRESS_OFFLOAD_SIZE = 256*1024
+    # received payloads that decompress into more than that close the connection
+    MAX_INFLATED_SIZE = 64*1024*1024
+
     def __init__(self,
                  reader: asyncio.StreamReader, 
                  writer: asyncio.StreamWriter, 
-                 owner: ConnOwner):
+                 owner: ConnOwner,
+                 pool: MessagePool | None = None):
         self._reader = reader
         self._writer = writer
         self._owner = owner
+        # received msgs are taken from the pool if it is set
+        self._pool = pool
         
         self.isActive = True
+        # unique among connections of all server workers, set by the worker 
+        # that accepts the connection, see Server.send_to()
+        self.id: int | None = None
+        # topics msgs published by the owner are sent to, see subscribe()
+        self._topics = set[str]()
 
         self._tasks: set[asyncio.Task] = set()
 
+        # msgs scheduled for sending, written by a single long-lived _send task,
+        # published msgs are queued already packed, see send_packed()
+        self._outQueue = deque[Message | _QueuedFile | bytes]()
+        self._outQueueEvent = asyncio.Event()
+        self._sendTask: asyncio.Task | None = None
+        # set while the send task waits for msgs, then packed ones are written right away
+        self._sendIdle = False
+
+        # set once the connection is closed and its owner is notified
+        self._closed = asyncio.Event()
+
+        # while set, no more msgs are read from the socket
+        self._readingPaused = False
+        # msg received after reading was paused, delivered once it's resumed
+        self._deferredMsg: OwnedMessage | None = None
+        # pause_reading() calls not matched with resume_reading() yet
+        self._readPauses = 0
+        # payloads larger than that are passed to the owner in chunks, 0 disables streaming
+        self._streamThreshold = 0
+
+        # backpressure, disabled while high water mark is 0, see set_write_limits()
+        self._writeHighWater = 0
+        self._writeLowWater = 0
+        self._slowPolicy = SLOW_CONSUMER_POLICY.BLOCK
+        self._slowPausesReading = True
+        # total size of msgs in _outQueue, bytes
+        self._outQueueSize = 0
+        # set while the peer doesn't keep up with the data sent to it
+        self.isSlow = False
+        # set while the connection isn't slow
+        self._writable = asyncio.Event()
+        self._writable.set()
+
+        # payloads of sent msgs are compressed while deflater is set, see set_compression()
+        self._deflater: Deflater | None = None
+        self._compressMinSize = 0
+        self._compressOffloadSize = self.COMPRESS_OFFLOAD_SIZE
+        # compressed msgs can always be received, inflater is created with the first one
+        self._inflater: Inflater | None = None
+        self._maxInflatedSize = self.MAX_INFLATED_SIZE
+        self._compressionStats = CompressionStats()
+
 
     async def _recv(self):
-        msg = OwnedMessage(owner=self)
+        msg = OwnedMessage(self, self._pool.get() if self._pool is not None else Message())
 
         try:
             hdrBytes = await self._reader.readexactly(Message.Header.HEADER_LEN)
-            msg.msg.hdr.unpack(hdrBytes)
+            if extLen := msg.msg.hdr.unpack(hdrBytes):
+                msg.msg.hdr.unpack_ext(await self._reader.readexactly(extLen))
+
+            if self._streamThreshold and msg.msg.hdr.size > self._streamThreshold:
+                await self._recv_stream(msg)
+                self.recv()
+                return
 
             msg.msg.payload = bytearray(await self._reader.readexactly(msg.msg.hdr.size))            
+            if msg.msg.hdr.compressed:
+                self._inflate_msg(msg.msg)
         except asyncio.CancelledError:
             return
-        except (asyncio.IncompleteReadError, ConnectionResetError, ConnectionAbortedError):
+        except (asyncio.IncompleteReadError, ConnectionResetError, ConnectionAbortedError, zlib.error):
             self._shutdown(self.SHUTDOWN_REASON.CONNECTION_BREAKUP)
             return
 
+        if self._readingPaused:
+            self._deferredMsg = msg
+            return
+
         self.recv()
         self._owner.process_msg(msg)
 
+
+    async def _recv_stream(self, msg: OwnedMessage):
+        '''Passes the payload to the owner in chunks as it arrives'''
+        if (result := self._owner.process_msg_start(msg)) is not None:
+            await result
+
+        left = msg.msg.hdr.size
+        while left:
+            chunk = await self._reader.read(min(left, self.STREAM_CHUNK_SIZE))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b'', left)
+            left -= len(chunk)
+            if msg.msg.hdr.compressed:
+                chunk = self._inflate(chunk, self._maxInflatedSize)
+                if not chunk:
+                    continue
+            if (result := self._owner.process_msg_chunk(msg, chunk)) is not None:
+                await result
+
+        if msg.msg.hdr.compressed:
+            self._compressionStats.decompressedMsgs += 1
+
+        if (result := self._owner.process_msg_end(msg)) is not None:
+            await result
+
     
-    async def _send(self, msg: Message):
+    async def _send(self):
         try:
-            self._writer.write(msg.pack())
-            await self._writer.drain()
+            while True:
+                if not self._outQueue:
+                    # in case of manual shutdown finish after everything is sent
+                    if not self.isActive:
+                        return
+                    if self.isSlow:
+                        # packed msgs written right away wait in the transport's buffer
+                        await self._writer.drain()
+                        if self.write_buffer_size() <= self._writeLowWater:
+                            self._on_low_water()
+                    self._outQueueEvent.clear()
+                    self._sendIdle = True
+                    try:
+                        await self._outQueueEvent.wait()
+                    finally:
+                        self._sendIdle = False
+                    continue
+
+                msgs, self._outQueue = self._outQueue, deque[Message | _QueuedFile | bytes]()
+                self._outQueueSize = 0
+                try:
+                    await self._write_msgs(msgs)
+                finally:
+                    # files that weren't sent before the connection was lost
+                    self._close_files(msgs)
+                if self.isSlow and self.write_buffer_size() <= self._writeLowWater:
+                    self._on_low_water()
         except asyncio.CancelledError:
             return
         except (ConnectionResetError, ConnectionAbortedError):
             self._shutdown(self.SHUTDOWN_REASON.CONNECTION_BREAKUP)
+        except Exception as e:
+            # the peer can't find where the next msg starts if one was written partly,
+            # and msgs sent later would wait for the finished task forever
+            logging.getLogger("netframe.error").error(f"Failed to send msgs, aborting the connection: {e!r}")
+            self.abort()
 
     
+    async def _write_msgs(self, msgs: deque[Message | _QueuedFile | bytes]):
+        '''Writes all msgs at once, file bodies are sent right after the msgs queued before them'''
+        buffers = []
+        while msgs:
+            msg = msgs.popleft()
+            if isinstance(msg, bytes):
+                buffers.append(msg)
+                continue
+            if isinstance(msg, Message):
+                if self._deflater is not None and msg.hdr.size >= self._compressMinSize:
+                    buffers += await self._compress(msg, self._deflater)
+                else:
+                    buffers += msg.pack_buffers()
+                continue
+
+            try:
+                self._writer.writelines(buffers + [msg.hdr.pack(), msg.prefix])
+                buffers = []
+                await self._send_file_body(msg)
+            finally:
+                msg.close()
+
+        self._writer.writelines(buffers)
+        await self._writer.drain()
+
+
+    async def _compress(self, msg: Message, deflater: Deflater) -> list[bytes | bytearray | memoryview]:
+        '''Returns buffers of the msg with compressed payload, large ones are compressed in a thread pool'''
+        payload = msg.pack_buffers()[1:]
+        if msg.hdr.size >= self._compressOffloadSize:
+            data, cpuTime = await asyncio.get_running_loop().run_in_executor(None, deflater.deflate, payload)
+        else:
+            data, cpuTime = deflater.deflate(payload)
+        self._compressionStats.compressTime += cpuTime
+
+        hdr = Message.Header(msg.hdr.id, len(data), msg.hdr.corrId, compressed=True)
+        # without the shared context the peer doesn't have to see every compressed payload,
+        # the flags of a compressed one may take a longer header
+        if hdr.packed_len() + len(data) >= msg.hdr.packed_len() + msg.hdr.size and not deflater.keepContext:
+            return msg.pack_buffers()
+
+        self._compressionStats.compressedMsgs += 1
+        self._compressionStats.bytesIn += msg.hdr.size
+        self._compressionStats.bytesOut += len(data)
+        return [hdr.pack(), data]
+
+
+    def _inflate(self, data: bytes | bytearray | memoryview, maxSize: int = 0) -> bytes:
+        if self._inflater is None:
+            self._inflater = Inflater()
+        data, cpuTime = self._inflater.inflate(data, maxSize)
+        self._compressionStats.decompressTime += cpuTime
+        return data
+
+
+    def _inflate_msg(self, msg: Message):
+        '''Replaces compressed payload of the received msg with the original one'''
+        msg.payload = bytearray(self._inflate(msg.payload, self._maxInflatedSize))
+        msg.hdr.size = len(msg.payload)
+        msg.hdr.compressed = False
+        self._compressionStats.decompressedMsgs += 1
+
+
+    async def _send_file_body(self, queued: _QueuedFile):
+        count = queued.hdr.size - len(queued.prefix)
+        try:
+            sent = await self._sendfile(queued.file, queued.offset, count)
+        except OSError as e:
+            # broken pipe, disk error, etc.
+            raise ConnectionAbortedError(f"Failed to send file: {e}") from e
+        finally:
+            # sendfile() resumes reading from the transport once it's done
+            if self._readingPaused:
+                self._pause_reading()
+
+        if sent < count:
+            # the file got shorter, the peer can't find where the next msg starts
+            raise ConnectionAbortedError("File is shorter than its msg")
+
+
+    async def _sendfile(self, file: BinaryIO, offset: int, count: int) -> int:
+        '''
+        Sends the file with sendfile() once everything written before it is
+        flushed, falls back to reading the file in chunks where it's unavailable
+        '''
+        try:
+            return await asyncio.get_running_loop().sendfile(self._writer.transport, file, offset, count, 
+                                                             fallback=False)
+        except (asyncio.SendfileNotAvailableError, RuntimeError, NotImplementedError):
+            # e.g. SSL, Windows, uvloop or a transport that doesn't support sendfile at all
+            if self._writer.is_closing():
+                raise ConnectionResetError("Connection lost")
+            return await self._send_file_chunks(file, offset, count)
+
+
+    async def _send_file_chunks(self, file: BinaryIO, offset: int, count: int) -> int:
+        loop = asyncio.get_running_loop()
+        sent = 0
+        while sent < count:
+            chunk = await loop.run_in_executor(None, _read_file, file, offset + sent, 
+                                               min(count - sent, self.FILE_CHUNK_SIZE))
+            if not chunk:
+                break
+            self._writer.write(chunk)
+            await self._writer.drain()
+            sent += len(chunk)
+
+        return sent
+
+
+    def _close_files(self, msgs: Iterable[Message | _QueuedFile | bytes]):
+        for msg in msgs:
+            if isinstance(msg, _QueuedFile):
+                msg.close()
+
+
     class SHUTDOWN_REASON(Enum):
         # owner initiated shutdown
         MANUAL = auto() 
@@ -89,6 +393,9 @@ class Connection:
 
         self._schedule(self._ashutdown(reason))
         self.isActive = False
+        # wake up send task, so it can finish
+        self._outQueueEvent.set()
+        self._writable.set()
         
 
     async def _ashutdown(self, reason: SHUTDOWN_REASON):
@@ -104,13 +411,11 @@ class Connection:
         if reason == self.SHUTDOWN_REASON.MANUAL:
             sock = self._writer.get_extra_info('socket')
             sock.shutdown(socket.SHUT_WR)
-            while True:
-                try:
-                    msg = await self._reader.read(1024)
-                    if msg == b'':
-                        break
-                except:
-                    break
+            await self._discard_incoming()
+
+        # msgs left unsent if the connection was lost
+        self._close_files(self._outQueue)
+        self._outQueue.clear()
 
         self._writer.close()
         with suppress(ConnectionResetError, ConnectionAbortedError):
@@ -118,28 +423,322 @@ class Connection:
 
         if reason == self.SHUTDOWN_REASON.CONNECTION_BREAKUP:
             self._owner.process_disconnect(self)
+        self._owner.process_close(self)
+
+        self._closed.set()
 
     
-    def _schedule(self, coro: Coroutine):
+    async def _discard_incoming(self):
+        '''Reads and throws away incoming data until peer closes the connection'''
+        while True:
+            try:
+                msg = await self._reader.read(1024)
+                if msg == b'':
+                    break
+            except:
+                break
+
+
+    def _schedule(self, coro: Coroutine) -> asyncio.Task | None:
         if not self.isActive:
-            return
+            coro.close()
+            return None
 
         task = asyncio.create_task(coro, name=coro.__name__)
         self._tasks.add(task)
         task.add_done_callback(self._tasks.discard)
 
+        return task
+
 
     def send(self, msg: Message):
-        self._schedule(self._send(msg))
+        '''Throws ValueError if the payload exceeds Message.Header.SIZE_MASK'''
+        if msg.hdr.size > Message.Header.SIZE_MASK:
+            raise ValueError(f"Payload of {msg.hdr.size} bytes exceeds the limit of {Message.Header.SIZE_MASK} bytes")
+        if not self.isActive:
+            return
+
+        self._queue(msg, msg.hdr.packed_len() + msg.hdr.size)
+
+
+    def send_file(self, id: int, file: str | os.PathLike | int | BinaryIO, offset: int = 0, 
+                  count: int | None = None, *, prefix: bytes = b'', corrId: int | None = None):
+        '''
+        Sends count bytes of the file starting at offset as the payload of a 
+        msg with the given id, without reading the file into memory. The file 
+        is sent with sendfile() after the msgs sent before, msgs sent after 
+        follow it. File given by path is opened right away and closed once 
+        it is sent, fd or file object is left open to the caller and must not
+        be used until the file is sent. count=None sends the rest of the file.
+        prefix is sent in the payload before the file, e.g. fields describing it
+        '''
+        if not self.isActive:
+            return
+
+        ownsFile = isinstance(file, (str, os.PathLike))
+        if ownsFile:
+            file = open(file, 'rb')
+        elif isinstance(file, int):
+            file = open(file, 'rb', closefd=False)
+            ownsFile = True
+
+        try:
+            if count is None:
+                count = max(os.fstat(file.fileno()).st_size - offset, 0)
+            if offset < 0 or count < 0:
+                raise ValueError(f"Invalid file range: offset={offset}, count={count}")
+            if len(prefix) + count > Message.Header.SIZE_MASK:
+                raise ValueError(f"Payload of {len(prefix) + count} bytes exceeds the limit of "
+                                 f"{Message.Header.SIZE_MASK} bytes")
+        except:
+            if ownsFile:
+                file.close()
+            raise
+
+        hdr = Message.Header(id=id, size=len(prefix) + count, corrId=corrId)
+        # only the header and the prefix are held in memory
+        self._queue(_QueuedFile(hdr, bytes(prefix), file, offset, ownsFile), hdr.packed_len() + len(prefix))
+
+
+    def send_packed(self, data: bytes):
+        '''
+        Sends msg packed with Message.pack(), so one msg sent to many
+        connections is packed only once and every connection writes the
+        same buffer. Packed msg isn't compressed
+        '''
+        if not self.isActive:
+            return
+        # send task stays idle until it wakes up for msgs queued just now
+        if not self._sendIdle or self._outQueue or self.isSlow or self._writer.is_closing():
+            self._queue(data, len(data))
+            return
+
+        # nothing is being written or queued, so the msg can't overtake
+        # others and there is no need to wake the send task up
+        self._writer.write(data)
+        if self._writeHighWater and self.write_buffer_size() > self._writeHighWater:
+            self._on_high_water()
+            # send task watches for the low water mark
+            self._outQueueEvent.set()
+
+
+    def subscribe(self, topic: str):
+        '''
+        Makes msgs the server publishes to the topic be sent over this 
+        connection, see Server.publish(). The connection is unsubscribed 
+        from all its topics once it's closed
+        '''
+        if not self.isActive or topic in self._topics:
+            return
+
+        self._topics.add(topic)
+        self._owner.process_subscribe(self, topic, True)
+
+
+    def unsubscribe(self, topic: str):
+        if topic not in self._topics:
+            return
+
+        self._topics.discard(topic)
+        self._owner.process_subscribe(self, topic, False)
+
+
+    def subscriptions(self) -> set[str]:
+        '''Returns topics the connection is subscribed to'''
+        return set(self._topics)
+
+
+    def _queue(self, msg: Message | _QueuedFile | bytes, size: int):
+        self._outQueue.append(msg)
+        self._outQueueSize += size
+        if self._sendTask is None:
+            self._sendTask = self._schedule(self._send())
+        else:
+            self._outQueueEvent.set()
+
+        if self._writeHighWater and self.write_buffer_size() > self._writeHighWater:
+            self._on_high_water()
+
+
+    def set_write_limits(self, high: int, low: int = 0, 
+                         policy: SLOW_CONSUMER_POLICY = SLOW_CONSUMER_POLICY.BLOCK,
+                         pauseReading: bool = True):
+        '''
+        Enables backpressure. Once more than high bytes are waiting to be
+        sent, the connection becomes slow: reading from it is paused (unless
+        pauseReading is False), policy is applied and the owner is notified.
+        It stops being slow once less than low bytes are left. The marks are
+        passed to the transport as well, so writes aren't held back below
+        high. 0 high disables the limits
+        '''
+        if not 0 <= low <= high:
+            raise ValueError("Write limits must satisfy 0 <= low <= high")
+
+        self._writeHighWater = high
+        self._writeLowWater = low
+        self._slowPolicy = policy
+        self._slowPausesReading = pauseReading
+        if high:
+            self._writer.transport.set_write_buffer_limits(high=high, low=low)
+
+
+    def set_stream_threshold(self, threshold: int):
+        '''
+        Makes the connection pass msgs which payload exceeds threshold to 
+        the owner in chunks as they are received, see ConnOwner. 0 disables 
+        streaming. Must be called before the connection starts receiving
+        '''
+        self._streamThreshold = threshold
+
+
+    def set_compression(self, minSize: int, level: int = 1, keepContext: bool = False,
+                        offloadSize: int = COMPRESS_OFFLOAD_SIZE, stats: CompressionStats | None = None,
+                        maxInflatedSize: int = MAX_INFLATED_SIZE):
+        '''
+        Compresses payloads of at least minSize bytes sent from now on with 
+        zlib at the given level, 0 disables compression. Compressed msgs are 
+        marked in the header and the peer's connection decompresses them 
+        transparently, it doesn't need compression enabled. If keepContext is 
+        set, payloads are compressed as one stream, see Deflater. Payloads of at
+        least offloadSize bytes are compressed in a thread pool. Counters are 
+        kept in stats if set, so several connections can share them. Received 
+        payload (or chunk of a streamed one) that decompresses into more than 
+        maxInflatedSize bytes closes the connection
+        '''
+        if minSize < 0:
+            raise ValueError("Minimal size of compressed payloads can't be negative")
+        if not 0 < maxInflatedSize <= Message.Header.SIZE_MASK:
+            raise ValueError(f"Max decompressed size must be in range (0, {Message.Header.SIZE_MASK}]")
+
+        self._deflater = Deflater(level, keepContext) if minSize else None
+        self._compressMinSize = minSize
+        self._compressOffloadSize = offloadSize
+        self._maxInflatedSize = maxInflatedSize
+        if stats is not None:
+            self._compressionStats = stats
+
+
+    def compression_stats(self) -> CompressionStats:
+        '''Returns counters of compressed and decompressed msgs, see set_compression()'''
+        return self._compressionStats
+
+
+    def write_buffer_size(self) -> int:
+        '''Returns the amount of bytes waiting to be sent'''
+        return self._outQueueSize + self._writer.transport.get_write_buffer_size()
+
+
+    async def wait_writable(self):
+        '''Waits until the connection isn't slow or is closed, see set_write_limits()'''
+        await self._writable.wait()
+
+
+    def _on_high_water(self):
+        if self._slowPolicy == SLOW_CONSUMER_POLICY.DROP_OLDEST:
+            while self._outQueue and self.write_buffer_size() > self._writeHighWater:
+                msg = self._outQueue.popleft()
+                if isinstance(msg, bytes):
+                    self._outQueueSize -= len(msg)
+                elif isinstance(msg, _QueuedFile):
+                    self._outQueueSize -= msg.hdr.packed_len() + len(msg.prefix)
+                    msg.close()
+                else:
+                    self._outQueueSize -= msg.hdr.packed_len() + msg.hdr.size
+
+        if not self.isSlow:
+            self.isSlow = True
+            self._writable.clear()
+            # while the connection is slow, drain() returns only once the transport 
+            # is below the low mark, so the send task can tell when it catches up
+            self._writer.transport.set_write_buffer_limits(high=self._writeLowWater, low=self._writeLowWater)
+            if self._slowPausesReading:
+                self.pause_reading()
+            self._owner.process_slow(self, True)
+
+        # owner may have shut the connection down already
+        if self._slowPolicy == SLOW_CONSUMER_POLICY.DISCONNECT and self.isActive:
+            # unsent data is thrown away instead of waiting for the peer
+            self._close_files(self._outQueue)
+            self._outQueue.clear()
+            self._outQueueSize = 0
+            self.abort()
+
+
+    def _on_low_water(self):
+        self.isSlow = False
+        self._writable.set()
+        self._writer.transport.set_write_buffer_limits(high=self._writeHighWater, low=self._writeLowWater)
+        if self._slowPausesReading:
+            self.resume_reading()
+        self._owner.process_slow(self, False)
 
 
     def recv(self):
         self._schedule(self._recv())
 
 
+    def pause_reading(self):
+        '''
+        Stops reading msgs from the socket, so TCP flow control slows the
+        peer down. No msgs are delivered to the owner until reading resumes, 
+        which happens once every call is matched with resume_reading()
+        '''
+        self._readPauses += 1
+        if self._readPauses == 1:
+            self._pause_reading()
+
+
+    def resume_reading(self):
+        if not self._readPauses:
+            return
+        self._readPauses -= 1
+        if not self._readPauses:
+            self._resume_reading()
+
+
+    def _pause_reading(self):
+        self._readingPaused = True
+
+
+    def _resume_reading(self):
+        self._readingPaused = False
+        if self._deferredMsg is not None:
+            # owner may be in the middle of a callback
+            asyncio.get_running_loop().call_soon(self._deliver_deferred)
+
+
+    def _deliver_deferred(self):
+        msg, self._deferredMsg = self._deferredMsg, None
+        if msg is None or not self.isActive:
+            return
+        # paused again before the msg was delivered
+        if self._readingPaused:
+            self._deferredMsg = msg
+            return
+
+        self.recv()
+        self._owner.process_msg(msg)
+
+
     def shutdown(self):
         self._shutdown(self.SHUTDOWN_REASON.MANUAL)
 
 
+    def abort(self):
+        '''
+        Closes the connection at once, unsent data is lost. Owner is notified 
+        as if the connection was lost, unless it was shut down already, in which 
+        case shutdown stops waiting for the peer
+        '''
+        self._writer.transport.abort()
+        if self.isActive:
+            self._shutdown(self.SHUTDOWN_REASON.CONNECTION_BREAKUP)
+
+
+    async def wait_closed(self):
+        '''Waits until the connection is closed after shutdown() or connection breakup'''
+        await self._closed.wait()
+
+
     def addr(self) -> tuple[str, int]:
         return self._writer.get_extra_info('peername')
\ No newline at end of file
@@ -0,0 +1,116 @@
+import multiprocessing
+
+from dataclasses import dataclass
+
+from netframe.compression import CompressionStats
+
+
+@dataclass
+class WorkerLoad:
+    # connections currently established
+    connections: int = 0
+    # connections accepted since start
+    accepted: int = 0
+    # how late the worker's event loop runs scheduled callbacks, in seconds
+    loopLag: float = 0
+    # False while the worker doesn't accept new connections due to overload
+    accepting: bool = True
+
+
+class LoadTable:
+    '''
+    Per-worker load counters placed in shared memory. Every row is written
+    only by its worker, Server and other workers read the whole table. Access
+    isn't synchronized, so readers may see slightly outdated values. Compression
+    counters are guarded by a sequence counter, so they are read as a consistent
+    snapshot
+    '''
+
+    # columns
+    CONNECTIONS = 0     # connections currently established
+    ACCEPTED = 1        # connections accepted since start
+    LOOP_LAG = 2        # smoothed event loop lag, microseconds
+    PAUSED = 3          # 1 while worker doesn't accept new connections
+    CPU_TIME = 4        # CPU time used by worker process, microseconds
+    RUNNING = 5         # 1 while worker accepts connections, 0 once it stops or retires
+    # compression counters, see CompressionStats, times are in microseconds
+    COMPRESSED_MSGS = 6
+    COMPRESS_IN = 7
+    COMPRESS_OUT = 8
+    DECOMPRESSED_MSGS = 9
+    COMPRESS_TIME = 10
+    DECOMPRESS_TIME = 11
+    # odd while the worker writes compression counters, see write_compression_stats()
+    COMPRESSION_SEQ = 12
+    COLUMN_NUM = 13
+
+    # attempts to read a consistent snapshot before settling for the values as they are,
+    # so a worker killed in the middle of writing doesn't hang the reader
+    SNAPSHOT_ATTEMPTS = 1000
+
+    def __init__(self, workerNum: int):
+        self._workerNum = workerNum
+        self._table = multiprocessing.RawArray('q', workerNum * self.COLUMN_NUM)
+
+
+    def __getitem__(self, cell: tuple[int, int]) -> int:
+        workerId, column = cell
+        return self._table[workerId * self.COLUMN_NUM + column]
+
+
+    def __setitem__(self, cell: tuple[int, int], value: int):
+        workerId, column = cell
+        self._table[workerId * self.COLUMN_NUM + column] = value
+
+
+    def __len__(self) -> int:
+        return self._workerNum
+
+
+    def column(self, column: int) -> list[int]:
+        '''Returns values of the column for every worker'''
+        return [self[workerId, column] for workerId in range(self._workerNum)]
+
+
+    def reset(self, workerId: int):
+        '''Clears the row, so it can be taken by a new worker'''
+        for column in range(self.COLUMN_NUM):
+            self[workerId, column] = 0
+
+
+    def load(self, workerId: int) -> WorkerLoad:
+        return WorkerLoad(connections=self[workerId, self.CONNECTIONS],
+                          accepted=self[workerId, self.ACCEPTED],
+                          loopLag=self[workerId, self.LOOP_LAG] / 1e6,
+                          accepting=not self[workerId, self.PAUSED])
+
+
+    def write_compression_stats(self, workerId: int, stats: CompressionStats):
+        seq = self[workerId, self.COMPRESSION_SEQ]
+        self[workerId, self.COMPRESSION_SEQ] = seq + 1
+        self[workerId, self.COMPRESSED_MSGS] = stats.compressedMsgs
+        self[workerId, self.COMPRESS_IN] = stats.bytesIn
+        self[workerId, self.COMPRESS_OUT] = stats.bytesOut
+        self[workerId, self.DECOMPRESSED_MSGS] = stats.decompressedMsgs
+        self[workerId, self.COMPRESS_TIME] = int(stats.compressTime * 1e6)
+        self[workerId, self.DECOMPRESS_TIME] = int(stats.decompressTime * 1e6)
+        self[workerId, self.COMPRESSION_SEQ] = seq + 2
+
+
+    def compression_stats(self, workerId: int) -> CompressionStats:
+        '''Returns compression counters the worker wrote last time, all from the same write'''
+        for _ in range(self.SNAPSHOT_ATTEMPTS):
+            seq = self[workerId, self.COMPRESSION_SEQ]
+            stats = self._read_compression_stats(workerId)
+            if not seq & 1 and self[workerId, self.COMPRESSION_SEQ] == seq:
+                break
+        return stats
+
+
+    def _read_compression_stats(self, workerId: int) -> CompressionStats:
+        return CompressionStats(compressedMsgs=self[workerId, self.COMPRESSED_MSGS],
+                                bytesIn=self[workerId, self.COMPRESS_IN],
+                                bytesOut=self[workerId, self.COMPRESS_OUT],
+                                decompressedMsgs=self[workerId, self.DECOMPRESSED_MSGS],
+                                compressTime=self[workerId, self.COMPRESS_TIME] / 1e6,
+                                decompressTime=self[workerId, self.DECOMPRESS_TIME] / 1e6)
\ No newline at end of file
@@ -2,28 +2,77 @@ from __future__ import annotations
 from typing import TYPE_CHECKING, ClassVar
 from dataclasses import dataclass, field
 
+import struct
+
 if TYPE_CHECKING:
     from netframe.connection import Connection
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
-    @dataclass
+    @dataclass(slots=True)
     class Header:
         id: int = 0
         size: int = 0
-        
+        # set for requests and replies, see Client.request()
+        corrId: int | None = None
+        # set while the payload is compressed, see Connection.set_compression()
+        compressed: bool = False
+
         ID_FIELD_LEN: ClassVar[int] = 2
         SIZE_FIELD_LEN: ClassVar[int] = 4
         HEADER_LEN: ClassVar[int] = ID_FIELD_LEN + SIZE_FIELD_LEN
+        # optional fields that follow the header if EXT_FLAG is set: 
+        # flags and correlation id, which is only valid with FLAG_CORR_ID
+        FLAGS_FIELD_LEN: ClassVar[int] = 1
+        CORR_ID_FIELD_LEN: ClassVar[int] = 4
+        EXT_LEN: ClassVar[int] = FLAGS_FIELD_LEN + CORR_ID_FIELD_LEN
+        CORR_ID_LIMIT: ClassVar[int] = 1 << 8*CORR_ID_FIELD_LEN
+
+        # high bit of the size field marks headers followed by the optional fields,
+        # new features take bits of the flags field instead of the size field
+        EXT_FLAG: ClassVar[int] = 0x80000000
+        SIZE_MASK: ClassVar[int] = 0x7FFFFFFF
+        FLAG_CORR_ID: ClassVar[int] = 0x01
+        FLAG_COMPRESSED: ClassVar[int] = 0x02
+
+        # little-endian id and size, compiled once
+        CODEC: ClassVar[struct.Struct] = struct.Struct('<HI')
+        EXT_FIELDS_CODEC: ClassVar[struct.Struct] = struct.Struct('<BI')
+        EXT_CODEC: ClassVar[struct.Struct] = struct.Struct('<HIBI')
 
         def pack(self) -> bytes:
-            return self.id.  to_bytes(self.ID_FIELD_LEN,   'little') + \
-                   self.size.to_bytes(self.SIZE_FIELD_LEN, 'little')
-        
-        def unpack(self, bytes_: bytes):
-            self.id   = int.from_bytes(bytes_[:self.ID_FIELD_LEN], 'little')
-            self.size = int.from_bytes(bytes_[ self.ID_FIELD_LEN : Message.Header.HEADER_LEN], 'little')
+            '''Throws ValueError if size doesn't fit into the size field'''
+            if self.size > self.SIZE_MASK:
+                raise ValueError(f"Payload of {self.size} bytes exceeds the limit of {self.SIZE_MASK} bytes")
+            if self.corrId is None and not self.compressed:
+                return self.CODEC.pack(self.id, self.size)
+
+            flags = self.FLAG_COMPRESSED if self.compressed else 0
+            if self.corrId is not None:
+                flags |= self.FLAG_CORR_ID
+            return self.EXT_CODEC.pack(self.id, self.size | self.EXT_FLAG, flags, self.corrId or 0)
+
+        def unpack(self, bytes_: bytes | bytearray | memoryview) -> int:
+            '''
+            Parses the fixed part of the header, returns the length of
+            the optional fields that follow it, see unpack_ext()
+            '''
+            self.id, size = self.CODEC.unpack_from(bytes_)
+            self.size = size & self.SIZE_MASK
+            self.corrId = None
+            self.compressed = False
+            return self.EXT_LEN if size & self.EXT_FLAG else 0
+
+        def unpack_ext(self, bytes_: bytes | bytearray | memoryview):
+            flags, corrId = self.EXT_FIELDS_CODEC.unpack_from(bytes_)
+            self.corrId = corrId if flags & self.FLAG_CORR_ID else None
+            self.compressed = bool(flags & self.FLAG_COMPRESSED)
+
+        def packed_len(self) -> int:
+            if self.corrId is None and not self.compressed:
+                return self.HEADER_LEN
+            return self.HEADER_LEN + self.EXT_LEN
 
 
     hdr: Header = field(default_factory=Header)
@@ -31,32 +80,184 @@ class Message:
 
     _start: int = 0
 
+    # if set, pop() returns memoryview slices of payload instead of copies
+    zeroCopy: bool = field(default=False, compare=False)
+    _views: list[memoryview] | None = field(default=None, compare=False, repr=False)
+
+    # data appended without copying, it follows first hdr.size-_chunksSize bytes of payload
+    _chunks: list[bytes | bytearray | memoryview] | None = field(default=None, compare=False, repr=False)
+    _chunksSize: int = field(default=0, compare=False, repr=False)
 
-    def append(self, data: bytes):
-        self.payload += data
+    # pool the message is returned to on release()
+    _pool: MessagePool | None = field(default=None, compare=False, repr=False)
+
+
+    def append(self, data: bytes | bytearray | memoryview, copy: bool = True):
+        '''
+        Appends data to payload. If copy is False, only a reference to data
+        is kept until the message is written to the socket (or the payload
+        is read), so data must not be modified after this call
+        '''
+        if not copy or self._chunks:
+            if self._chunks is None:
+                self._chunks = []
+            self._chunks.append(bytes(data) if copy else data)
+            self._chunksSize += len(data)
+        elif len(self.payload) == self.hdr.size:
+            self.payload += data
+        else:
+            # fill the space preallocated by reserve()
+            self.payload[self.hdr.size : self.hdr.size + len(data)] = data
         self.hdr.size += len(data)
 
 
-    def pop(self, length: int) -> bytes:
+    def reserve(self, capacity: int):
+        '''Preallocates payload, so appending up to capacity bytes doesn't reallocate it'''
+        if len(self.payload) < capacity:
+            payload = bytearray(capacity)
+            payload[:len(self.payload)] = self.payload
+            self.payload = payload
+
+
+    def pop(self, length: int) -> bytes | memoryview:
         if self._start + length > self.hdr.size:
             raise IndexError("Request to pop an amount of data that exceeds the size of the payload")
+        self._materialize()
 
-        data = self.payload[self._start:self._start+length]
+        if self.zeroCopy:
+            data = memoryview(self.payload)[self._start:self._start+length]
+            if self._views is None:
+                self._views = []
+            self._views.append(data)
+        else:
+            data = self.payload[self._start:self._start+length]
         self._start += length
 
         return data
 
 
+    def release(self):
+        '''
+        Releases all memoryviews returned by pop() in zero-copy mode,
+        using them afterwards raises ValueError. Payload can't be resized
+        while any of those views exist.
+        If the message was taken from a MessagePool, it is returned there,
+        so it must not be used (or referenced by anything) after this call
+        '''
+        if self._views:
+            for view in self._views:
+                view.release()
+            self._views.clear()
+
+        if self._pool is not None:
+            self._pool.put(self)
+
+
     def pack(self) -> bytes:
-        return self.hdr.pack() + self.payload[:self.hdr.size]
+        return b''.join(self.pack_buffers())
+
+
+    def pack_buffers(self) -> list[bytes | bytearray | memoryview]:
+        '''
+        Same as pack(), but returns header, payload and appended chunks as
+        separate buffers without copying them, so they can be passed to writelines()
+        '''
+        payloadLen = self.hdr.size - self._chunksSize
+        if len(self.payload) == payloadLen:
+            buffers = [self.hdr.pack(), self.payload]
+        else:
+            buffers = [self.hdr.pack(), memoryview(self.payload)[:payloadLen]]
+
+        if self._chunks:
+            buffers += self._chunks
+        return buffers
 
 
     def unpack(self, bytes_: bytes):
-        self.hdr.unpack(bytes_)
-        self.payload = bytearray(bytes_[Message.Header.HEADER_LEN : Message.Header.HEADER_LEN + self.hdr.size])
+        hdrLen = Message.Header.HEADER_LEN
+        if extLen := self.hdr.unpack(bytes_):
+            self.hdr.unpack_ext(bytes_[hdrLen:])
+            hdrLen += extLen
+        self.payload = bytearray(bytes_[hdrLen : hdrLen + self.hdr.size])
+        self._chunks = None
+        self._chunksSize = 0
+
+
+    def _materialize(self):
+        '''Copies appended chunks into payload'''
+        if not self._chunks:
+            return
+
+        payloadLen = self.hdr.size - self._chunksSize
+        self.payload[payloadLen:] = b''.join(self._chunks)
+        self._chunks = None
+        self._chunksSize = 0
+
+
+    def __getstate__(self):
+        # chunks and views may reference buffers that can't be pickled,
+        # pool belongs to the process the message was created in
+        self._materialize()
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state['_views'] = state['_pool'] = None
+        return (None, state)
+
+
+class MessagePool:
+    '''
+    Free list of Message objects. Allows hot receive loops to reuse message
+    objects instead of allocating new ones. Messages taken from the pool
+    are returned to it by Message.release()
+    '''
+
+    def __init__(self, maxSize: int):
+        '''
+        Parameters:
+            maxSize: maximum amount of free messages kept in the pool
+        '''
+        self._maxSize = maxSize
+        self._free: list[Message] = []
 
 
-@dataclass
+    def get(self, id: int = 0, size: int = 0, payload: bytearray | None = None,
+                  corrId: int | None = None, compressed: bool = False) -> Message:
+        if self._free:
+            msg = self._free.pop()
+            msg.hdr.id, msg.hdr.size, msg.hdr.corrId, msg.hdr.compressed = id, size, corrId, compressed
+            msg.payload = payload if payload is not None else bytearray()
+            msg._pool = self
+        else:
+            msg = Message(Message.Header(id, size, corrId, compressed),
+                          payload if payload is not None else bytearray(), _pool=self)
+        return msg
+
+
+    def put(self, msg: Message):
+        if len(self._free) >= self._maxSize:
+            msg._pool = None
+            return
+
+        # detached from the pool while it's free, so a repeated release() is a no-op
+        msg._pool = None
+        msg.payload = bytearray()
+        msg._start = 0
+        msg.zeroCopy = False
+        msg._chunks = None
+        msg._chunksSize = 0
+        self._free.append(msg)
+
+
+    def __len__(self) -> int:
+        return len(self._free)
+
+
+@dataclass(slots=True)
 class OwnedMessage:
     owner: Connection
-    msg: Message = field(default_factory=Message)
\ No newline at end of file
+    msg: Message = field(default_factory=Message)
+
+
+    def reply(self, msg: Message):
+        '''Sends msg back to the owner as a response to this msg'''
+        msg.hdr.corrId = self.msg.hdr.corrId
+        self.owner.send(msg)
\ No newline at end of file
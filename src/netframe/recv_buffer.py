@@ -0,0 +1,233 @@
+from netframe.message import Message, MessagePool
+
+
+class RecvBuffer:
+    '''
+    Preallocated, growable receive buffer. Raw bytes are written directly
+    into it (e.g. by socket recv_into) and complete frames are split off
+    from the front. Partial frames stay in the buffer until the rest arrives.
+    Payloads that don't fit into the initial buffer are received directly 
+    into the payload of the resulting message, which grows along with the
+    received data, never ahead of it, since the size comes from the peer.
+    Payloads above the stream threshold aren't collected at all, they are
+    split off in chunks as they arrive, see pop_chunk()
+    '''
+
+    # minimal amount of free space offered to the writer of the buffer
+    MIN_FREE_SPACE = 4096
+
+    def __init__(self, size: int, pool: MessagePool | None = None):
+        '''
+        Parameters:
+            size: initial size of the buffer
+            pool: if set, messages are taken from it instead of being allocated
+        '''
+        self._pool = pool
+        self._initSize = max(size, self.MIN_FREE_SPACE)
+        self._buffer = bytearray(self._initSize)
+        self._view = memoryview(self._buffer)
+
+        # unparsed data lies in [_start, _end)
+        self._start = 0
+        self._end = 0
+
+        # large msg, which payload is being received in place
+        self._largeMsg: Message | None = None
+        self._largeView: memoryview
+        self._largeFilled = 0
+
+        # payloads larger than that are streamed, 0 disables streaming
+        self.streamThreshold = 0
+        # part of the streamed payload that isn't popped yet
+        self._streamLeft = 0
+
+
+    def get_buffer(self, sizeHint: int = -1) -> memoryview:
+        '''Returns writable free space at the end of the buffer'''
+        if self._largeMsg is not None:
+            if self._largeFilled == len(self._largeView):
+                self._grow_large_payload()
+            return self._largeView[self._largeFilled:]
+
+        self._reserve(max(sizeHint, self.MIN_FREE_SPACE))
+        return self._view[self._end:]
+
+
+    def buffer_updated(self, nbytes: int):
+        '''Marks nbytes of the free space as filled with received data'''
+        if self._largeMsg is not None:
+            self._largeFilled += nbytes
+        else:
+            self._end += nbytes
+
+
+    def receiving_in_place(self) -> bool:
+        '''True if data is being received directly into a payload of a large msg'''
+        return self._largeMsg is not None
+
+
+    def streaming(self) -> bool:
+        '''True while the payload of a streamed msg is being received'''
+        return self._streamLeft > 0
+
+
+    def pop_frame(self) -> Message | None:
+        '''
+        Splits off the next complete frame, returns None if there is none.
+        Frame which payload exceeds streamThreshold is returned as soon as its
+        header is received, with empty payload, the payload is then split off
+        with pop_chunk()
+        '''
+        if self._largeMsg is not None:
+            return self._pop_large_frame()
+        if self._streamLeft:
+            return None
+
+        available = self._end - self._start
+        if available < Message.Header.HEADER_LEN:
+            return None
+
+        id, size = Message.Header.CODEC.unpack_from(self._view, self._start)
+        hdrLen = Message.Header.HEADER_LEN
+        corrId = None
+        compressed = False
+        if size & Message.Header.EXT_FLAG:
+            hdrLen += Message.Header.EXT_LEN
+            if available < hdrLen:
+                return None
+            flags, corrId = Message.Header.EXT_FIELDS_CODEC.unpack_from(self._view, self._start + Message.Header.HEADER_LEN)
+            if not flags & Message.Header.FLAG_CORR_ID:
+                corrId = None
+            compressed = bool(flags & Message.Header.FLAG_COMPRESSED)
+        size &= Message.Header.SIZE_MASK
+
+        if self.streamThreshold and size > self.streamThreshold:
+            self._streamLeft = size
+            self._consume(hdrLen)
+            return self._new_message(id, size, bytearray(), corrId, compressed)
+
+        frameLen = hdrLen + size
+        if available < frameLen:
+            if size >= self._initSize:
+                self._start_large_frame(id, size, corrId, compressed, hdrLen)
+                return self._pop_large_frame()
+
+            # make sure the whole frame fits, so it can be received in one go
+            self._reserve(frameLen - available)
+            return None
+
+        payloadStart = self._start + hdrLen
+        msg = self._new_message(id, size, bytearray(self._view[payloadStart : payloadStart + size]), corrId, compressed)
+        self._consume(frameLen)
+
+        return msg
+
+
+    def pop_chunk(self) -> bytes | None:
+        '''
+        Splits off the received part of the streamed payload, returns None
+        if nothing has arrived yet. Streaming is over once streaming() is False
+        '''
+        size = min(self._end - self._start, self._streamLeft)
+        if not size:
+            return None
+
+        chunk = bytes(self._view[self._start : self._start + size])
+        self._streamLeft -= size
+        self._consume(size)
+
+        return chunk
+
+
+    def clear(self):
+        '''Discards all received data'''
+        if self._largeMsg is not None:
+            self._largeView.release()
+            self._largeMsg = None
+        self._streamLeft = 0
+        self._reset()
+
+
+    def _consume(self, size: int):
+        self._start += size
+        if self._start == self._end:
+            self._reset()
+
+
+    def _new_message(self, id: int, size: int, payload: bytearray, corrId: int | None, compressed: bool) -> Message:
+        if self._pool is not None:
+            return self._pool.get(id, size, payload, corrId, compressed)
+        return Message(Message.Header(id, size, corrId, compressed), payload)
+
+
+    def _start_large_frame(self, id: int, size: int, corrId: int | None, compressed: bool, hdrLen: int):
+        # move the part of the payload that is already received
+        payloadStart = self._start + hdrLen
+        self._largeFilled = self._end - payloadStart
+        payload = bytearray(self._large_payload_size(size))
+        payload[:self._largeFilled] = self._view[payloadStart : self._end]
+
+        self._largeMsg = self._new_message(id, size, payload, corrId, compressed)
+        self._largeView = memoryview(payload)
+        self._reset()
+
+
+    def _large_payload_size(self, size: int) -> int:
+        '''At most doubles the received part, a header alone can't make it allocate much'''
+        return min(size, max(self._initSize, 2 * self._largeFilled))
+
+
+    def _grow_large_payload(self):
+        assert self._largeMsg is not None
+        # same as in _reserve(), the transport may still hold a view of 
+        # the old payload, so the received part is moved to a new one
+        payload = bytearray(self._large_payload_size(self._largeMsg.hdr.size))
+        payload[:self._largeFilled] = self._largeView[:self._largeFilled]
+        self._largeView.release()
+        self._largeMsg.payload = payload
+        self._largeView = memoryview(payload)
+
+
+    def _pop_large_frame(self) -> Message | None:
+        if self._largeMsg is None or self._largeFilled < self._largeMsg.hdr.size:
+            return None
+
+        msg = self._largeMsg
+        self._largeView.release()
+        self._largeMsg = None
+
+        return msg
+
+
+    def _reset(self):
+        self._start = self._end = 0
+        # give back the memory taken by an unusually large frame
+        if len(self._buffer) > self._initSize:
+            self._buffer = bytearray(self._initSize)
+            self._view = memoryview(self._buffer)
+
+
+    def _reserve(self, freeSpace: int):
+        '''Ensures there are at least freeSpace bytes after the received data'''
+        if len(self._buffer) - self._end >= freeSpace:
+            return
+
+        # move unparsed data to the front of the buffer
+        pending = self._end - self._start
+        if self._start:
+            self._view[:pending] = self._view[self._start : self._end]
+            self._start, self._end = 0, pending
+
+        if len(self._buffer) - self._end >= freeSpace:
+            return
+
+        newSize = len(self._buffer)
+        while newSize - self._end < freeSpace:
+            newSize *= 2
+
+        # the buffer can't be resized in place while the transport may
+        # still hold a view of it, so the pending data is moved to a new one
+        newBuffer = bytearray(newSize)
+        newBuffer[:pending] = self._view[:pending]
+        self._buffer = newBuffer
+        self._view = memoryview(newBuffer)
\ No newline at end of file
@@ -1,12 +1,45 @@
+import time
 import socket
 import logging
+import threading
 
-from multiprocessing import Event
+from dataclasses import dataclass, field
+from multiprocessing import Event, Pipe
+from multiprocessing.connection import wait
+from multiprocessing.synchronize import Event as EventClass
 
 from netframe.config import Config
+from netframe.message import Message
 from netframe.util import setup_logging
 from netframe.worker_pool import WorkerPool
-from netframe.server_worker import ServerWorker
+from netframe.load_table import LoadTable, WorkerLoad
+from netframe.compression import CompressionStats
+from netframe.shm_ring import ShmRingReader, ShmRingWriter
+from netframe.bus import WorkerBus
+from netframe.shared_cache import SharedCache
+from netframe.server_worker import ServerWorker, INIT_FAILED_EXIT_CODE
+
+
+# how often workers' utilization is checked when autoscaling is enabled, seconds
+SCALE_CHECK_INTERVAL = 1
+# delay before a crashed worker is respawned, doubles with every crash 
+# in a row up to RESPAWN_MAX_DELAY, seconds
+RESPAWN_DELAY = 0.1
+RESPAWN_MAX_DELAY = 30
+# worker that has run for that long isn't considered to crash in a row, seconds
+RESPAWN_RESET_PERIOD = 60
+
+
+@dataclass
+class ServerStats:
+    # workers that have finished unexpectedly, in total and by worker id
+    crashes: int = 0
+    crashesPerWorker: dict[int, int] = field(default_factory=dict)
+    # crashed workers launched again
+    restarts: int = 0
+    # workers launched and retired by autoscaling
+    workersAdded: int = 0
+    workersRetired: int = 0
 
 
 class Server:
@@ -15,37 +48,91 @@ class Server:
         self._stopEvent = Event()
         self._workers = WorkerPool(config.workerNum)
 
+        # events that signal every worker to quit or retire, by worker id
+        self._workerStops: dict[int, EventClass] = {}
+        # workers that are retired, but still drain their connections
+        self._retiring = set[int]()
+        # listen sockets are kept open to launch workers again or add new ones
+        self._listenSocks: list[socket.socket] = []
+        self._autoscale = config.maxWorkerNum > config.workerNum
+
+        # supervisor thread respawns crashed workers and does autoscaling
+        self._supervisor: threading.Thread | None = None
+        self._supervisorBell, self._supervisorBellSender = Pipe(duplex=False)
+        # guards the set of workers changed by the supervisor
+        self._workersLock = threading.Lock()
+        # when crashed workers should be launched again, by worker id
+        self._respawns: dict[int, float] = {}
+        self._crashesInRow: dict[int, int] = {}
+        self._startTimes: dict[int, float] = {}
+        self._stats = ServerStats()
+        # how many times every worker id was launched, makes connection ids unique
+        self._generations: dict[int, int] = {}
+
+        # rings between every pair of workers, kept to launch workers again or add new ones
+        self._busMesh: dict[tuple[int, int], tuple[ShmRingReader, ShmRingWriter]] = {}
+        # passed to every worker's app in the context
+        self._sharedCache: SharedCache | None = None
+
+        # CPU time reported by every worker and the moment it was read
+        self._cpuSamples: dict[int, tuple[int, float]] = {}
+        self._highLoadSince: float | None = None
+        self._lowLoadSince: float | None = None
+
         setup_logging()
         self._logger = logging.getLogger("netframe.error")
 
 
     def start(self):
-        '''Creates listen socket, launches server workers'''
-        if self._workers.is_started():
+        '''Creates listen socket(s), launches server workers'''
+        if self._is_running():
             raise RuntimeError("Server already running")
 
         self._logger.info(f"Starting server on {self._config.ip}:{self._config.port}")
 
-        # create listen socket
-        listenSock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self._config.reusePort and not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+        if self._config.reusePort and self._autoscale:
+            raise RuntimeError("Autoscaling is not supported with reusePort")
+
+        # create listen sockets, either one shared by all workers or one per worker
         try:
-            listenSock.bind((self._config.ip, self._config.port))
+            for _ in range(self._config.workerNum if self._config.reusePort else 1):
+                self._listenSocks.append(self._create_listen_socket())
         except OSError as e:
             self._logger.error(f"Failed to create listen socket: {e}")
+            self._close_listen_sockets()
             raise
-        listenSock.listen()
-        listenSock.set_inheritable(True)
+
+        self._loadTable = LoadTable(max(self._config.workerNum, self._config.maxWorkerNum))
+        self._stopEvent.clear()
+        self._workerStops = {i: Event() for i in range(self._config.workerNum)}
+        self._retiring.clear()
+        self._respawns.clear()
+        self._crashesInRow.clear()
+        self._startTimes = {i: time.monotonic() for i in range(self._config.workerNum)}
+        self._stats = ServerStats()
+        for workerId in range(self._config.workerNum):
+            self._generations[workerId] = self._generations.get(workerId, -1) + 1
+        if self._config.busCapacity and len(self._loadTable) > 1:
+            self._busMesh = WorkerBus.create_mesh(len(self._loadTable), self._config.busCapacity)
+        if self._config.sharedCacheSize:
+            self._sharedCache = SharedCache(self._config.sharedCacheSize)
 
         # launch server worker processes
         try:
             self._workers.start(target=ServerWorker.run, 
-                                args=(listenSock, self._config, self._stopEvent))
+                                args=self._worker_args(),
+                                workerArgs=[self._own_worker_args(i) for i in range(self._config.workerNum)])
         except TypeError as e:
             self._logger.error(f"Non-pickleable object in context: {e}")
+            self._close_listen_sockets()
+            self._release_shared_memory()
             raise
 
-        # don't need listen socket in this proc any more
-        listenSock.close()
+        if self._config.respawnWorkers or self._autoscale:
+            self._supervisor = threading.Thread(target=self._supervise, daemon=True)
+            self._supervisor.start()
 
 
     def stop(self, timeout: float | None=None):
@@ -53,10 +140,310 @@ class Server:
         Waits for server worker processes to finish within timeout, 
         shuts them down forcefully after timeout expires
         '''
-        if not self._workers.is_started():
+        if not self._is_running():
             raise RuntimeError("Server is not running")
 
+        if self._supervisor is not None:
+            self._supervisorBellSender.send_bytes(b'')
+            self._supervisor.join()
+            self._supervisor = None
+            while self._supervisorBell.poll():
+                self._supervisorBell.recv_bytes()
+
+        self._logger.info(f"Connections accepted by workers: {self.connection_distribution(accepted=True)}")
+
         # signals workers to stop
         self._stopEvent.set()
+        for stopEvent in self._workerStops.values():
+            stopEvent.set()
+
+        self._workers.stop(timeout)
+        self._close_listen_sockets()
+        self._release_shared_memory()
+
+
+    def connection_distribution(self, accepted: bool=False) -> list[int]:
+        '''
+        Returns the number of connections currently served by every worker or,
+        if accepted is set, the number of connections accepted by every worker
+        since start. Counters are updated by workers, so values may lag a bit
+        '''
+        if not self._is_running():
+            raise RuntimeError("Server is not running")
+
+        column = LoadTable.ACCEPTED if accepted else LoadTable.CONNECTIONS
+        with self._workersLock:
+            return [self._loadTable[workerId, column] for workerId in self._workers.worker_ids()]
+
+
+    def worker_loads(self) -> list[WorkerLoad]:
+        '''Returns load reported by every worker, see connection_distribution()'''
+        if not self._is_running():
+            raise RuntimeError("Server is not running")
+
+        with self._workersLock:
+            return [self._loadTable.load(workerId) for workerId in self._workers.worker_ids()]
+
+
+    def compression_stats(self) -> CompressionStats:
+        '''
+        Returns compression counters summed over all workers, see 
+        Config.compressMinSize. Workers report them periodically, so values
+        may lag a bit, counters of a crashed worker are lost
+        '''
+        if not self._is_running():
+            raise RuntimeError("Server is not running")
+
+        total = CompressionStats()
+        with self._workersLock:
+            for workerId in self._workers.worker_ids():
+                stats = self._loadTable.compression_stats(workerId)
+                for name, value in vars(stats).items():
+                    setattr(total, name, getattr(total, name) + value)
+        return total
+
+
+    @staticmethod
+    def send_to(connId: int, msg: Message):
+        '''
+        Sends msg to the connection with the given id (see Connection.id),
+        whichever worker serves it. Must be called from the event loop of a 
+        worker, e.g. from a ServerApp callback. Msgs for connections of other 
+        workers are passed through the bus (see Config.busCapacity) and are
+        dropped, like msgs for closed connections, if the connection is gone 
+        by the time they arrive
+        '''
+        worker = ServerWorker.current
+        if worker is None:
+            raise RuntimeError("send_to() can only be called by server workers")
+        worker.send_to(connId, msg)
+
+
+    @staticmethod
+    def publish(topic: str, msg: Message):
+        '''
+        Sends msg to every connection subscribed to the topic (see 
+        Connection.subscribe()), whichever worker serves it. Msg is packed
+        once, every subscriber gets the same buffer. Must be called from the
+        event loop of a worker, subscribers of other workers are reached 
+        through the bus (see Config.busCapacity)
+        '''
+        worker = ServerWorker.current
+        if worker is None:
+            raise RuntimeError("publish() can only be called by server workers")
+        worker.publish(topic, msg)
+
+
+    def shared_cache(self) -> SharedCache | None:
+        '''
+        Returns the cache shared by workers, see Config.sharedCacheSize, 
+        e.g. to fill it before clients connect or to check its stats
+        '''
+        if not self._is_running():
+            raise RuntimeError("Server is not running")
+        return self._sharedCache
+
+
+    def stats(self) -> ServerStats:
+        '''Returns counters of worker crashes, restarts and autoscaling events'''
+        with self._workersLock:
+            stats = ServerStats(**vars(self._stats))
+            stats.crashesPerWorker = dict(self._stats.crashesPerWorker)
+            return stats
+
+
+    def _is_running(self) -> bool:
+        # listen sockets are open from start() till stop(), even while no worker is running
+        return bool(self._listenSocks)
+
+
+    def _worker_args(self) -> tuple[Config, EventClass, LoadTable, SharedCache | None]:
+        return (self._config, self._stopEvent, self._loadTable, self._sharedCache)
+
+
+    def _own_worker_args(self, workerId: int) -> tuple[socket.socket, int, EventClass, int, WorkerBus | None]:
+        bus = WorkerBus.of_worker(self._busMesh, workerId) if self._busMesh else None
+        return (self._listenSocks[workerId % len(self._listenSocks)], workerId, self._workerStops[workerId], 
+                self._generations[workerId], bus)
+
+
+    def _create_listen_socket(self) -> socket.socket:
+        listenSock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            if self._config.reusePort:
+                listenSock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            listenSock.bind((self._config.ip, self._config.port))
+            listenSock.listen()
+        except OSError:
+            listenSock.close()
+            raise
+        listenSock.set_inheritable(True)
+        return listenSock
+
+
+    def _close_listen_sockets(self):
+        for sock in self._listenSocks:
+            sock.close()
+        self._listenSocks.clear()
+
+
+    def _release_shared_memory(self):
+        for reader, writer in self._busMesh.values():
+            reader.release(unlink=True)
+            writer.release()
+        self._busMesh.clear()
+
+        if self._sharedCache is not None:
+            self._sharedCache.release(unlink=True)
+            self._sharedCache = None
+
+
+    def _supervise(self):
+        '''
+        Respawns workers that have finished unexpectedly and, if autoscaling
+        is enabled, adds and retires workers. Runs in a separate thread
+        '''
+        scaleInterval = min(SCALE_CHECK_INTERVAL, self._config.scalePeriod)
+        nextScaleCheck = time.monotonic() + scaleInterval
+
+        while True:
+            deadlines = list(self._respawns.values())
+            if self._autoscale:
+                deadlines.append(nextScaleCheck)
+            timeout = max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+
+            with self._workersLock:
+                sentinels = self._workers.sentinels()
+            ready = wait([self._supervisorBell, *sentinels], timeout)
+            if self._supervisorBell in ready:
+                # Server is stopping
+                return
+
+            self._reap_workers()
+            self._respawn_workers()
+            if self._autoscale and time.monotonic() >= nextScaleCheck:
+                self._check_utilization()
+                nextScaleCheck = time.monotonic() + scaleInterval
+
+
+    def _reap_workers(self):
+        with self._workersLock:
+            finished = self._workers.reap()
+
+        now = time.monotonic()
+        for workerId, exitCode in finished.items():
+            self._cpuSamples.pop(workerId, None)
+            if workerId in self._retiring:
+                self._retiring.discard(workerId)
+                self._workerStops.pop(workerId, None)
+                continue
+
+            self._logger.error(f"Worker {workerId} has finished unexpectedly, exit code: {exitCode}")
+            # its row may claim the worker still accepts connections
+            self._loadTable.reset(workerId)
+            with self._workersLock:
+                self._stats.crashes += 1
+                self._stats.crashesPerWorker[workerId] = self._stats.crashesPerWorker.get(workerId, 0) + 1
+            if not self._config.respawnWorkers:
+                self._workerStops.pop(workerId, None)
+                continue
+            # a worker that has failed to start or quit on its own would do the same again
+            if exitCode in (0, INIT_FAILED_EXIT_CODE):
+                self._logger.error(f"Worker {workerId} isn't respawned, since it has "
+                                   f"{'failed to start' if exitCode else 'quit on its own'}")
+                self._workerStops.pop(workerId, None)
+                continue
+
+            if now - self._startTimes[workerId] >= RESPAWN_RESET_PERIOD:
+                self._crashesInRow[workerId] = 0
+            delay = min(RESPAWN_DELAY * 2**self._crashesInRow.get(workerId, 0), RESPAWN_MAX_DELAY)
+            self._crashesInRow[workerId] = self._crashesInRow.get(workerId, 0) + 1
+            self._respawns[workerId] = now + delay
+
+
+    def _respawn_workers(self):
+        now = time.monotonic()
+        for workerId, dueTime in list(self._respawns.items()):
+            if dueTime > now:
+                continue
+
+            del self._respawns[workerId]
+            self._logger.info(f"Respawning worker {workerId}")
+            self._launch_worker(workerId)
+            with self._workersLock:
+                self._stats.restarts += 1
+
+
+    def _launch_worker(self, workerId: int):
+        self._workerStops[workerId] = Event()
+        self._startTimes[workerId] = time.monotonic()
+        self._generations[workerId] = self._generations.get(workerId, -1) + 1
+        with self._workersLock:
+            self._loadTable.reset(workerId)
+            self._workers.add(workerId, ServerWorker.run, (*self._own_worker_args(workerId), *self._worker_args()))
+
+
+    def _check_utilization(self):
+        '''
+        Adds a worker when workers' average CPU utilization stays high 
+        and retires one when it stays low
+        '''
+        with self._workersLock:
+            workerIds = self._workers.worker_ids()
+        # workers waiting to be respawned keep their place
+        active = [workerId for workerId in workerIds if workerId not in self._retiring] + list(self._respawns)
+
+        utilization = []
+        now = time.monotonic()
+        for workerId in active:
+            # workers that are still starting up haven't reported anything
+            if not self._loadTable[workerId, LoadTable.RUNNING]:
+                continue
+            cpuTime = self._loadTable[workerId, LoadTable.CPU_TIME]
+            if workerId in self._cpuSamples:
+                prevCpuTime, prevNow = self._cpuSamples[workerId]
+                utilization.append(min((cpuTime - prevCpuTime) / 1e6 / (now - prevNow), 1))
+            self._cpuSamples[workerId] = (cpuTime, now)
+        if not utilization:
+            return
+
+        average = sum(utilization) / len(utilization)
+        isHigh = average >= self._config.scaleUpUtilization
+        isLow = average <= self._config.scaleDownUtilization
+        self._highLoadSince = (self._highLoadSince or now) if isHigh else None
+        self._lowLoadSince = (self._lowLoadSince or now) if isLow else None
+
+        if self._highLoadSince is not None and now - self._highLoadSince >= self._config.scalePeriod and \
+           len(active) < self._config.maxWorkerNum:
+            self._add_worker(active)
+            self._highLoadSince = None
+        elif self._lowLoadSince is not None and now - self._lowLoadSince >= self._config.scalePeriod and \
+             len(active) > self._config.workerNum:
+            self._retire_worker([workerId for workerId in active if workerId not in self._respawns])
+            self._lowLoadSince = None
+
+
+    def _add_worker(self, active: list[int]):
+        # ids of retiring workers are taken until they finish
+        workerId = min(set(range(self._config.maxWorkerNum)) - set(active) - self._retiring, default=None)
+        if workerId is None:
+            return
+
+        self._logger.info(f"Adding worker {workerId}")
+        self._launch_worker(workerId)
+        with self._workersLock:
+            self._stats.workersAdded += 1
+
+
+    def _retire_worker(self, candidates: list[int]):
+        if not candidates:
+            return
+
+        # the worker with the fewest connections is the cheapest to drain
+        workerId = min(candidates, key=lambda workerId: self._loadTable[workerId, LoadTable.CONNECTIONS])
 
-        self._workers.stop(timeout)
\ No newline at end of file
+        self._logger.info(f"Retiring worker {workerId}")
+        self._retiring.add(workerId)
+        self._workerStops[workerId].set()
+        with self._workersLock:
+            self._stats.workersRetired += 1
\ No newline at end of file
@@ -1,19 +1,62 @@
 import os
 import sys
+import time
+import errno
 import socket
 import asyncio
 import logging
 
+from typing import Coroutine
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing.synchronize import Event as EventClass
 
-from netframe.config import Config, ServerApp
-from netframe.message import OwnedMessage
+from netframe.config import Config, ServerApp, RECV_ENGINE
+from netframe.message import Message, OwnedMessage, MessagePool
 from netframe.connection import Connection, ConnOwner
-from netframe.util import loop_policy_setup
+from netframe.buffered_connection import FrameProtocol
+from netframe.load_table import LoadTable
+from netframe.bus import WorkerBus
+from netframe.shared_cache import SharedCache
+from netframe.compression import CompressionStats
+from netframe.util import loop_policy_setup, pin_to_cpus
 if sys.platform == "win32":
     from netframe.util import win_socket_share
 
 
+# how often worker measures its event loop lag, seconds
+LAG_PROBE_INTERVAL = 0.1
+# weight of the latest lag sample in the smoothed lag
+LAG_SMOOTHING = 0.3
+# pause before the next accept if it failed due to lack of resources, seconds
+ACCEPT_RETRY_DELAY = 1
+# how often retired worker checks whether its connections are closed, seconds
+DRAIN_CHECK_INTERVAL = 0.1
+# connection id consists of the worker id, the generation of the worker
+# (how many times a worker with that id was launched before) and a sequence 
+# number, so ids aren't reused by a respawned worker
+CONN_ID_WORKER_SHIFT = 48
+CONN_ID_GENERATION_SHIFT = 32
+CONN_ID_GENERATION_MASK = 0xFFFF
+# exit code of a worker which app has failed to initialize, it isn't respawned
+INIT_FAILED_EXIT_CODE = 3
+
+
+class _HandlerQueue:
+    '''Async or offloaded on_message() calls of one connection'''
+
+    def __init__(self):
+        self.running = 0
+        # msgs waiting for one of the running calls to finish
+        self.pending = deque[OwnedMessage]()
+        # the latest offloaded call, replies are sent after the ones of previous msgs
+        self.lastOffload: asyncio.Task | None = None
+        # on_client_disconnect() is deferred until all received msgs are handled
+        self.disconnected = False
+        # set once all calls are done, a streamed msg waits for it
+        self.idle: asyncio.Future | None = None
+
+
 class ServerWorker(ConnOwner):
     '''
     Represents a process running an asyncio event loop.
@@ -21,42 +64,128 @@ class ServerWorker(ConnOwner):
     that handles the events occuring on worker's connections
     '''
 
+    # worker running in this process, see Server.send_to()
+    current: 'ServerWorker | None' = None
+
     @staticmethod
     def run(listenSock: socket.socket, 
+            workerId: int,
+            shouldStop: EventClass,
+            generation: int,
+            bus: WorkerBus | None,
             config: Config,
-            shouldStop: EventClass):
+            serverStopping: EventClass,
+            loadTable: LoadTable,
+            sharedCache: SharedCache | None):
 
         if sys.platform == "win32":
             listenSock = win_socket_share(listenSock)
 
+        if config.cpuAffinity is not None:
+            pin_to_cpus(config.cpuAffinity, workerId)
+
+        context = config.context
+        if sharedCache is not None:
+            context = {**context, SharedCache.CONTEXT_KEY: sharedCache}
+
         try:
-            app = config.app(config.context)
+            app = config.app(context)
         except BaseException as e:
             logger = logging.getLogger("netframe.error")
             logger.error(f"Exception occured during initialization of user's application: {e}")
-            return
+            sys.exit(INIT_FAILED_EXIT_CODE)
 
-        worker = ServerWorker(listenSock, config, app, shouldStop)
+        worker = ServerWorker(listenSock, config, app, shouldStop, loadTable, workerId, serverStopping, generation, bus)
         worker.serve()
 
 
     def __init__(self, listenSock: socket.socket, 
                        config: Config,
                        app: ServerApp,
-                       shouldStop: EventClass):
+                       shouldStop: EventClass,
+                       loadTable: LoadTable | None = None,
+                       workerId: int = 0,
+                       serverStopping: EventClass | None = None,
+                       generation: int = 0,
+                       bus: WorkerBus | None = None):
         '''
         Parameters:
-            listenSock: shared listen socket that is used to accept new connections
+            listenSock: listen socket that is used to accept new connections, 
+                        either shared by all workers or owned by this one
             config: configuration params
             app: user's application
-            shouldStop: event that is set by Server to signal ServerWorkers to quit
+            shouldStop: event that is set by Server to signal the worker to quit
+            loadTable: if set, worker reports its load into its row of the table
+            workerId: index of the worker and its row in loadTable
+            serverStopping: if set, shouldStop means that the worker is retired
+                            and should drain its connections first, unless 
+                            serverStopping is set as well
+            generation: how many times a worker with this id was launched before
+            bus: if set, msgs for connections of other workers are passed through it
         '''
         self._listenSock = listenSock
         self._config = config
         self._app = app
         self._shouldStop = shouldStop
+        self._serverStopping = serverStopping
 
         self._connections = set[Connection]()  
+        self._loadTable = loadTable
+        self._workerId = workerId
+
+        # connections by their ids, see Server.send_to()
+        self._connsById: dict[int, Connection] = {}
+        self._connIdBase = workerId << CONN_ID_WORKER_SHIFT | \
+                           (generation & CONN_ID_GENERATION_MASK) << CONN_ID_GENERATION_SHIFT
+        self._nextConnSeq = 0
+        self._bus = bus
+        # connections subscribed to every topic, see Server.publish()
+        self._subscribers: dict[str, set[Connection]] = {}
+
+        # accepting is paused while the worker is overloaded, only with a shared
+        # listen socket, since connections keep coming to a worker's own socket
+        self._acceptAllowed = asyncio.Event()
+        self._acceptAllowed.set()
+        self._acceptTask: asyncio.Task
+        self._setupTasks = set[asyncio.Task]()
+        self._throttleAccept = loadTable is not None and not config.reusePort and \
+                               bool(config.acceptPauseConnections or config.acceptPauseLag)
+        # smoothed event loop lag, seconds
+        self._loopLag = 0.0
+        self._lagProbe: asyncio.TimerHandle
+
+        # received msgs are reused if user returns them with Message.release()
+        self._messagePool = MessagePool(config.messagePoolSize) if config.messagePoolSize else None
+
+        # counters of all connections, reported via loadTable
+        self._compressionStats = CompressionStats()
+
+        # if app implements on_messages(), msgs received during 
+        # one loop tick are collected and passed to it at once
+        onMessages = getattr(type(app), 'on_messages', None)
+        self._batchMsgs = onMessages is not None and onMessages is not ServerApp.on_messages
+        self._pendingMsgs: list[OwnedMessage] = []
+
+        # callbacks defined with async def are run as tasks, on_message() 
+        # calls are queued per connection to limit their concurrency
+        self._asyncCallbacks = {name: asyncio.iscoroutinefunction(getattr(app, name, None))
+                                for name in ('on_client_connect', 'on_message', 'on_messages', 
+                                             'on_client_disconnect', 'on_slow_client', 'on_message_start',
+                                             'on_message_chunk', 'on_message_end')}
+        self._handlerQueues: dict[Connection, _HandlerQueue] = {}
+        self._appTasks = set[asyncio.Task]()
+
+        # if app implements on_message_chunk(), large payloads are passed to it as they arrive
+        onMessageChunk = getattr(type(app), 'on_message_chunk', None)
+        self._streamMsgs = onMessageChunk is not None and onMessageChunk is not ServerApp.on_message_chunk
+
+        # on_message() marked with @offload runs in a thread pool, calls
+        # are queued per connection the same way as async ones
+        self._offloadPool: ThreadPoolExecutor | None = None
+        if getattr(getattr(app, 'on_message', None), '_netframeOffload', False) is True:
+            self._offloadPool = ThreadPoolExecutor(config.offloadThreads or None, 
+                                                   thread_name_prefix="netframe-offload")
+            self._offloadSlots = asyncio.Semaphore(config.offloadQueueSize)
 
         self._logger = logging.getLogger("netframe.error")
 
@@ -67,24 +196,164 @@ class ServerWorker(ConnOwner):
 
 
     async def _serve(self):
-        self._server = await asyncio.start_server(
-            client_connected_cb=self._process_new_connection, sock=self._listenSock)
+        loop = asyncio.get_running_loop()
+        self._listenSock.setblocking(False)
+        self._acceptTask = asyncio.create_task(self._accept())
+        if self._loadTable is not None:
+            self._loadTable.reset(self._workerId)
+            self._loadTable[self._workerId, LoadTable.RUNNING] = 1
+        self._probe_loop_lag(loop.time())
+        ServerWorker.current = self
+        if self._bus is not None:
+            self._bus.start(self._deliver, self._deliver_published)
 
         self._logger.info(f"Started server process({os.getpid()})")
 
-        # block until Server.stop() is called
-        loop = asyncio.get_event_loop()
+        # block until Server.stop() is called or the worker is retired
         waitForEvent = lambda event: event.wait()
         await loop.run_in_executor(None, waitForEvent, self._shouldStop)
 
+        if self._serverStopping is not None and not self._serverStopping.is_set():
+            await self._drain()
         await self._shutdown()
 
         self._logger.info(f"Finished server process({os.getpid()})")
 
 
+    async def _drain(self):
+        '''
+        Stops accepting new connections and waits for clients to close 
+        existing ones within drainTimeout or until Server is stopped
+        '''
+        self._logger.info(f"Server process({os.getpid()}) is retiring")
+
+        # a connection accepted right at this moment is reset
+        self._acceptTask.cancel()
+        self._listenSock.close()
+        assert self._loadTable is not None
+        self._loadTable[self._workerId, LoadTable.RUNNING] = 0
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._config.drainTimeout
+        while (self._connections or self._setupTasks) and loop.time() < deadline:
+            if self._serverStopping is not None and self._serverStopping.is_set():
+                break
+            await asyncio.sleep(DRAIN_CHECK_INTERVAL)
+
+
+    async def _accept(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # an accept that is already in progress isn't cancelled on pause, 
+            # since the connection it takes would be lost, so a paused worker
+            # may get one more connection
+            await self._acceptAllowed.wait()
+            try:
+                sock, _ = await loop.sock_accept(self._listenSock)
+            except OSError as e:
+                self._logger.error(f"Failed to accept connection: {e}")
+                if e.errno in (errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.ENOMEM):
+                    # give connections some time to close and free resources
+                    await asyncio.sleep(ACCEPT_RETRY_DELAY)
+                continue
+
+            # connections being set up count as load, so a burst of 
+            # them can't get past the limit before accepting is paused
+            task = asyncio.create_task(self._set_up_connection(sock))
+            self._setupTasks.add(task)
+            task.add_done_callback(self._on_connection_set_up)
+            self._report_connections()
+            # sock_accept() doesn't suspend while connections are waiting in
+            # the backlog, let other tasks run during a burst of connections
+            await asyncio.sleep(0)
+
+
+    async def _set_up_connection(self, sock: socket.socket):
+        loop = asyncio.get_running_loop()
+        try:
+            if self._config.recvEngine == RECV_ENGINE.BUFFERED:
+                # protocol passes the connection to _accept_connection() once it's made
+                await loop.connect_accepted_socket(
+                    lambda: FrameProtocol(self, self._accept_connection, 
+                                          self._config.recvBufferSize, self._messagePool), sock)
+            else:
+                reader = asyncio.StreamReader()
+                transport, protocol = await loop.connect_accepted_socket(
+                    lambda: asyncio.StreamReaderProtocol(reader), sock)
+                writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+                await self._process_new_connection(reader, writer)
+        except OSError as e:
+            self._logger.error(f"Failed to set up accepted connection: {e}")
+            sock.close()
+
+
+    def _on_connection_set_up(self, task: asyncio.Task):
+        self._setupTasks.discard(task)
+        self._report_connections()
+
+
     async def _process_new_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._accept_connection(Connection(reader, writer, self, self._messagePool))
+
+
+    def _probe_loop_lag(self, expectedTime: float):
+        '''Measures how late the event loop runs a callback scheduled in advance'''
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._loopLag += (max(now - expectedTime, 0) - self._loopLag) * LAG_SMOOTHING
+        if self._loadTable is not None:
+            self._loadTable[self._workerId, LoadTable.LOOP_LAG] = int(self._loopLag * 1e6)
+            self._loadTable[self._workerId, LoadTable.CPU_TIME] = int(time.process_time() * 1e6)
+            self._loadTable.write_compression_stats(self._workerId, self._compressionStats)
+            self._balance_accepting()
+
+        self._lagProbe = loop.call_later(LAG_PROBE_INTERVAL, self._probe_loop_lag, now + LAG_PROBE_INTERVAL)
+
+
+    def _balance_accepting(self):
+        '''
+        Stops accepting new connections while this worker is overloaded and
+        some other worker isn't, so new connections land on idle workers.
+        If every worker is overloaded, all of them keep accepting
+        '''
+        if not self._throttleAccept:
+            return
+
+        assert self._loadTable is not None
+        pause = self._is_overloaded(self._workerId) and any(
+            not self._is_overloaded(workerId) 
+            for workerId in range(len(self._loadTable)) 
+            if workerId != self._workerId and self._loadTable[workerId, LoadTable.RUNNING])
+        if pause != self._acceptAllowed.is_set():
+            return
+
+        if pause:
+            self._acceptAllowed.clear()
+        else:
+            self._acceptAllowed.set()
+        self._loadTable[self._workerId, LoadTable.PAUSED] = int(pause)
+
+
+    def _is_overloaded(self, workerId: int) -> bool:
+        assert self._loadTable is not None
+        maxConnections = self._config.acceptPauseConnections
+        maxLag = self._config.acceptPauseLag
+        return bool(maxConnections and self._loadTable[workerId, LoadTable.CONNECTIONS] >= maxConnections or
+                    maxLag and self._loadTable[workerId, LoadTable.LOOP_LAG] >= maxLag * 1e6)
+
+
+    def _accept_connection(self, newConn: Connection):
+        newConn.id = self._connIdBase | self._nextConnSeq
+        self._nextConnSeq += 1
+        self._connsById[newConn.id] = newConn
+
+        if self._asyncCallbacks['on_client_connect']:
+            # the connection counts as load while the app decides
+            self._connections.add(newConn)
+            self._schedule_callback('on_client_connect', self._accept_connection_async(newConn))
+            return
+
         allowConnection = False
-        newConn = Connection(reader, writer, self)
 
         try:
             allowConnection = self._app.on_client_connect(newConn)
@@ -92,8 +361,31 @@ class ServerWorker(ConnOwner):
             self._logger.error(f"Exception occured during execution of "
                                f"user-supplied 'on_client_connect' callback: {e}")
 
+        self._finish_accept(newConn, allowConnection)
+
+
+    async def _accept_connection_async(self, newConn: Connection):
+        allowConnection = False
+        try:
+            allowConnection = await self._app.on_client_connect(newConn)
+        finally:
+            self._finish_accept(newConn, allowConnection)
+
+
+    def _finish_accept(self, newConn: Connection, allowConnection: bool):
         if allowConnection:
             self._connections.add(newConn)
+            if self._config.writeHighWater:
+                newConn.set_write_limits(self._config.writeHighWater, self._config.writeLowWater, 
+                                         self._config.slowConsumerPolicy)
+            if self._streamMsgs:
+                newConn.set_stream_threshold(self._config.streamThreshold)
+            # decompressed msgs are counted even if compression of sent ones is disabled
+            newConn.set_compression(self._config.compressMinSize, self._config.compressLevel, 
+                                    self._config.compressContext, self._config.compressOffloadSize, 
+                                    self._compressionStats, self._config.maxInflatedSize)
+            if self._loadTable is not None:
+                self._loadTable[self._workerId, LoadTable.ACCEPTED] += 1
             newConn.recv()
         else:
             newConn.shutdown()
@@ -101,6 +393,14 @@ class ServerWorker(ConnOwner):
 
     # ConnOwner protocol method
     def process_msg(self, msg: OwnedMessage):
+        if self._batchMsgs:
+            self._queue_msgs([msg])
+            return
+
+        if self._asyncCallbacks['on_message'] or self._offloadPool is not None:
+            self._queue_handler(msg)
+            return
+
         try:
             self._app.on_message(msg)
         except BaseException as e:
@@ -108,9 +408,210 @@ class ServerWorker(ConnOwner):
                                f"user-supplied 'on_message' callback: {e}")
 
 
+    # ConnOwner protocol method
+    def process_msgs(self, msgs: list[OwnedMessage]):
+        if self._batchMsgs:
+            self._queue_msgs(msgs)
+            return
+
+        for msg in msgs:
+            # on_message() may shut the connection down
+            if not msg.owner.isActive:
+                break
+            self.process_msg(msg)
+
+
+    def _queue_msgs(self, msgs: list[OwnedMessage]):
+        if not self._pendingMsgs:
+            asyncio.get_running_loop().call_soon(self._flush_msgs)
+        self._pendingMsgs += msgs
+
+
+    def _flush_msgs(self) -> asyncio.Task | None:
+        '''Passes the pending msgs to on_messages(), returns its task if it's async'''
+        batch, self._pendingMsgs = self._pendingMsgs, []
+        if not batch:
+            # already flushed ahead of a streamed msg
+            return None
+        if self._asyncCallbacks['on_messages']:
+            return self._schedule_callback('on_messages', self._app.on_messages(batch))
+
+        try:
+            self._app.on_messages(batch)
+        except BaseException as e:
+            self._logger.error(f"Exception occured during execution of "
+                               f"user-supplied 'on_messages' callback: {e}")
+        return None
+
+
+    def _queue_handler(self, msg: OwnedMessage):
+        '''
+        Runs async or offloaded on_message() for msg once the connection has less 
+        than messageConcurrency of them running. Reading from the 
+        connection is paused while its msgs wait for their turn
+        '''
+        conn = msg.owner
+        queue = self._handlerQueues.get(conn)
+        if queue is None:
+            queue = self._handlerQueues[conn] = _HandlerQueue()
+
+        if queue.running < self._config.messageConcurrency:
+            self._start_handler(conn, queue, msg)
+        else:
+            if not queue.pending:
+                conn.pause_reading()
+            queue.pending.append(msg)
+
+
+    def _start_handler(self, conn: Connection, queue: '_HandlerQueue', msg: OwnedMessage):
+        queue.running += 1
+        if self._offloadPool is not None:
+            task = self._schedule_callback('on_message', self._offload(msg, queue.lastOffload))
+            queue.lastOffload = task
+        else:
+            task = self._schedule_callback('on_message', self._app.on_message(msg))
+        task.add_done_callback(lambda _: self._on_handler_done(conn, queue))
+
+
+    async def _offload(self, msg: OwnedMessage, prevTask: asyncio.Task | None):
+        '''
+        Runs on_message() in the offload pool, sends msgs it returns as 
+        replies to msg after replies to the previous msgs of the connection
+        '''
+        try:
+            async with self._offloadSlots:
+                loop = asyncio.get_running_loop()
+                replies = await loop.run_in_executor(self._offloadPool, self._app.on_message, msg)
+        finally:
+            # wait() doesn't cancel the previous call if this one is cancelled
+            if prevTask is not None and not prevTask.done():
+                await asyncio.wait([prevTask])
+
+        if isinstance(replies, Message):
+            replies = [replies]
+        for reply in replies or ():
+            msg.reply(reply)
+
+
+    def _on_handler_done(self, conn: Connection, queue: '_HandlerQueue'):
+        queue.running -= 1
+        if queue.pending:
+            self._start_handler(conn, queue, queue.pending.popleft())
+            if not queue.pending:
+                conn.resume_reading()
+        elif not queue.running:
+            del self._handlerQueues[conn]
+            if queue.idle is not None:
+                queue.idle.set_result(None)
+            if queue.disconnected:
+                self._notify_disconnect(conn)
+
+
+    def _schedule_callback(self, name: str, coro: Coroutine) -> asyncio.Task:
+        '''Runs coroutine returned by an async callback of user's app as a task'''
+        task = asyncio.create_task(self._run_callback(name, coro))
+        # loop keeps only weak references to tasks
+        self._appTasks.add(task)
+        task.add_done_callback(self._appTasks.discard)
+        return task
+
+
+    async def _run_callback(self, name: str, coro: Coroutine):
+        try:
+            await coro
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            self._logger.error(f"Exception occured during execution of "
+                               f"user-supplied '{name}' callback: {e}")
+
+
+    # ConnOwner protocol method
+    def process_msg_start(self, msg: OwnedMessage) -> Coroutine | None:
+        if any(pending.owner is msg.owner for pending in self._pendingMsgs):
+            # batch with the msgs received before the streamed one goes first
+            if (task := self._flush_msgs()) is not None:
+                return self._start_stream_after(task, msg)
+
+        queue = self._handlerQueues.get(msg.owner)
+        if queue is None:
+            return self._stream_callback('on_message_start', msg)
+
+        # streamed msg is handled after the msgs received before it, the
+        # connection isn't read until it's done, so the next ones wait for it
+        if queue.idle is None:
+            queue.idle = asyncio.get_running_loop().create_future()
+        return self._start_stream_after(queue.idle, msg)
+
+
+    async def _start_stream_after(self, idle: asyncio.Future, msg: OwnedMessage):
+        # wait() doesn't cancel the future if the connection is closed meanwhile
+        await asyncio.wait([idle])
+        if (result := self._stream_callback('on_message_start', msg)) is not None:
+            await result
+
+
+    # ConnOwner protocol method
+    def process_msg_chunk(self, msg: OwnedMessage, chunk: bytes) -> Coroutine | None:
+        return self._stream_callback('on_message_chunk', msg, chunk)
+
+
+    # ConnOwner protocol method
+    def process_msg_end(self, msg: OwnedMessage) -> Coroutine | None:
+        return self._stream_callback('on_message_end', msg)
+
+
+    def _stream_callback(self, name: str, *args) -> Coroutine | None:
+        '''
+        Calls one of the streaming callbacks of user's app. Coroutine of an
+        async one is awaited by the connection before it reads any further
+        '''
+        callback = getattr(self._app, name, None)
+        if callback is None:
+            return None
+        if self._asyncCallbacks[name]:
+            return self._run_callback(name, callback(*args))
+
+        try:
+            callback(*args)
+        except BaseException as e:
+            self._logger.error(f"Exception occured during execution of "
+                               f"user-supplied '{name}' callback: {e}")
+        return None
+
+
     # ConnOwner protocol method
     def process_disconnect(self, conn: Connection):
-        self._connections.discard(conn)
+        queue = self._handlerQueues.get(conn)
+        if queue is not None:
+            # msgs received before the disconnect are handled first
+            queue.disconnected = True
+            return
+
+        self._notify_disconnect(conn)
+
+
+    # ConnOwner protocol method
+    def process_slow(self, conn: Connection, slow: bool):
+        if getattr(self._app, 'on_slow_client', None) is None:
+            return
+
+        if self._asyncCallbacks['on_slow_client']:
+            self._schedule_callback('on_slow_client', self._app.on_slow_client(conn, slow))
+            return
+
+        try:
+            self._app.on_slow_client(conn, slow)
+        except BaseException as e:
+            self._logger.error(f"Exception occured during execution of "
+                               f"user-supplied 'on_slow_client' callback: {e}")
+
+
+    def _notify_disconnect(self, conn: Connection):
+        if self._asyncCallbacks['on_client_disconnect']:
+            self._schedule_callback('on_client_disconnect', self._app.on_client_disconnect(conn))
+            return
+
         try:
             self._app.on_client_disconnect(conn)
         except BaseException as e:
@@ -118,15 +619,89 @@ class ServerWorker(ConnOwner):
                                f"user-supplied 'on_client_disconnect' callback: {e}")
 
 
+    def send_to(self, connId: int, msg: Message):
+        '''See Server.send_to()'''
+        workerId = connId >> CONN_ID_WORKER_SHIFT
+        if workerId == self._workerId:
+            self._deliver(connId, msg)
+        elif self._bus is not None:
+            self._bus.send(workerId, connId, msg)
+        else:
+            raise RuntimeError("Connection is served by another worker and the bus is disabled, see Config.busCapacity")
+
+
+    def _deliver(self, connId: int, msg: Message):
+        # connection may be closed by now
+        conn = self._connsById.get(connId)
+        if conn is not None:
+            conn.send(msg)
+
+
+    def publish(self, topic: str, msg: Message):
+        '''See Server.publish()'''
+        packed = msg.pack()
+        if self._bus is not None and self._loadTable is not None:
+            # workers without connections have no subscribers
+            self._bus.publish([workerId for workerId in range(len(self._loadTable)) 
+                               if workerId != self._workerId and self._loadTable[workerId, LoadTable.CONNECTIONS]], 
+                              topic, packed)
+        self._deliver_published(topic, packed)
+
+
+    def _deliver_published(self, topic: str, packed: bytes):
+        # a callback run by a connection may change the subscriptions
+        for conn in list(self._subscribers.get(topic, ())):
+            conn.send_packed(packed)
+
+
+    # ConnOwner protocol method
+    def process_subscribe(self, conn: Connection, topic: str, subscribe: bool):
+        if subscribe:
+            self._subscribers.setdefault(topic, set()).add(conn)
+            return
+
+        subscribers = self._subscribers.get(topic)
+        if subscribers is not None:
+            subscribers.discard(conn)
+            if not subscribers:
+                del self._subscribers[topic]
+
+
+    # ConnOwner protocol method
+    def process_close(self, conn: Connection):
+        if conn.id is not None:
+            self._connsById.pop(conn.id, None)
+        for topic in conn.subscriptions():
+            self.process_subscribe(conn, topic, False)
+        if conn in self._connections:
+            self._connections.discard(conn)
+            self._report_connections()
+
+
+    def _report_connections(self):
+        if self._loadTable is not None:
+            self._loadTable[self._workerId, LoadTable.CONNECTIONS] = len(self._connections) + len(self._setupTasks)
+            self._balance_accepting()
+
+
     async def _shutdown(self):
         self._logger.info(f"Server process({os.getpid()}) is shutting down")
 
-        self._server.close()
+        self._lagProbe.cancel()
+        self._acceptTask.cancel()
         self._listenSock.close()
+        if self._loadTable is not None:
+            self._loadTable[self._workerId, LoadTable.RUNNING] = 0
 
         for conn in self._connections:
             conn.shutdown()
 
         tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
         if len(tasks):
-            await asyncio.wait(tasks)
\ No newline at end of file
+            await asyncio.wait(tasks)
+
+        if self._offloadPool is not None:
+            self._offloadPool.shutdown()
+        if self._bus is not None:
+            self._bus.stop()
+        ServerWorker.current = None
\ No newline at end of file
@@ -0,0 +1,409 @@
+from __future__ import annotations
+from typing import Any
+
+import zlib
+
+from dataclasses import dataclass
+from multiprocessing import Lock, synchronize
+from multiprocessing.shared_memory import SharedMemory
+
+
+@dataclass
+class SharedCacheStats:
+    # entries currently stored
+    entries: int = 0
+    # lookups that found the key and that didn't
+    hits: int = 0
+    misses: int = 0
+    # entries removed to make room for new ones
+    evictions: int = 0
+
+
+class _Stripe:
+    '''Views of one stripe of the cache, see SharedCache'''
+
+    # header fields, int64
+    LRU_HEAD = 0
+    LRU_TAIL = 1
+    FREE_HEAD = 2
+    FREE_NUM = 3
+    ENTRIES = 4
+    HITS = 5
+    MISSES = 6
+    EVICTIONS = 7
+    HEADER_LEN = 8 * 8
+
+    # per block int32 arrays: head of the hash bucket, next block of the
+    # entry or the free list, and fields of the entry that starts in the block
+    ARRAYS = ('buckets', 'next', 'hash', 'keyLen', 'valueLen', 'lruPrev', 'lruNext', 'hashNext')
+
+    def __init__(self, buf: memoryview, blockNum: int, blockSize: int):
+        self.hdr = buf[:self.HEADER_LEN].cast('q')
+        offset = self.HEADER_LEN
+        for name in self.ARRAYS:
+            setattr(self, name, buf[offset : offset + 4*blockNum].cast('I' if name == 'hash' else 'i'))
+            offset += 4*blockNum
+        self.data = buf[offset : offset + blockNum*blockSize]
+
+
+    @classmethod
+    def size(cls, blockNum: int, blockSize: int) -> int:
+        # keeps the header of the next stripe aligned
+        size = cls.HEADER_LEN + 4*blockNum*len(cls.ARRAYS) + blockNum*blockSize
+        return (size + 7) // 8 * 8
+
+
+    def release(self):
+        for name in ('hdr', 'data', *self.ARRAYS):
+            getattr(self, name).release()
+
+
+class SharedCache:
+    '''
+    Hash table of bytes values placed in shared memory, which all server
+    workers use directly. Keys are split among stripes, each with its own
+    lock, LRU list and part of the memory, so workers that use different
+    stripes don't wait for each other, and the least recently used entries
+    of a stripe are evicted once it's full. Entry takes as many blocks of
+    blockSize bytes as its key and value need. Methods that lock a stripe
+    throw TimeoutError if its lock isn't acquired within lockTimeout
+    '''
+
+    # key under which Server passes the cache to ServerApp in the context, see Config.sharedCacheSize
+    CONTEXT_KEY = "sharedCache"
+
+    NIL = -1
+    # seconds to wait for a stripe's lock, calls are short, so a lock held
+    # that long most likely belongs to a worker killed in the middle of one
+    LOCK_TIMEOUT = 5.0
+
+    def __init__(self, size: int, stripes: int = 16, blockSize: int = 256, lockTimeout: float = LOCK_TIMEOUT):
+        '''
+        Parameters:
+            size: memory taken by keys and values, the cache takes ~12% more for its tables
+            stripes: number of independently locked parts of the cache
+            blockSize: unit of memory entries take
+            lockTimeout: seconds to wait for a stripe's lock before TimeoutError is thrown
+        '''
+        self._stripeNum = stripes
+        self._blockSize = blockSize
+        self._lockTimeout = lockTimeout
+        self._blockNum = size // stripes // blockSize
+        if self._blockNum < 1:
+            raise ValueError(f"Cache of {size} bytes can't have {stripes} stripes of {blockSize} byte blocks")
+
+        self._stripeSize = _Stripe.size(self._blockNum, self._blockSize)
+        self._shm = SharedMemory(create=True, size=stripes * self._stripeSize)
+        self._locks = [Lock() for _ in range(stripes)]
+        self._attach()
+
+        for stripe in self._stripes:
+            self._clear(stripe)
+
+
+    def _attach(self):
+        self._buf = self._shm.buf
+        self._stripes = [_Stripe(self._buf[i*self._stripeSize : (i+1)*self._stripeSize],
+                                 self._blockNum, self._blockSize)
+                         for i in range(self._stripeNum)]
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('_shm', '_buf', '_stripes'):
+            del state[name]
+        state['shmName'] = self._shm.name
+        return state
+
+
+    def __setstate__(self, state: dict[str, Any]):
+        shmName = state.pop('shmName')
+        self.__dict__.update(state)
+        self._shm = SharedMemory(shmName)
+        self._attach()
+
+
+    def get(self, key: bytes | str, default: bytes | None = None) -> bytes | None:
+        '''Returns the value of the key or default if there is none'''
+        key, keyHash = self._key(key)
+        index, stripe = self._stripe(keyHash)
+        lock = self._lock(index)
+        try:
+            entry = self._find(stripe, key, keyHash)
+            if entry == self.NIL:
+                stripe.hdr[_Stripe.MISSES] += 1
+                return default
+
+            stripe.hdr[_Stripe.HITS] += 1
+            self._unlink_lru(stripe, entry)
+            self._push_lru(stripe, entry)
+            return self._read(stripe, entry, stripe.keyLen[entry], stripe.valueLen[entry])
+        finally:
+            lock.release()
+
+
+    def set(self, key: bytes | str, value: bytes | bytearray | memoryview):
+        '''
+        Stores the value of the key, evicts the least recently used entries
+        of the stripe if there isn't enough space. Throws ValueError if
+        the entry is larger than a stripe
+        '''
+        key, keyHash = self._key(key)
+        data = key + value
+        blocks = max((len(data) + self._blockSize - 1) // self._blockSize, 1)
+        if blocks > self._blockNum:
+            raise ValueError(f"Entry of {len(data)} bytes doesn't fit into the cache stripe "
+                             f"of {self._blockNum * self._blockSize} bytes")
+
+        index, stripe = self._stripe(keyHash)
+        lock = self._lock(index)
+        try:
+            entry = self._find(stripe, key, keyHash)
+            if entry != self.NIL:
+                self._remove(stripe, entry)
+            while stripe.hdr[_Stripe.FREE_NUM] < blocks:
+                self._remove(stripe, stripe.hdr[_Stripe.LRU_TAIL])
+                stripe.hdr[_Stripe.EVICTIONS] += 1
+
+            entry = self._allocate(stripe, blocks)
+            self._write(stripe, entry, data)
+            stripe.hash[entry] = keyHash
+            stripe.keyLen[entry] = len(key)
+            stripe.valueLen[entry] = len(value)
+
+            bucket = self._bucket(keyHash)
+            stripe.hashNext[entry] = stripe.buckets[bucket]
+            stripe.buckets[bucket] = entry
+            self._push_lru(stripe, entry)
+            stripe.hdr[_Stripe.ENTRIES] += 1
+        finally:
+            lock.release()
+
+
+    def delete(self, key: bytes | str) -> bool:
+        '''Removes the key, returns False if there is none'''
+        key, keyHash = self._key(key)
+        index, stripe = self._stripe(keyHash)
+        lock = self._lock(index)
+        try:
+            entry = self._find(stripe, key, keyHash)
+            if entry == self.NIL:
+                return False
+            self._remove(stripe, entry)
+            return True
+        finally:
+            lock.release()
+
+
+    def clear(self):
+        for index, stripe in enumerate(self._stripes):
+            lock = self._lock(index)
+            try:
+                self._clear(stripe)
+            finally:
+                lock.release()
+
+
+    def __contains__(self, key: bytes | str) -> bool:
+        key, keyHash = self._key(key)
+        index, stripe = self._stripe(keyHash)
+        lock = self._lock(index)
+        try:
+            return self._find(stripe, key, keyHash) != self.NIL
+        finally:
+            lock.release()
+
+
+    def __len__(self) -> int:
+        return self.stats().entries
+
+
+    def stats(self) -> SharedCacheStats:
+        '''
+        Returns counters summed over all stripes. Stripes aren't locked,
+        so values may be slightly outdated
+        '''
+        stats = SharedCacheStats()
+        for stripe in self._stripes:
+            stats.entries += stripe.hdr[_Stripe.ENTRIES]
+            stats.hits += stripe.hdr[_Stripe.HITS]
+            stats.misses += stripe.hdr[_Stripe.MISSES]
+            stats.evictions += stripe.hdr[_Stripe.EVICTIONS]
+        return stats
+
+
+    def release(self, unlink: bool = False):
+        '''
+        Unmaps the shared memory, the cache can't be used after this call.
+        The memory is freed once the process that created the cache releases it with unlink
+        '''
+        for stripe in self._stripes:
+            stripe.release()
+        self._stripes = []
+        del self._buf
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+    def __del__(self):
+        # shared memory can't be unmapped while the views exist
+        for stripe in getattr(self, '_stripes', ()):
+            stripe.release()
+
+
+    def _key(self, key: bytes | str) -> tuple[bytes, int]:
+        if isinstance(key, str):
+            key = key.encode()
+        # hash() of bytes differs between processes
+        return bytes(key), zlib.crc32(key)
+
+
+    def _stripe(self, keyHash: int) -> tuple[int, _Stripe]:
+        index = keyHash % self._stripeNum
+        return index, self._stripes[index]
+
+
+    def _lock(self, index: int) -> synchronize.Lock:
+        '''
+        Acquires the lock of the stripe. Lock of a process killed while holding
+        it is never released, and the stripe may be left half-modified, so the
+        caller gets TimeoutError instead of waiting forever
+        '''
+        lock = self._locks[index]
+        if not lock.acquire(timeout=self._lockTimeout):
+            raise TimeoutError(f"Stripe {index} of the cache is locked for more than {self._lockTimeout} s, "
+                               f"its holder may have been killed")
+        return lock
+
+
+    def _bucket(self, keyHash: int) -> int:
+        # the lower part of the hash picks the stripe
+        return keyHash // self._stripeNum % self._blockNum
+
+
+    def _find(self, stripe: _Stripe, key: bytes, keyHash: int) -> int:
+        entry = stripe.buckets[self._bucket(keyHash)]
+        while entry != self.NIL:
+            if stripe.hash[entry] == keyHash and stripe.keyLen[entry] == len(key):
+                offset = entry*self._blockSize
+                # most keys fit into the first block, they are compared in place
+                if len(key) <= self._blockSize and stripe.data[offset : offset + len(key)] == key or \
+                   len(key) > self._blockSize and self._read(stripe, entry, 0, len(key)) == key:
+                    return entry
+            entry = stripe.hashNext[entry]
+        return self.NIL
+
+
+    def _read(self, stripe: _Stripe, entry: int, start: int, length: int) -> bytes:
+        '''Returns length bytes of the entry's data starting at start'''
+        if not length:
+            return b''
+
+        block = entry
+        while start >= self._blockSize:
+            block = stripe.next[block]
+            start -= self._blockSize
+
+        parts = []
+        while length:
+            n = self._run(stripe, block, start + length)
+            offset = block*self._blockSize
+            parts.append(stripe.data[offset + start : offset + start + min(length, n - start)])
+            length -= min(length, n - start)
+            start = 0
+            block = stripe.next[block + (n - 1) // self._blockSize]
+        return parts[0].tobytes() if len(parts) == 1 else b''.join(parts)
+
+
+    def _write(self, stripe: _Stripe, entry: int, data: bytes):
+        block = entry
+        start = 0
+        while start < len(data):
+            n = self._run(stripe, block, len(data) - start)
+            offset = block*self._blockSize
+            stripe.data[offset : offset + min(n, len(data) - start)] = data[start : start + n]
+            start += n
+            block = stripe.next[block + (n - 1) // self._blockSize]
+
+
+    def _run(self, stripe: _Stripe, block: int, length: int) -> int:
+        '''
+        Returns the size of the run of adjacent blocks of an entry that starts
+        with the block, up to the one that holds length bytes. Blocks are 
+        taken from the free list in order, so most entries are single runs
+        '''
+        last = block
+        while (last - block + 1) * self._blockSize < length and stripe.next[last] == last + 1:
+            last += 1
+        return (last - block + 1) * self._blockSize
+
+
+    def _allocate(self, stripe: _Stripe, blocks: int) -> int:
+        '''Takes the chain of blocks from the head of the free list, returns its first block'''
+        first = last = stripe.hdr[_Stripe.FREE_HEAD]
+        for _ in range(blocks - 1):
+            last = stripe.next[last]
+        stripe.hdr[_Stripe.FREE_HEAD] = stripe.next[last]
+        stripe.hdr[_Stripe.FREE_NUM] -= blocks
+        stripe.next[last] = self.NIL
+        return first
+
+
+    def _remove(self, stripe: _Stripe, entry: int):
+        '''Unlinks the entry from its bucket and the LRU list, returns its blocks to the free list'''
+        bucket = self._bucket(stripe.hash[entry])
+        if stripe.buckets[bucket] == entry:
+            stripe.buckets[bucket] = stripe.hashNext[entry]
+        else:
+            prev = stripe.buckets[bucket]
+            while stripe.hashNext[prev] != entry:
+                prev = stripe.hashNext[prev]
+            stripe.hashNext[prev] = stripe.hashNext[entry]
+        self._unlink_lru(stripe, entry)
+
+        last = entry
+        blocks = 1
+        while stripe.next[last] != self.NIL:
+            last = stripe.next[last]
+            blocks += 1
+        stripe.next[last] = stripe.hdr[_Stripe.FREE_HEAD]
+        stripe.hdr[_Stripe.FREE_HEAD] = entry
+        stripe.hdr[_Stripe.FREE_NUM] += blocks
+        stripe.hdr[_Stripe.ENTRIES] -= 1
+
+
+    def _push_lru(self, stripe: _Stripe, entry: int):
+        '''Makes the entry the most recently used one'''
+        head = stripe.hdr[_Stripe.LRU_HEAD]
+        stripe.lruPrev[entry] = self.NIL
+        stripe.lruNext[entry] = head
+        if head != self.NIL:
+            stripe.lruPrev[head] = entry
+        else:
+            stripe.hdr[_Stripe.LRU_TAIL] = entry
+        stripe.hdr[_Stripe.LRU_HEAD] = entry
+
+
+    def _unlink_lru(self, stripe: _Stripe, entry: int):
+        prev, next = stripe.lruPrev[entry], stripe.lruNext[entry]
+        if prev != self.NIL:
+            stripe.lruNext[prev] = next
+        else:
+            stripe.hdr[_Stripe.LRU_HEAD] = next
+        if next != self.NIL:
+            stripe.lruPrev[next] = prev
+        else:
+            stripe.hdr[_Stripe.LRU_TAIL] = prev
+
+
+    def _clear(self, stripe: _Stripe):
+        '''Puts all blocks of the stripe into the free list'''
+        for i in range(self._blockNum):
+            stripe.buckets[i] = self.NIL
+            stripe.next[i] = i + 1
+        stripe.next[self._blockNum - 1] = self.NIL
+        stripe.hdr[_Stripe.LRU_HEAD] = stripe.hdr[_Stripe.LRU_TAIL] = self.NIL
+        stripe.hdr[_Stripe.FREE_HEAD] = 0
+        stripe.hdr[_Stripe.FREE_NUM] = self._blockNum
+        stripe.hdr[_Stripe.ENTRIES] = 0
\ No newline at end of file
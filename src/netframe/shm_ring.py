@@ -0,0 +1,401 @@
+from __future__ import annotations
+from typing import Any, Callable, Iterable
+
+import time
+import struct
+
+from multiprocessing import Pipe, Lock
+from multiprocessing.connection import wait, Connection as PipeHndl
+from multiprocessing.shared_memory import SharedMemory
+
+
+class _RingEnd:
+    '''
+    One end of a single-producer single-consumer byte ring placed in shared
+    memory. Data is copied in and out of the ring directly, pipes are used
+    only to wake up the other side when it waits for data or free space
+    '''
+
+    # control block at the start of the shared memory, values written
+    # by different processes are kept on separate cache lines
+    HEAD_OFFSET = 0             # total amount of bytes read, written by reader
+    TAIL_OFFSET = 64            # total amount of bytes written, written by writer
+    READER_WAITING_OFFSET = 128
+    READER_CLOSED_OFFSET = 129
+    WRITER_WAITING_OFFSET = 192
+    WRITER_CLOSED_OFFSET = 193
+    DATA_OFFSET = 256
+
+    # native format, so a position is stored with a single write
+    POS = struct.Struct('Q')
+
+    # set by subclasses
+    _closedOffset: int
+    _waitingOffset: int
+    _peerClosedOffset: int
+
+    def __init__(self, shm: SharedMemory,
+                       capacity: int,
+                       fence: Any,
+                       ownBell: PipeHndl,
+                       ownBellSender: PipeHndl,
+                       peerBellSender: PipeHndl):
+        '''
+        Parameters:
+            shm: shared memory that holds the ring, owned by this end
+            capacity: size of the data area of the ring
+            fence: lock shared by both ends, used as a memory barrier
+            ownBell: wakes this end up
+            ownBellSender: used to wake this end up from another thread
+            peerBellSender: wakes the other end up
+        '''
+        self._shm = shm
+        self._capacity = capacity
+        self._fence = fence
+        self._ownBell = ownBell
+        self._ownBellSender = ownBellSender
+        self._peerBellSender = peerBellSender
+        # when it's ready the other end is considered to be closed
+        self._peerSentinel: Any = None
+        # set by interrupt()
+        self._interrupted = False
+
+        self._attach()
+
+
+    def _attach(self):
+        self._buf = self._shm.buf
+        self._data = self._buf[self.DATA_OFFSET : self.DATA_OFFSET + self._capacity]
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('_shm', '_buf', '_data', '_peerSentinel'):
+            del state[name]
+        state['shmName'] = self._shm.name
+        return state
+
+
+    def __setstate__(self, state: dict[str, Any]):
+        shmName = state.pop('shmName')
+        self.__dict__.update(state)
+        self._shm = SharedMemory(shmName)
+        self._peerSentinel = None
+        self._attach()
+
+
+    def watch(self, sentinel: Any):
+        '''
+        Treats the other end as closed once sentinel is ready,
+        e.g. when the process that holds the other end is finished
+        '''
+        self._peerSentinel = sentinel
+
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+
+    def fileno(self) -> int:
+        '''Handle that becomes readable when the other end wakes this one up'''
+        return self._ownBell.fileno()
+
+
+    def interrupt(self):
+        '''
+        Makes a blocked call to this end (or the next call that would
+        block) throw InterruptedError. Can be called from another thread
+        '''
+        self._interrupted = True
+        self._ownBellSender.send_bytes(b'')
+
+
+    def close(self):
+        '''Marks this end as closed and wakes up both ends'''
+        self._buf[self._closedOffset] = 1
+        self._barrier()
+        self._ownBellSender.send_bytes(b'')
+        self._peerBellSender.send_bytes(b'')
+
+
+    def release(self, unlink: bool = False):
+        '''
+        Unmaps the shared memory, the end can't be used after this call.
+        The memory is freed when both ends are released and one of them,
+        that belongs to the process that created the ring, is released with unlink
+        '''
+        self._data.release()
+        del self._buf
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+    def __del__(self):
+        # shared memory can't be unmapped while the view exists
+        if hasattr(self, '_buf'):
+            self._data.release()
+
+
+    def _load(self, offset: int) -> int:
+        return self.POS.unpack_from(self._buf, offset)[0]
+
+
+    def _store(self, offset: int, value: int):
+        self.POS.pack_into(self._buf, offset, value)
+
+
+    def _barrier(self):
+        # acquiring a lock is a full memory barrier on every platform
+        self._fence.acquire()
+        self._fence.release()
+
+
+    def _wake_peer(self, peerWaitingOffset: int):
+        self._barrier()
+        if self._buf[peerWaitingOffset]:
+            # the flag is cleared, so the bell rings once per wait and 
+            # can't fill up the pipe if the other side is gone
+            self._buf[peerWaitingOffset] = 0
+            self._peerBellSender.send_bytes(b'')
+
+
+    def _drain_bell(self):
+        while self._ownBell.poll():
+            self._ownBell.recv_bytes()
+
+
+    def _wait_for(self, isReady: Callable[[], bool], deadline: float | None):
+        '''
+        Sleeps until isReady() is True. The waiting flag is raised before
+        the last check, so the other end can't miss it after changing the ring
+        '''
+        while not isReady():
+            self._buf[self._waitingOffset] = 1
+            self._barrier()
+            if isReady():
+                self._buf[self._waitingOffset] = 0
+                return
+
+            if self._interrupted:
+                self._interrupted = False
+                self._buf[self._waitingOffset] = 0
+                raise InterruptedError
+
+            handles = [self._ownBell] if self._peerSentinel is None else [self._ownBell, self._peerSentinel]
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            ready = wait(handles, timeout)
+            self._buf[self._waitingOffset] = 0
+            self._drain_bell()
+
+            if self._peerSentinel in ready:
+                self._buf[self._peerClosedOffset] = 1
+            elif not ready:
+                raise TimeoutError
+
+
+class ShmRingReader(_RingEnd):
+    _closedOffset = _RingEnd.READER_CLOSED_OFFSET
+    _waitingOffset = _RingEnd.READER_WAITING_OFFSET
+    _peerClosedOffset = _RingEnd.WRITER_CLOSED_OFFSET
+
+
+    def read_into(self, buf: memoryview, timeout: float | None=None) -> int:
+        '''
+        Moves up to len(buf) bytes out of the ring, waits at most timeout
+        seconds for data to arrive, throws TimeoutError if it hasn't.
+        Returns 0 if this end is closed or writer has closed its end
+        and everything it has written is read
+        '''
+        self._wait_for(self._readable, None if timeout is None else time.monotonic() + timeout)
+        return self._read(buf)
+
+
+    def try_read_into(self, buf: memoryview) -> int | None:
+        '''
+        Non-blocking read_into(), returns None if there is no data. In that
+        case the handle returned by fileno() becomes readable once it arrives
+        '''
+        self._drain_bell()
+        if not self._readable():
+            self._buf[self.READER_WAITING_OFFSET] = 1
+            self._barrier()
+            if not self._readable():
+                return None
+
+        self._buf[self.READER_WAITING_OFFSET] = 0
+        return self._read(buf)
+
+
+    def skip(self):
+        '''
+        Drops everything written to the ring so far, e.g. data left 
+        unread by the previous holder of this end
+        '''
+        self._store(self.HEAD_OFFSET, self._load(self.TAIL_OFFSET))
+        self._wake_peer(self.WRITER_WAITING_OFFSET)
+
+
+    def _readable(self) -> bool:
+        if self._buf[self.READER_CLOSED_OFFSET]:
+            return True
+        # the closed flag is set after the last write
+        writerClosed = self._buf[self.WRITER_CLOSED_OFFSET]
+        self._barrier()
+        return bool(writerClosed) or self._load(self.TAIL_OFFSET) != self._load(self.HEAD_OFFSET)
+
+
+    def _read(self, buf: memoryview) -> int:
+        if self._buf[self.READER_CLOSED_OFFSET]:
+            return 0
+
+        head = self._load(self.HEAD_OFFSET)
+        tail = self._load(self.TAIL_OFFSET)
+        n = min(len(buf), tail - head)
+        if not n:
+            # writer is closed
+            return 0
+
+        start = head % self._capacity
+        first = min(n, self._capacity - start)
+        buf[:first] = self._data[start : start + first]
+        if first < n:
+            buf[first:n] = self._data[:n - first]
+
+        # data must be copied before the writer sees the space freed
+        self._barrier()
+        self._store(self.HEAD_OFFSET, head + n)
+        self._wake_peer(self.WRITER_WAITING_OFFSET)
+
+        return n
+
+
+class ShmRingWriter(_RingEnd):
+    _closedOffset = _RingEnd.WRITER_CLOSED_OFFSET
+    _waitingOffset = _RingEnd.WRITER_WAITING_OFFSET
+    _peerClosedOffset = _RingEnd.READER_CLOSED_OFFSET
+
+
+    def write(self, buffers: Iterable[bytes | bytearray | memoryview]):
+        '''
+        Copies buffers into the ring, waits for reader to free
+        the space if they don't fit. Throws BrokenPipeError if
+        either end is closed
+        '''
+        views = [memoryview(data).cast('B') for data in buffers]
+        while views := self._write(views):
+            self._wait_for(self._writable, None)
+
+
+    def try_write(self, buffers: Iterable[bytes | bytearray | memoryview]) -> list[memoryview]:
+        '''
+        Non-blocking write(), copies as much as fits and returns the rest. If
+        something is left, the handle returned by fileno() becomes readable
+        once reader frees some space
+        '''
+        self._drain_bell()
+        views = self._write([memoryview(data).cast('B') for data in buffers])
+        if views:
+            self._buf[self.WRITER_WAITING_OFFSET] = 1
+            self._barrier()
+            views = self._write(views)
+            if not views:
+                self._buf[self.WRITER_WAITING_OFFSET] = 0
+        return views
+
+
+    def try_write_frames(self, frames: Iterable[Iterable[bytes | bytearray | memoryview]]) -> int:
+        '''
+        Non-blocking write() of frames, each given as a list of buffers.
+        Copies the leading frames that fit entirely, never a part of a frame,
+        returns their number. If some are left, the handle returned by
+        fileno() becomes readable once reader frees some space
+        '''
+        self._drain_bell()
+        views: list[memoryview] = []
+        free = self._free_space()
+        queued = n = 0
+        for frame in frames:
+            frameViews = [memoryview(data).cast('B') for data in frame]
+            size = sum(len(view) for view in frameViews)
+            if queued + size > free:
+                self._buf[self.WRITER_WAITING_OFFSET] = 1
+                self._barrier()
+                free = self._free_space()
+                if queued + size > free:
+                    break
+                self._buf[self.WRITER_WAITING_OFFSET] = 0
+
+            views += frameViews
+            queued += size
+            n += 1
+
+        if views:
+            self._write(views)
+        return n
+
+
+    def _free_space(self) -> int:
+        if self._is_broken():
+            raise BrokenPipeError("Ring is closed")
+        return self._capacity - (self._load(self.TAIL_OFFSET) - self._load(self.HEAD_OFFSET))
+
+
+    def _writable(self) -> bool:
+        return self._load(self.HEAD_OFFSET) + self._capacity > self._load(self.TAIL_OFFSET) or self._is_broken()
+
+
+    def _write(self, views: list[memoryview]) -> list[memoryview]:
+        '''Copies as much as fits, returns the rest'''
+        if self._is_broken():
+            raise BrokenPipeError("Ring is closed")
+
+        tail = self._load(self.TAIL_OFFSET)
+        free = self._capacity - (tail - self._load(self.HEAD_OFFSET))
+        for i, view in enumerate(views):
+            n = min(free, len(view))
+            start = tail % self._capacity
+            first = min(n, self._capacity - start)
+            self._data[start : start + first] = view[:first]
+            if first < n:
+                self._data[:n - first] = view[first:n]
+            tail += n
+            free -= n
+
+            if n < len(view):
+                views = [view[n:], *views[i+1:]]
+                break
+        else:
+            views = []
+
+        self._publish(tail)
+        return views
+
+
+    def _publish(self, tail: int):
+        # data must be in place before the reader sees the new tail
+        self._barrier()
+        self._store(self.TAIL_OFFSET, tail)
+        self._wake_peer(self.READER_WAITING_OFFSET)
+
+
+    def _is_broken(self) -> bool:
+        return bool(self._buf[self.READER_CLOSED_OFFSET] or self._buf[self.WRITER_CLOSED_OFFSET])
+
+
+def ShmPipe(capacity: int) -> tuple[ShmRingReader, ShmRingWriter]:
+    '''
+    Creates a one-way channel between two processes, returns its reader and
+    writer ends. Like Pipe() ends, they can be passed to a child process
+    '''
+    shm = SharedMemory(create=True, size=_RingEnd.DATA_OFFSET + capacity)
+    shm.buf[:_RingEnd.DATA_OFFSET] = bytes(_RingEnd.DATA_OFFSET)
+    fence = Lock()
+    readerBell, readerBellSender = Pipe(duplex=False)
+    writerBell, writerBellSender = Pipe(duplex=False)
+
+    # every end has its own mapping, so they can be released independently
+    reader = ShmRingReader(shm, capacity, fence, readerBell, readerBellSender, writerBellSender)
+    writer = ShmRingWriter(SharedMemory(shm.name), capacity, fence, writerBell, writerBellSender, readerBellSender)
+    return reader, writer
\ No newline at end of file
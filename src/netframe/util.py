@@ -27,6 +27,52 @@ def loop_policy_setup(isMultiprocess: bool):
             pass
 
 
+def physical_cores() -> list[set[int]]:
+    '''
+    Returns logical CPUs of every physical core available to this process.
+    Cores of different NUMA nodes are interleaved, so taking the first N of
+    them spreads the load evenly among nodes
+    '''
+    nodes: dict[int, dict[tuple[int, int], set[int]]] = {}
+    for cpu in sorted(os.sched_getaffinity(0)):
+        cpuDir = pathlib.Path(f"/sys/devices/system/cpu/cpu{cpu}")
+        try:
+            node = next((int(path.name[4:]) for path in cpuDir.glob("node[0-9]*")), 0)
+            core = (int((cpuDir/"topology/physical_package_id").read_text()), 
+                    int((cpuDir/"topology/core_id").read_text()))
+        except (OSError, ValueError):
+            # topology is unknown, treat every logical CPU as a core
+            node, core = 0, (0, cpu)
+        nodes.setdefault(node, {}).setdefault(core, set()).add(cpu)
+
+    perNode = [list(cores.values()) for _, cores in sorted(nodes.items())]
+    return [node[i] for i in range(max(map(len, perNode))) for node in perNode if i < len(node)]
+
+
+def worker_cpus(affinity: list[set[int]] | str, workerId: int) -> set[int]:
+    '''Returns CPUs the worker should be pinned to, see Config.cpuAffinity'''
+    if affinity == "auto":
+        cores = physical_cores()
+        return cores[workerId % len(cores)]
+    if isinstance(affinity, str) or not affinity:
+        raise ValueError(f"Invalid CPU affinity: {affinity}")
+    return set(affinity[workerId % len(affinity)])
+
+
+def pin_to_cpus(affinity: list[set[int]] | str, workerId: int):
+    '''Pins calling process to CPUs selected for the worker by worker_cpus()'''
+    logger = logging.getLogger("netframe.error")
+    if not hasattr(os, "sched_setaffinity"):
+        logger.warning("CPU affinity is not supported on this platform")
+        return
+
+    try:
+        cpus = worker_cpus(affinity, workerId)
+        os.sched_setaffinity(0, cpus)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to set CPU affinity of worker {workerId}: {e}")
+
+
 def setup_logging():
     config = pathlib.Path("logging/config.json")
     with open(config) as f:
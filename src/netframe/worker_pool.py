@@ -16,15 +16,45 @@ def start(realTarget: Callable[..., Any], *args: Any):
 class WorkerPool:
     def __init__(self, workerNum: int):
         self._workerNum = workerNum
-        self._workers: list[Process] = []
+        # processes by worker id
+        self._workers: dict[int, Process] = {}
 
 
-    def start(self, target: Callable[..., Any], args: tuple[Any, ...]=()):
-        for _ in range(self._workerNum):
-            proc = Process(target=start, args=(target, *args), daemon=True)
-            proc.start()
+    def start(self, target: Callable[..., Any], 
+                    args: tuple[Any, ...]=(), 
+                    workerArgs: list[tuple[Any, ...]] | None=None):
+        '''
+        Launches workerNum processes with ids from 0 to workerNum-1
+        Parameters:
+            target: function run by every process
+            args: args passed to every process
+            workerArgs: if set, workerArgs[i] are passed to i-th process before args
+        '''
+        for i in range(self._workerNum):
+            ownArgs = workerArgs[i] if workerArgs else ()
+            self.add(i, target, (*ownArgs, *args))
+
+
+    def add(self, workerId: int, target: Callable[..., Any], args: tuple[Any, ...]=()):
+        '''Launches one more process, workerId must not be used by a running one'''
+        if workerId in self._workers:
+            raise ValueError(f"Worker {workerId} already exists")
+
+        proc = Process(target=start, args=(target, *args), daemon=True)
+        proc.start()
+
+        self._workers[workerId] = proc
 
-            self._workers.append(proc)
+
+    def reap(self) -> dict[int, int | None]:
+        '''Forgets processes that have finished, returns their exit codes by worker id'''
+        finished = [workerId for workerId, worker in self._workers.items() if not worker.is_alive()]
+        exitCodes = {}
+        for workerId in finished:
+            worker = self._workers.pop(workerId)
+            worker.join()
+            exitCodes[workerId] = worker.exitcode
+        return exitCodes
 
 
     def stop(self, timeout: float | None=None):
@@ -33,10 +63,10 @@ class WorkerPool:
         shuts them down forcefully after timeout expires
         '''
         if timeout is None:
-            for worker in self._workers:
+            for worker in self._workers.values():
                 worker.join()
         else:
-            for worker in self._workers:
+            for worker in self._workers.values():
                 start = time.perf_counter()
                 worker.join(timeout)
                 end   = time.perf_counter()
@@ -45,12 +75,21 @@ class WorkerPool:
                 if timeout < 0: 
                     timeout = 0
 
-            for worker in self._workers:
+            for worker in self._workers.values():
                 if worker.is_alive():
                     worker.kill()
 
         self._workers.clear()
 
 
+    def worker_ids(self) -> list[int]:
+        return sorted(self._workers)
+
+
+    def sentinels(self) -> list[int]:
+        '''Returns handles that become ready when corresponding processes end'''
+        return [worker.sentinel for worker in self._workers.values()]
+
+
     def is_started(self) -> bool:
         return True if self._workers else False
\ No newline at end of file
@@ -0,0 +1,45 @@
+import os
+import pytest
+
+from utils import run_server, TEST_IP, TEST_PORT
+
+from netframe import Config, Client, Message, OwnedMessage, ServerApp, ContextT
+from netframe.util import worker_cpus, physical_cores
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), 
+                                reason="CPU affinity is not supported")
+
+
+class affinity_app(ServerApp):
+    def __init__(self, context: ContextT): ...
+
+    def on_message(self, msg: OwnedMessage):
+        # reply with CPUs the worker may run on
+        msg.msg.append(",".join(map(str, sorted(os.sched_getaffinity(0)))).encode())
+        msg.owner.send(msg.msg)
+
+
+def test_worker_cpus():
+    assert worker_cpus([{0}, {1, 2}], 0) == {0}
+    assert worker_cpus([{0}, {1, 2}], 3) == {1, 2}
+
+    cores = physical_cores()
+    assert set().union(*cores) == os.sched_getaffinity(0)
+    assert worker_cpus("auto", len(cores)) == cores[0]
+
+    with pytest.raises(ValueError):
+        worker_cpus("all", 0)
+
+
+@pytest.mark.parametrize("affinity", ["auto", "explicit"])
+def test_workers_are_pinned(affinity: str):
+    cores = physical_cores()
+    cpus = cores[0] if affinity == "auto" else {max(os.sched_getaffinity(0))}
+    config = Config(affinity_app, cpuAffinity="auto" if affinity == "auto" else [cpus])
+
+    with run_server(config):
+        client = Client(cpuAffinity=cpus)
+        client.connect(TEST_IP, TEST_PORT)
+        client.send(Message())
+        assert client.recv(timeout=10).payload.decode() == ",".join(map(str, sorted(cpus)))
+        client.shutdown()
\ No newline at end of file
@@ -0,0 +1,167 @@
+import asyncio
+import pytest
+
+from utils import run_server, TEST_IP, TEST_PORT
+
+from netframe import AsyncClient, Message, OwnedMessage, ServerApp, ContextT, Config, RECV_ENGINE
+
+
+class echo_app(ServerApp):
+    def __init__(self, context: ContextT): ...
+
+    def on_message(self, msg: OwnedMessage):
+        if msg.msg.hdr.id == 0xffff:
+            msg.owner.shutdown()
+        elif msg.msg.hdr.id == 0xfffe:
+            # request that is never answered
+            pass
+        else:
+            msg.owner.send(msg.msg)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("recvEngine", (RECV_ENGINE.STREAM, RECV_ENGINE.BUFFERED))
+async def test_async_client_echo(recvEngine: RECV_ENGINE):
+    with run_server(Config(echo_app)):
+        client = AsyncClient(recvEngine)
+        await client.connect(TEST_IP, TEST_PORT)
+
+        sent = []
+        for i in range(64):
+            msg = Message()
+            msg.hdr.id = i
+            msg.append(bytes([i]) * i)
+            await client.send(msg)
+            sent.append(msg)
+
+        for msg in sent:
+            assert msg == await client.recv(timeout=10)
+
+        with pytest.raises(TimeoutError):
+            await client.recv(timeout=0.1)
+
+        await client.shutdown(timeout=10)
+
+
+@pytest.mark.asyncio
+async def test_async_client_connection_lost():
+    with run_server(Config(echo_app)):
+        client = AsyncClient()
+        await client.connect(TEST_IP, TEST_PORT)
+
+        await client.send(Message(Message.Header(id=0xffff)))
+        with pytest.raises(ConnectionResetError):
+            await client.recv(timeout=10)
+        with pytest.raises(ConnectionResetError):
+            await client.send(Message())
+
+        await client.shutdown(timeout=10)
+
+
+@pytest.mark.parametrize("recvEngine", (RECV_ENGINE.STREAM, RECV_ENGINE.BUFFERED))
+@pytest.mark.asyncio
+async def test_async_client_shutdown_aborts_after_timeout(recvEngine: RECV_ENGINE):
+    clientDone = asyncio.Event()
+
+    async def close_late(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # keeps its side open after the client has closed its one
+        await reader.read()
+        await clientDone.wait()
+        writer.close()
+
+    # any free port, so the test doesn't depend on how the previous server's port was closed
+    server = await asyncio.start_server(close_late, TEST_IP, 0)
+    async with server:
+        client = AsyncClient(recvEngine)
+        await client.connect(*server.sockets[0].getsockname())
+
+        await asyncio.wait_for(client.shutdown(timeout=0.1), 10)
+        clientDone.set()
+
+
+@pytest.mark.asyncio
+async def test_async_client_send_waits_for_slow_server():
+    startReading = asyncio.Event()
+    received = 0
+
+    async def slow_reader(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        nonlocal received
+        await startReading.wait()
+        while data := await reader.read(1024*1024):
+            received += len(data)
+        writer.close()
+
+    server = await asyncio.start_server(slow_reader, TEST_IP, 0)
+    async with server:
+        client = AsyncClient(sendBufferSize=256*1024)
+        await client.connect(*server.sockets[0].getsockname())
+
+        msg = Message()
+        msg.append(bytes(64*1024))
+        sent = 0
+        # socket buffers take a few MiB before the client's own queue starts to grow
+        for _ in range(1024):
+            try:
+                await asyncio.wait_for(client.send(msg), 0.5)
+            except asyncio.TimeoutError:
+                break
+            sent += 1
+        else:
+            assert False, "send() never waited for the server"
+
+        startReading.set()
+        await asyncio.wait_for(client.send(msg), 10)
+        await client.shutdown(timeout=10)
+        # the msg which send() timed out is dropped along with the waiting
+        assert received == (sent + 1) * (msg.hdr.packed_len() + len(msg.payload))
+
+
+@pytest.mark.asyncio
+async def test_async_client_request():
+    with run_server(Config(echo_app)):
+        client = AsyncClient()
+        await client.connect(TEST_IP, TEST_PORT)
+
+        futures = [client.request(Message(Message.Header(id=i)), timeout=10) for i in range(16)]
+        for i, future in enumerate(futures):
+            assert (await future).hdr.id == i
+
+        with pytest.raises(TimeoutError):
+            await client.request(Message(Message.Header(id=0xfffe)), timeout=0.1)
+
+        # response to a cancelled request isn't passed to recv()
+        client.request(Message(Message.Header(id=1))).cancel()
+        await client.send(Message(Message.Header(id=2)))
+        assert (await client.recv(timeout=10)).hdr.id == 2
+
+        await client.shutdown(timeout=10)
+
+
+@pytest.mark.asyncio
+async def test_async_client_cancelled_request():
+    with run_server(Config(echo_app)):
+        client = AsyncClient()
+        await client.connect(TEST_IP, TEST_PORT)
+
+        cancelled = client.request(Message(Message.Header(id=0xfffe)), timeout=10)
+        pending = client.request(Message(Message.Header(id=0xfffe)), timeout=10)
+        cancelled.cancel()
+        # connection is lost before the cancelled request is removed
+        client.process_disconnect(client._connection)
+
+        assert cancelled.cancelled()
+        with pytest.raises(ConnectionResetError):
+            await pending
+
+        await client.shutdown(timeout=10)
+
+
+@pytest.mark.asyncio
+async def test_async_client_misplaced_calls():
+    client = AsyncClient()
+    with pytest.raises(RuntimeError):
+        await client.recv()
+    with pytest.raises(RuntimeError):
+        await client.send(Message())
+    with pytest.raises(RuntimeError):
+        await client.shutdown()
\ No newline at end of file
@@ -0,0 +1,175 @@
+import time
+import socket
+import pytest
+import multiprocessing
+
+from utils import run_server, recv_exactly, TEST_IP, TEST_PORT
+
+from netframe import Client, Config, ServerApp, ContextT, Message, OwnedMessage, RECV_ENGINE, SLOW_CONSUMER_POLICY
+
+
+FLOOD = 1
+PING = 2
+# flood of msgs sent with send_packed()
+FLOOD_PACKED = 3
+ECHO = 4
+CHUNK_SIZE = 256 * 1024
+CHUNK_NUM = 64
+
+
+class flood_app(ServerApp):
+    def __init__(self, context: ContextT):
+        self.transitions = []
+
+    def on_slow_client(self, client, slow: bool):
+        self.transitions.append(slow)
+
+    def on_message(self, msg: OwnedMessage):
+        if msg.msg.hdr.id == FLOOD:
+            for _ in range(CHUNK_NUM):
+                chunk = Message(Message.Header(id=FLOOD))
+                chunk.append(bytes(CHUNK_SIZE))
+                msg.owner.send(chunk)
+        elif msg.msg.hdr.id == ECHO:
+            msg.owner.send(msg.msg)
+        elif msg.msg.hdr.id == FLOOD_PACKED:
+            chunk = Message(Message.Header(id=FLOOD))
+            chunk.append(bytes(CHUNK_SIZE))
+            packed = chunk.pack()
+            for _ in range(CHUNK_NUM):
+                msg.owner.send_packed(packed)
+        else:
+            # reports whether ping was received while the client was slow
+            reply = Message(Message.Header(id=PING))
+            reply.append(f"{int(msg.owner.isSlow)}{''.join(str(int(t)) for t in self.transitions)}".encode())
+            msg.owner.send(reply)
+
+
+def flood_client(floodId: int = FLOOD) -> tuple[int, bytes | None]:
+    '''
+    Requests the flood without reading it for a while, then reads everything.
+    Returns the number of flood msgs received and the reply to ping
+    '''
+    with socket.create_connection((TEST_IP, TEST_PORT), timeout=10) as sock:
+        if floodId == FLOOD_PACKED:
+            # send task is started first, so packed msgs take the path that writes them right away
+            sock.sendall(Message(Message.Header(id=PING)).pack())
+            hdr = Message.Header()
+            hdr.unpack(recv_exactly(sock, Message.Header.HEADER_LEN))
+            recv_exactly(sock, hdr.size)
+
+        sock.sendall(Message(Message.Header(id=floodId)).pack())
+        time.sleep(0.5)
+        sock.sendall(Message(Message.Header(id=PING)).pack())
+        time.sleep(0.5)
+
+        chunks = 0
+        try:
+            while True:
+                hdr = Message.Header()
+                hdr.unpack(recv_exactly(sock, Message.Header.HEADER_LEN))
+                payload = recv_exactly(sock, hdr.size)
+                if hdr.id == PING:
+                    return chunks, payload
+                chunks += 1
+        except ConnectionError:
+            return chunks, None
+
+
+@pytest.mark.parametrize("recvEngine", (RECV_ENGINE.STREAM, RECV_ENGINE.BUFFERED))
+def test_slow_client_blocks_reading(recvEngine: RECV_ENGINE):
+    config = Config(flood_app, recvEngine=recvEngine, writeHighWater=1024*1024, writeLowWater=256*1024)
+
+    with run_server(config):
+        chunks, pong = flood_client()
+
+    assert chunks == CHUNK_NUM
+    # ping is handled once the client has caught up
+    assert pong == b'010'
+
+
+def test_slow_client_blocks_reading_packed():
+    config = Config(flood_app, writeHighWater=1024*1024, writeLowWater=256*1024)
+
+    with run_server(config):
+        chunks, pong = flood_client(FLOOD_PACKED)
+
+    assert chunks == CHUNK_NUM
+    assert pong == b'010'
+
+
+def test_slow_client_drop_oldest():
+    config = Config(flood_app, writeHighWater=1024*1024, writeLowWater=256*1024,
+                    slowConsumerPolicy=SLOW_CONSUMER_POLICY.DROP_OLDEST)
+
+    with run_server(config):
+        chunks, pong = flood_client()
+
+    assert 0 < chunks < CHUNK_NUM
+    assert pong == b'010'
+
+
+def test_slow_client_disconnect():
+    config = Config(flood_app, writeHighWater=1024*1024, writeLowWater=256*1024,
+                    slowConsumerPolicy=SLOW_CONSUMER_POLICY.DISCONNECT)
+
+    with run_server(config):
+        chunks, pong = flood_client()
+
+    assert chunks < CHUNK_NUM
+    assert pong is None
+
+
+class slow_flag_app(flood_app):
+    def __init__(self, context: ContextT):
+        super().__init__(context)
+        self.slowEvents = context['slowEvents']
+
+    def on_slow_client(self, client, slow: bool):
+        self.slowEvents[slow].set()
+
+
+def test_client_backpressure_reaches_server():
+    slowEvents = {True: multiprocessing.Event(), False: multiprocessing.Event()}
+    config = Config(slow_flag_app, context={'slowEvents': slowEvents}, 
+                    writeHighWater=1024*1024, writeLowWater=256*1024)
+
+    with run_server(config):
+        client = Client(inQueueCapacity=64*1024)
+        client.connect(TEST_IP, TEST_PORT)
+        try:
+            client.send(Message(Message.Header(id=FLOOD)))
+            assert slowEvents[True].wait(timeout=10)
+            # client's worker stops reading once its queue is full, so server can't catch up
+            time.sleep(1)
+            assert not slowEvents[False].is_set()
+
+            for _ in range(CHUNK_NUM):
+                msg = client.recv(timeout=10)
+                assert msg.hdr.id == FLOOD and msg.hdr.size == CHUNK_SIZE
+            assert slowEvents[False].wait(timeout=10)
+        finally:
+            client.shutdown()
+
+
+def test_bidirectional_flood_with_server_limits():
+    config = Config(flood_app, writeHighWater=64*1024, writeLowWater=16*1024)
+
+    with run_server(config):
+        client = Client(inQueueCapacity=64*1024, outQueueCapacity=256*1024)
+        client.connect(TEST_IP, TEST_PORT)
+        try:
+            # more msgs are in flight than the client's outbound side takes, so it
+            # becomes slow, but it must keep reading the echoes the server waits to send
+            sent = received = 0
+            while received < 4000:
+                if sent < 4000 and sent - received < 300:
+                    msg = Message(Message.Header(id=ECHO))
+                    msg.append(bytes(4096))
+                    client.send(msg)
+                    sent += 1
+                else:
+                    assert client.recv(timeout=10).hdr.id == ECHO
+                    received += 1
+        finally:
+            client.shutdown()
\ No newline at end of file
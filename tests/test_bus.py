@@ -0,0 +1,84 @@
+import struct
+import pytest
+
+from contextlib import ExitStack
+
+from utils import run_server, run_client
+
+from netframe import Server, Client, Message, OwnedMessage, ServerApp, ContextT, Config
+
+
+ID_REQUEST = 1
+ROUTED = 2
+
+
+class routing_app(ServerApp):
+    def __init__(self, context: ContextT): ...
+
+    def on_message(self, msg: OwnedMessage):
+        if msg.msg.hdr.id == ID_REQUEST:
+            reply = Message()
+            reply.hdr.id = ID_REQUEST
+            reply.append(struct.pack('<Q', msg.owner.id))
+            msg.owner.send(reply)
+            return
+
+        # payload holds the id of the connection the rest is routed to
+        connId, = struct.unpack('<Q', msg.msg.pop(8))
+        routed = Message()
+        routed.hdr.id = ROUTED
+        routed.append(msg.msg.pop(msg.msg.hdr.size - 8))
+        Server.send_to(connId, routed)
+
+
+def conn_id(client: Client) -> int:
+    request = Message()
+    request.hdr.id = ID_REQUEST
+    client.send(request)
+    return struct.unpack('<Q', client.recv(timeout=10).pop(8))[0]
+
+
+def route(client: Client, connId: int, data: bytes):
+    msg = Message()
+    msg.hdr.id = ROUTED
+    msg.append(struct.pack('<Q', connId))
+    msg.append(data)
+    client.send(msg)
+
+
+def test_send_to_connection_of_other_worker():
+    # a worker stops accepting once it has a connection, so clients land on different 
+    # workers, as soon as both of them are up
+    config = Config(routing_app, workerNum=2, acceptPauseConnections=1, busCapacity=4096)
+    with run_server(config), ExitStack() as stack:
+        clients = {}
+        for _ in range(16):
+            client = stack.enter_context(run_client())
+            connId = conn_id(client)
+            # worker id is kept in the high bits
+            clients[connId >> 48] = (client, connId)
+            if len(clients) == 2:
+                break
+        assert len(clients) == 2
+        (first, firstId), (second, secondId) = clients.values()
+
+        # more msgs than fit into the ring at once
+        for i in range(200):
+            route(first, secondId, b'%d' % i)
+        for i in range(200):
+            msg = second.recv(timeout=10)
+            assert msg.hdr.id == ROUTED
+            assert msg.pop(msg.hdr.size) == b'%d' % i
+
+        route(second, firstId, b'back')
+        assert first.recv(timeout=10).pop(4) == b'back'
+
+        # msgs for connections that are gone are dropped
+        route(second, firstId + 1000, b'lost')
+        route(second, secondId, b'self')
+        assert second.recv(timeout=10).pop(4) == b'self'
+
+
+def test_send_to_outside_worker():
+    with pytest.raises(RuntimeError):
+        Server.send_to(0, Message())
\ No newline at end of file
@@ -1,10 +1,13 @@
 import time
 import queue
+import asyncio
 import pytest
 
-from utils import run_server, DEFAULT_CONFIG
+from concurrent.futures import wait
 
-from netframe import Server, Client, Message, OwnedMessage, ServerApp, ContextT
+from utils import run_server, run_client, DEFAULT_CONFIG
+
+from netframe import Server, Client, Message, OwnedMessage, ServerApp, ContextT, Config, RECV_ENGINE
 
 
 class test_basic_functionality_app(ServerApp):
@@ -39,6 +42,56 @@ def test_recv_timeout(server: Server, client: Client):
     client.recv(timeout=10)
 
 
+@pytest.mark.parametrize("recvEngine", (RECV_ENGINE.STREAM, RECV_ENGINE.BUFFERED))
+def test_recv_engines(recvEngine: RECV_ENGINE):
+    config = Config(test_basic_functionality_app, recvEngine=recvEngine, recvBufferSize=16)
+
+    with run_server(config):
+        with run_client() as client:
+            sent = []
+            for i in range(256):
+                msg = Message()
+                msg.hdr.id = i
+                msg.append(bytes([i]) * i * 7)
+                client.send(msg)
+                sent.append(msg)
+
+            # exceeds receive buffer size
+            large = Message()
+            large.append(bytes(range(256)) * 4096)
+            client.send(large)
+            sent.append(large)
+
+            for msg in sent:
+                assert msg == client.recv(timeout=10)
+
+
+class test_async_app_app(ServerApp):
+    def __init__(self, context: ContextT): ...
+
+    async def on_message(self, msg: OwnedMessage):
+        # later msgs would overtake earlier ones if handled concurrently
+        await asyncio.sleep(0.001 * (msg.msg.hdr.id % 4))
+        msg.owner.send(msg.msg)
+
+@pytest.mark.parametrize("recvEngine", (RECV_ENGINE.STREAM, RECV_ENGINE.BUFFERED))
+def test_async_app(recvEngine: RECV_ENGINE):
+    config = Config(test_async_app_app, recvEngine=recvEngine, recvBufferSize=16)
+
+    with run_server(config):
+        with run_client() as client:
+            sent = []
+            for i in range(64):
+                msg = Message()
+                msg.hdr.id = i
+                msg.append(bytes([i]) * i)
+                client.send(msg)
+                sent.append(msg)
+
+            for msg in sent:
+                assert msg == client.recv(timeout=10)
+
+
 def test_misplaced_calls():
     with run_server(DEFAULT_CONFIG):
         client = Client()
@@ -56,4 +109,54 @@ def test_misplaced_calls():
         client.shutdown()
 
         with pytest.raises(RuntimeError):
-            client.shutdown()
\ No newline at end of file
+            client.shutdown()
+
+
+class test_request_app(ServerApp):
+    def __init__(self, context: ContextT):
+        self.requests: list[OwnedMessage] = []
+
+    def on_message(self, msg: OwnedMessage):
+        if msg.msg.hdr.corrId is None:
+            msg.owner.send(msg.msg)
+            return
+
+        # reply to every pair of requests in reverse order, never reply to id 0xffff
+        if msg.msg.hdr.id != 0xffff:
+            self.requests.append(msg)
+        if len(self.requests) == 2:
+            for request in reversed(self.requests):
+                reply = Message()
+                reply.append(request.msg.payload)
+                request.reply(reply)
+            self.requests.clear()
+
+@pytest.mark.parametrize("server", (test_request_app,), indirect=True)
+def test_request(server: Server, client: Client):
+    msgs = []
+    for i in range(64):
+        msg = Message()
+        msg.append(bytes([i]) * 8)
+        msgs.append(msg)
+    futures = [client.request(msg, timeout=10) for msg in msgs]
+
+    # plain msgs are still received with recv()
+    client.send(Message())
+    assert client.recv(timeout=10) == Message()
+
+    for msg, future in zip(msgs, futures):
+        assert future.result(timeout=10).payload == msg.payload
+
+    lost = client.request(Message(Message.Header(id=0xffff)), timeout=0.2)
+    wait([lost], timeout=10)
+    assert isinstance(lost.exception(), TimeoutError)
+
+    # the app replies once the second request arrives, after the first one has timed out
+    late = client.request(Message(Message.Header(id=1)), timeout=0.2)
+    wait([late], timeout=10)
+    assert isinstance(late.exception(), TimeoutError)
+    client.request(Message(Message.Header(id=2)), timeout=10).result(timeout=10)
+
+    # late response isn't passed to recv()
+    client.send(Message(Message.Header(id=3)))
+    assert client.recv(timeout=10).hdr.id == 3
\ No newline at end of file
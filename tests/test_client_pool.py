@@ -0,0 +1,73 @@
+import pytest
+import asyncio
+
+from utils import run_server, TEST_IP, TEST_PORT
+
+from netframe import ClientPool, Message, OwnedMessage, ServerApp, ContextT, Config
+
+
+class pool_app(ServerApp):
+    def __init__(self, context: ContextT): ...
+
+    def on_message(self, msg: OwnedMessage):
+        # requests with id 0xfffe are never answered
+        if msg.msg.hdr.id != 0xfffe:
+            msg.owner.send(msg.msg)
+
+
+@pytest.mark.asyncio
+async def test_pool_requests_and_stats():
+    with run_server(Config(pool_app, workerNum=2)):
+        pool = ClientPool([(TEST_IP, TEST_PORT)], size=4)
+        await pool.connect()
+
+        futures = [pool.request(Message(Message.Header(id=i)), timeout=10) for i in range(32)]
+        for i, future in enumerate(futures):
+            assert (await future).hdr.id == i
+
+        await pool.send(Message())
+        assert await pool.recv(timeout=10) == Message()
+
+        stats = pool.stats()
+        assert stats.connections == 4
+        assert stats.requests == stats.responses == 32
+        assert stats.msgsSent == stats.msgsReceived == 1
+        assert stats.inFlight == 0
+
+        await pool.shutdown(timeout=10)
+
+
+@pytest.mark.asyncio
+async def test_pool_least_outstanding_selection():
+    with run_server(Config(pool_app)):
+        pool = ClientPool([(TEST_IP, TEST_PORT)], size=4)
+        await pool.connect()
+
+        unanswered = [pool.request(Message(Message.Header(id=0xfffe)), timeout=0.2) for _ in range(4)]
+        assert pool.stats().inFlightPerConnection == [1, 1, 1, 1]
+
+        # all connections are busy equally, the answered request goes to any of them
+        assert (await pool.request(Message(Message.Header(id=1)), timeout=10)).hdr.id == 1
+        for future in unanswered:
+            with pytest.raises(TimeoutError):
+                await future
+        # let done callbacks of the futures run
+        await asyncio.sleep(0)
+        assert pool.stats().timeouts == 4
+
+        await pool.shutdown(timeout=10)
+
+
+@pytest.mark.asyncio
+async def test_pool_connect_retried_after_failure():
+    pool = ClientPool([(TEST_IP, TEST_PORT)], size=2)
+    # no server yet
+    with pytest.raises(ConnectionRefusedError):
+        await pool.connect()
+
+    with run_server(Config(pool_app)):
+        await pool.connect()
+        assert pool.stats().connections == 2
+        assert (await pool.request(Message(Message.Header(id=1)), timeout=10)).hdr.id == 1
+
+        await pool.shutdown(timeout=10)
@@ -0,0 +1,169 @@
+import os
+import time
+import json
+import hashlib
+import asyncio
+import zlib
+import pytest
+
+from utils import run_server, TEST_IP, TEST_PORT
+
+from netframe import AsyncClient, Message, OwnedMessage, ServerApp, ContextT, Config, RECV_ENGINE
+from netframe.compression import Deflater, Inflater
+from netframe.recv_buffer import RecvBuffer
+
+
+def records(n: int) -> bytes:
+    return json.dumps([{"id": i, "name": f"user{i}", "active": True} for i in range(n)]).encode()
+
+
+def test_deflate_inflate():
+    inflater = Inflater()
+    # connection may switch to another deflater, e.g. with set_compression()
+    for deflater in (Deflater(1, False), Deflater(6, True), Deflater(1, False), Deflater(1, True)):
+        for i in range(4):
+            payload = records(i * 10)
+            data, _ = deflater.deflate([payload[:7], memoryview(payload)[7:]])
+            assert inflater.inflate(data)[0] == payload
+
+
+@pytest.mark.parametrize("keepContext", (False, True))
+def test_shared_context(keepContext: bool):
+    deflater = Deflater(1, keepContext)
+    first, _ = deflater.deflate([records(100)])
+    second, _ = deflater.deflate([records(100)])
+    # repeated payload is almost free with the shared context
+    assert (len(second) < len(first) / 3) == keepContext
+
+
+def test_inflate_limit():
+    data, _ = Deflater(1, False).deflate([bytes(1024*1024)])
+    with pytest.raises(zlib.error):
+        Inflater().inflate(data, 1024)
+
+
+def test_compressed_frame_parsed():
+    hdr = Message.Header(id=5, size=3, corrId=9, compressed=True)
+    buffer = RecvBuffer(64)
+    frame = hdr.pack() + b'abc'
+    buffer.get_buffer()[:len(frame)] = frame
+    buffer.buffer_updated(len(frame))
+
+    msg = buffer.pop_frame()
+    assert msg is not None
+    assert msg.hdr == hdr
+    assert msg.payload == b'abc'
+
+
+class echo_app(ServerApp):
+    def __init__(self, context: ContextT): ...
+
+    def on_message(self, msg: OwnedMessage):
+        msg.owner.send(msg.msg)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("recvEngine", (RECV_ENGINE.STREAM, RECV_ENGINE.BUFFERED))
+@pytest.mark.parametrize("compressContext", (False, True))
+async def test_compressed_echo(recvEngine: RECV_ENGINE, compressContext: bool):
+    config = Config(echo_app, recvEngine=recvEngine, compressMinSize=256, compressContext=compressContext)
+    with run_server(config) as server:
+        # the client compresses its msgs as well
+        client = AsyncClient(recvEngine, compressMinSize=256, compressContext=compressContext)
+        await client.connect(TEST_IP, TEST_PORT)
+
+        payloads = [b'small', records(1000), os.urandom(1024), records(20000), records(1000)]
+        for i, payload in enumerate(payloads):
+            msg = Message(Message.Header(id=i))
+            msg.append(payload)
+            await client.send(msg)
+
+        for i, payload in enumerate(payloads):
+            msg = await client.recv(timeout=10)
+            assert msg.hdr.id == i
+            assert msg.payload == payload
+            assert not msg.hdr.compressed
+
+        await client.shutdown(timeout=10)
+
+        stats = client.compression_stats()
+        # small payload isn't compressed, the one that doesn't shrink is sent as is without context
+        assert stats.compressedMsgs == (4 if compressContext else 3)
+        assert stats.decompressedMsgs == stats.compressedMsgs
+        assert stats.bytes_saved() > len(records(20000)) / 2
+
+        # workers publish their counters periodically, wait until the last ones are in
+        expected = 4 if compressContext else 3
+        deadline = time.monotonic() + 10
+        while True:
+            stats = server.compression_stats()
+            if stats.compressedMsgs == stats.decompressedMsgs == expected or time.monotonic() > deadline:
+                break
+            await asyncio.sleep(0.1)
+        assert stats.compressedMsgs == stats.decompressedMsgs == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("recvEngine", (RECV_ENGINE.STREAM, RECV_ENGINE.BUFFERED))
+async def test_inflated_size_limited(recvEngine: RECV_ENGINE):
+    config = Config(echo_app, recvEngine=recvEngine, maxInflatedSize=64*1024)
+    with run_server(config):
+        client = AsyncClient(recvEngine, compressMinSize=256)
+        await client.connect(TEST_IP, TEST_PORT)
+
+        msg = Message(Message.Header(id=1))
+        msg.append(bytes(64*1024))
+        await client.send(msg)
+        assert (await client.recv(timeout=10)).payload == msg.payload
+
+        # takes about 1 KiB on the wire
+        msg = Message(Message.Header(id=2))
+        msg.append(bytes(1024*1024))
+        await client.send(msg)
+        with pytest.raises(ConnectionResetError):
+            await client.recv(timeout=10)
+
+        await client.shutdown(timeout=10)
+
+
+class streaming_app(ServerApp):
+    def __init__(self, context: ContextT):
+        self.hashes = {}
+
+    def on_message(self, msg: OwnedMessage):
+        pass
+
+    def on_message_start(self, msg: OwnedMessage):
+        self.hashes[msg.owner] = (hashlib.sha256(), [0])
+
+    def on_message_chunk(self, msg: OwnedMessage, chunk: bytes):
+        hash, chunks = self.hashes[msg.owner]
+        hash.update(chunk)
+        chunks[0] += 1
+
+    def on_message_end(self, msg: OwnedMessage):
+        hash, chunks = self.hashes.pop(msg.owner)
+        reply = Message(Message.Header(id=msg.msg.hdr.id))
+        reply.append(hash.digest())
+        reply.append(chunks[0].to_bytes(4, 'little'))
+        msg.reply(reply)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("recvEngine", (RECV_ENGINE.STREAM, RECV_ENGINE.BUFFERED))
+async def test_compressed_msg_streamed(recvEngine: RECV_ENGINE):
+    with run_server(Config(streaming_app, recvEngine=recvEngine, streamThreshold=1024)):
+        client = AsyncClient(compressMinSize=1, compressContext=True)
+        await client.connect(TEST_IP, TEST_PORT)
+
+        payload = records(20000)
+        msg = Message(Message.Header(id=1))
+        msg.append(payload)
+        await client.send(msg)
+
+        # chunks are decompressed before they reach the app
+        reply = await client.recv(timeout=10)
+        assert reply.payload[:32] == hashlib.sha256(payload).digest()
+        assert int.from_bytes(reply.payload[32:], 'little') > 1
+
+        await client.shutdown(timeout=10)
\ No newline at end of file
@@ -1,7 +1,8 @@
+import pickle
 import pytest
 import struct
 
-from netframe import Message
+from netframe import Message, MessagePool
 
 
 @pytest.mark.parametrize(
@@ -55,7 +56,13 @@ def test_append_pop(dataBatch):
     (
         (Message(hdr=Message.Header(id=0, size=0), payload=bytearray()),         b'\x00\x00\x00\x00\x00\x00'),
         (Message(hdr=Message.Header(id=1, size=3), payload=bytearray(b'123')),   b'\x01\x00\x03\x00\x00\x00123'),
-        (Message(hdr=Message.Header(id=1, size=3), payload=bytearray(b'12345')), b'\x01\x00\x03\x00\x00\x00123')
+        (Message(hdr=Message.Header(id=1, size=3), payload=bytearray(b'12345')), b'\x01\x00\x03\x00\x00\x00123'),
+        (Message(hdr=Message.Header(id=1, size=3, corrId=7), payload=bytearray(b'123')), 
+                                                                    b'\x01\x00\x03\x00\x00\x80\x01\x07\x00\x00\x00123'),
+        (Message(hdr=Message.Header(id=1, size=3, compressed=True), payload=bytearray(b'123')), 
+                                                                    b'\x01\x00\x03\x00\x00\x80\x02\x00\x00\x00\x00123'),
+        (Message(hdr=Message.Header(id=1, size=3, corrId=7, compressed=True), payload=bytearray(b'123')), 
+                                                                    b'\x01\x00\x03\x00\x00\x80\x03\x07\x00\x00\x00123')
     )
 )
 def test_pack_unpack(msg: Message, packed: bytes):
@@ -66,4 +73,108 @@ def test_pack_unpack(msg: Message, packed: bytes):
 
     assert copy.hdr.id == msg.hdr.id
     assert copy.hdr.size == msg.hdr.size
-    assert copy.payload == msg.payload[:msg.hdr.size]
\ No newline at end of file
+    assert copy.hdr.corrId == msg.hdr.corrId
+    assert copy.hdr.compressed == msg.hdr.compressed
+    assert copy.payload == msg.payload[:msg.hdr.size]
+
+
+@pytest.mark.parametrize(("corrId", "compressed"), ((None, False), (7, False), (None, True), (7, True)))
+def test_header_size_limit(corrId: int | None, compressed: bool):
+    # flags don't take bits of the size field
+    limit = Message.Header.SIZE_MASK
+    assert limit == 2**31 - 1
+    copy = Message()
+    copy.unpack(Message.Header(id=1, size=limit, corrId=corrId, compressed=compressed).pack())
+    assert (copy.hdr.size, copy.hdr.corrId, copy.hdr.compressed) == (limit, corrId, compressed)
+
+    # larger sizes would overwrite the extension flag, so the peer would parse another frame
+    for size in (limit + 1, 0x80000005):
+        with pytest.raises(ValueError):
+            Message.Header(id=1, size=size, corrId=corrId, compressed=compressed).pack()
+
+
+def test_zero_copy_pop_and_release():
+    m = Message(zeroCopy=True)
+    m.append(b'abcdef')
+
+    first, second = m.pop(2), m.pop(4)
+    assert isinstance(first, memoryview)
+    assert (first, second) == (b'ab', b'cdef')
+
+    # views share memory with payload
+    m.payload[0] = ord('x')
+    assert first == b'xb'
+
+    with pytest.raises(BufferError):
+        m.append(b'g')
+
+    m.release()
+    with pytest.raises(ValueError):
+        bytes(first)
+    m.append(b'g')
+    assert m.payload == b'xbcdefg'
+
+
+@pytest.mark.parametrize(
+    ("msg"),
+    (
+        Message(hdr=Message.Header(id=0, size=0), payload=bytearray()),
+        Message(hdr=Message.Header(id=1, size=3), payload=bytearray(b'123')),
+        Message(hdr=Message.Header(id=1, size=3), payload=bytearray(b'12345')),
+    )
+)
+def test_pack_buffers(msg: Message):
+    buffers = msg.pack_buffers()
+
+    assert b''.join(buffers) == msg.pack()
+    assert buffers[1] is msg.payload or buffers[1].obj is msg.payload
+
+
+def test_append_without_copy():
+    m = Message()
+    chunk = bytearray(b'chunk')
+
+    m.append(b'head')
+    m.append(chunk, copy=False)
+    m.append(b'tail')
+
+    buffers = m.pack_buffers()
+    assert any(buffer is chunk for buffer in buffers)
+    assert m.pack() == Message.Header(id=0, size=13).pack() + b'headchunktail'
+
+    restored = pickle.loads(pickle.dumps(m))
+    assert restored.pop(13) == b'headchunktail'
+    assert m.pop(4) == b'head'
+    assert m.pop(9) == b'chunktail'
+
+
+def test_reserve():
+    m = Message()
+    m.reserve(8)
+    m.append(b'1234')
+
+    assert m.hdr.size == 4
+    assert m.pack() == Message.Header(id=0, size=4).pack() + b'1234'
+
+    m.append(b'56789')
+    assert m.pop(9) == b'123456789'
+
+
+def test_message_pool():
+    pool = MessagePool(maxSize=1)
+
+    first = pool.get(1, 3, bytearray(b'abc'))
+    assert (first.hdr.id, first.hdr.size, first.payload) == (1, 3, b'abc')
+
+    first.release()
+    first.release()
+    assert len(pool) == 1
+
+    second = pool.get(2)
+    assert second is first
+    assert (second.hdr.id, second.hdr.size, second.payload) == (2, 0, b'')
+
+    # pool is full, extra messages are dropped
+    pool.get().release()
+    second.release()
+    assert len(pool) == 1
\ No newline at end of file
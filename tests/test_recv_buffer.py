@@ -0,0 +1,101 @@
+import pytest
+
+from netframe import Message
+from netframe.recv_buffer import RecvBuffer
+
+
+def feed(buffer: RecvBuffer, data: bytes, chunkSize: int):
+    msgs: list[Message] = []
+    while data:
+        # behave like recv_into: fill as much of the buffer as possible
+        view = buffer.get_buffer(chunkSize)
+        nbytes = min(len(view), chunkSize, len(data))
+        view[:nbytes] = data[:nbytes]
+        buffer.buffer_updated(nbytes)
+        data = data[nbytes:]
+
+        while (msg := buffer.pop_frame()) is not None:
+            msgs.append(msg)
+
+    return msgs
+
+
+@pytest.mark.parametrize("chunkSize", (1, 5, 6, 7, 4096, 1 << 20))
+def test_frames_split_across_reads(chunkSize: int):
+    sent = [Message(Message.Header(id=i, size=i*3, corrId=i*1000 if i % 2 else None), bytearray(bytes([i])*i*3)) 
+            for i in range(64)]
+    data = b''.join(msg.pack() for msg in sent)
+
+    recvd = feed(RecvBuffer(16), data, chunkSize)
+
+    assert [(m.hdr, m.payload) for m in recvd] == [(m.hdr, m.payload) for m in sent]
+
+
+def test_large_frame_received_in_place():
+    buffer = RecvBuffer(RecvBuffer.MIN_FREE_SPACE)
+    large = Message(Message.Header(id=1, size=1 << 20), bytearray(b'x' * (1 << 20)))
+    small = Message(Message.Header(id=2, size=3), bytearray(b'abc'))
+
+    recvd = feed(buffer, large.pack() + small.pack(), 64 * 1024)
+
+    assert [m.hdr.id for m in recvd] == [1, 2]
+    assert recvd[0].payload == large.payload
+    assert len(buffer.get_buffer()) == RecvBuffer.MIN_FREE_SPACE
+
+
+def test_buffer_grows_for_frame_larger_than_free_space():
+    buffer = RecvBuffer(RecvBuffer.MIN_FREE_SPACE)
+    msgs = [Message(Message.Header(id=i, size=3000), bytearray(bytes([i]) * 3000)) for i in range(4)]
+
+    recvd = feed(buffer, b''.join(m.pack() for m in msgs), 5000)
+
+    assert [m.payload for m in recvd] == [m.payload for m in msgs]
+
+
+@pytest.mark.parametrize("chunkSize", (1, 7, 4096, 1 << 20))
+def test_large_payload_streamed(chunkSize: int):
+    buffer = RecvBuffer(RecvBuffer.MIN_FREE_SPACE)
+    buffer.streamThreshold = 1000
+    small = Message(Message.Header(id=1, size=3), bytearray(b'abc'))
+    large = Message(Message.Header(id=2, size=1 << 16, corrId=7), bytearray(bytes(range(256)) * 256))
+    data = small.pack() + large.pack() + small.pack()
+
+    events = []
+    while data:
+        view = buffer.get_buffer(chunkSize)
+        nbytes = min(len(view), chunkSize, len(data))
+        view[:nbytes] = data[:nbytes]
+        buffer.buffer_updated(nbytes)
+        data = data[nbytes:]
+
+        while True:
+            if buffer.streaming():
+                if (chunk := buffer.pop_chunk()) is None:
+                    break
+                events.append(chunk)
+            elif (msg := buffer.pop_frame()) is not None:
+                events.append(msg)
+            else:
+                break
+
+    msgs = [e for e in events if isinstance(e, Message)]
+    assert [(m.hdr, m.payload) for m in msgs] == [(small.hdr, small.payload), 
+                                                  (large.hdr, bytearray()), 
+                                                  (small.hdr, small.payload)]
+    chunks = events[2:-1]
+    assert b''.join(chunks) == large.payload
+    # streamed payload is never collected in the buffer
+    assert max(map(len, chunks)) <= max(RecvBuffer.MIN_FREE_SPACE, chunkSize)
+
+
+def test_large_frame_header_alone_allocates_little():
+    buffer = RecvBuffer(RecvBuffer.MIN_FREE_SPACE)
+    header = Message.Header(id=1, size=1 << 30)
+
+    assert feed(buffer, header.pack(), 4096) == []
+    assert buffer.receiving_in_place()
+    # payload grows with the received data, not with the announced size
+    assert len(buffer.get_buffer()) <= RecvBuffer.MIN_FREE_SPACE
+
+    feed(buffer, b'x' * (1 << 16), 4096)
+    assert len(buffer.get_buffer()) <= 1 << 16
@@ -0,0 +1,70 @@
+import io
+import os
+import pytest
+
+from utils import run_server, run_client
+
+from netframe import Config, ServerApp, ContextT, Message, OwnedMessage, RECV_ENGINE
+
+
+FILE_SIZE = 3 * 1024 * 1024
+OFFSET = 1000
+COUNT = 2 * 1024 * 1024 + 7
+
+BY_PATH = 1
+BY_FD = 2
+BY_FILE_OBJECT = 3  # has no fileno(), so it's read in chunks instead of sendfile()
+
+
+class send_file_app(ServerApp):
+    def __init__(self, context: ContextT):
+        self.path = context['path']
+
+    def on_message(self, msg: OwnedMessage):
+        before = Message(Message.Header(id=10))
+        before.append(b'before')
+        after = Message(Message.Header(id=11))
+        after.append(b'after')
+
+        msg.owner.send(before)
+        if msg.msg.hdr.id == BY_PATH:
+            msg.owner.send_file(BY_PATH, self.path, OFFSET, COUNT, prefix=b'prefix')
+        elif msg.msg.hdr.id == BY_FD:
+            fd = os.open(self.path, os.O_RDONLY)
+            msg.owner.send_file(BY_FD, fd)
+            # fd stays open after the file is sent
+            msg.owner.send(after)
+            msg.owner.send_file(BY_FD, fd, OFFSET, COUNT)
+        else:
+            with open(self.path, 'rb') as file:
+                fileObject = io.BytesIO(file.read())
+            msg.owner.send_file(BY_FILE_OBJECT, fileObject, OFFSET, COUNT, prefix=b'prefix')
+        msg.owner.send(after)
+
+
+@pytest.mark.parametrize("recvEngine", (RECV_ENGINE.STREAM, RECV_ENGINE.BUFFERED))
+def test_send_file(tmp_path, recvEngine: RECV_ENGINE):
+    content = os.urandom(FILE_SIZE)
+    path = tmp_path / 'file'
+    path.write_bytes(content)
+    config = Config(send_file_app, {'path': str(path)}, recvEngine=recvEngine)
+
+    with run_server(config):
+        with run_client() as client:
+            def expect(id: int, payload: bytes):
+                msg = client.recv(timeout=10)
+                assert msg.hdr.id == id
+                assert msg.payload == payload
+
+            for request in (BY_PATH, BY_FILE_OBJECT):
+                client.send(Message(Message.Header(id=request)))
+                expect(10, b'before')
+                expect(request, b'prefix' + content[OFFSET:OFFSET + COUNT])
+                expect(11, b'after')
+
+            client.send(Message(Message.Header(id=BY_FD)))
+            expect(10, b'before')
+            expect(BY_FD, content)
+            expect(11, b'after')
+            expect(BY_FD, content[OFFSET:OFFSET + COUNT])
+            expect(11, b'after')
\ No newline at end of file
@@ -0,0 +1,141 @@
+import os
+import time
+import signal
+import socket
+import pytest
+
+from utils import run_server, run_client, DefaultApp, TEST_IP, TEST_PORT
+
+from netframe import Server, Config, ServerApp, ContextT, Message, OwnedMessage
+
+
+def wait_for_distribution(server: Server, expected: int, timeout: float=10) -> list[int]:
+    deadline = time.monotonic() + timeout
+    while sum(distribution := server.connection_distribution()) != expected:
+        assert time.monotonic() < deadline, distribution
+        time.sleep(0.05)
+    return distribution
+
+
+@pytest.mark.parametrize("reusePort", [False, 
+    pytest.param(True, marks=pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), 
+                                                reason="SO_REUSEPORT is not supported"))])
+def test_connection_distribution(reusePort: bool):
+    with run_server(Config(DefaultApp, workerNum=2, reusePort=reusePort)) as server:
+        socks = [socket.create_connection((TEST_IP, TEST_PORT)) for _ in range(32)]
+
+        distribution = wait_for_distribution(server, 32)
+        assert len(distribution) == 2
+        if reusePort:
+            # kernel hashes connections among both sockets
+            assert all(distribution)
+
+        for sock in socks:
+            sock.close()
+
+        assert wait_for_distribution(server, 0) == [0, 0]
+        assert sum(server.connection_distribution(accepted=True)) == 32
+
+
+def test_overloaded_worker_pauses_accepting():
+    with run_server(Config(DefaultApp, workerNum=2, acceptPauseConnections=4)) as server:
+        socks = []
+        # connect one by one, so every worker sees the load of the other
+        for i in range(8):
+            socks.append(socket.create_connection((TEST_IP, TEST_PORT)))
+            wait_for_distribution(server, i+1)
+        assert server.connection_distribution() == [4, 4]
+
+        # both workers are overloaded, so both of them resume accepting
+        # the paused one notices that with its next loop lag probe
+        socks.append(socket.create_connection((TEST_IP, TEST_PORT)))
+        wait_for_distribution(server, 9)
+        deadline = time.monotonic() + 10
+        while not all(load.accepting for load in server.worker_loads()):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+
+        for sock in socks:
+            sock.close()
+        wait_for_distribution(server, 0)
+        assert all(load.loopLag < 1 for load in server.worker_loads())
+
+
+class busy_app(ServerApp):
+    def __init__(self, context: ContextT): ...
+
+    def on_message(self, msg: OwnedMessage):
+        # keep the worker busy
+        deadline = time.process_time() + 0.05
+        while time.process_time() < deadline:
+            pass
+        msg.owner.send(msg.msg)
+
+
+def test_autoscaling():
+    config = Config(busy_app, workerNum=1, maxWorkerNum=2, 
+                    scaleUpUtilization=0.5, scaleDownUtilization=0.1, scalePeriod=0.5)
+    with run_server(config) as server, run_client() as client:
+        deadline = time.monotonic() + 20
+        while len(server.connection_distribution()) < 2:
+            assert time.monotonic() < deadline
+            client.request(Message(), timeout=10).result()
+
+        # without load the added worker is retired, the client's connection is kept
+        deadline = time.monotonic() + 20
+        while len(server.connection_distribution()) > 1:
+            assert time.monotonic() < deadline
+            time.sleep(0.1)
+        assert server.connection_distribution() == [1]
+        assert client.request(Message(), timeout=10).result().hdr.size == 0
+
+
+class pid_app(ServerApp):
+    def __init__(self, context: ContextT): ...
+
+    def on_message(self, msg: OwnedMessage):
+        msg.msg.append(str(os.getpid()).encode())
+        msg.owner.send(msg.msg)
+
+
+def test_crashed_worker_is_respawned():
+    with run_server(Config(pid_app)) as server:
+        with run_client() as client:
+            client.send(Message())
+            pid = int(client.recv(timeout=10).payload)
+            os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+
+            # connections of the crashed worker are lost
+            with pytest.raises(ConnectionResetError):
+                client.recv(timeout=10)
+
+        deadline = time.monotonic() + 10
+        while server.stats().restarts < 1:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        stats = server.stats()
+        assert stats.crashes == 1 and stats.crashesPerWorker == {0: 1}
+
+        # the new worker accepts connections on the same listen socket
+        with run_client() as client:
+            client.send(Message())
+            assert int(client.recv(timeout=10).payload) != pid
+
+
+class broken_app(ServerApp):
+    def __init__(self, context: ContextT):
+        raise RuntimeError("App can't start")
+
+
+def test_worker_that_failed_to_start_isnt_respawned():
+    with run_server(Config(broken_app, workerNum=2)) as server:
+        deadline = time.monotonic() + 10
+        while server.stats().crashes < 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+
+        # respawns would have happened by now
+        time.sleep(0.5)
+        stats = server.stats()
+        assert stats.crashes == 2 and stats.restarts == 0
+        assert server.connection_distribution() == []
\ No newline at end of file
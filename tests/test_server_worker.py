@@ -1,12 +1,15 @@
+import time
 import pytest
 import asyncio
+import threading
 import multiprocessing
 
 from unittest import mock
 
 from utils import MockReader, MockWriter
 
-from netframe import Message
+from netframe import Message, MessagePool, OwnedMessage, Connection, offload
+from netframe.connection import ConnOwner
 from netframe.server_worker import ServerWorker
     
 
@@ -18,7 +21,7 @@ async def test_config_cb_called():
     writer = MockWriter()
     app = mock.MagicMock()
 
-    worker = ServerWorker(mock.MagicMock(), mock.MagicMock(), app, multiprocessing.Event())
+    worker = ServerWorker(mock.MagicMock(), mock.MagicMock(writeHighWater=0, compressMinSize=0), app, multiprocessing.Event())
     await asyncio.create_task(worker._process_new_connection(reader, writer))
 
     while len(worker._connections):
@@ -38,7 +41,7 @@ async def test_disconnect_cb_not_called_after_conn_reject():
     app = mock.MagicMock()
     app.on_client_connect.side_effect = lambda _, __ : False
 
-    worker = ServerWorker(mock.MagicMock(), mock.MagicMock(), app, multiprocessing.Event())
+    worker = ServerWorker(mock.MagicMock(), mock.MagicMock(writeHighWater=0, compressMinSize=0), app, multiprocessing.Event())
     await asyncio.create_task(worker._process_new_connection(reader, writer))
 
     app.on_client_connect.assert_called_once()
@@ -53,9 +56,300 @@ async def test_exception_in_on_client_connect_cb():
     app = mock.MagicMock()
     app.on_client_connect.side_effect = lambda _, __ : 1/0
 
-    worker = ServerWorker(mock.MagicMock(), mock.MagicMock(), app, multiprocessing.Event())
+    worker = ServerWorker(mock.MagicMock(), mock.MagicMock(writeHighWater=0, compressMinSize=0), app, multiprocessing.Event())
     await asyncio.create_task(worker._process_new_connection(reader, writer))
 
     app.on_client_connect.assert_called_once()
     assert(len(worker._connections) == 0)
-    app.on_client_disconnect.assert_not_called()
\ No newline at end of file
+    app.on_client_disconnect.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_sends_coalesced_into_single_write():
+    msgs = [Message(Message.Header(id=i, size=1), payload=bytearray(b'x')) for i in range(3)]
+    reader = MockReader(msgs[0].pack())
+
+    writer = MockWriter()
+    app = mock.MagicMock()
+    def on_message(msg):
+        for m in msgs:
+            msg.owner.send(m)
+    app.on_message.side_effect = on_message
+
+    worker = ServerWorker(mock.MagicMock(), mock.MagicMock(writeHighWater=0, compressMinSize=0), app, multiprocessing.Event())
+    await asyncio.create_task(worker._process_new_connection(reader, writer))
+
+    while not writer.buffer:
+        await asyncio.sleep(0.01)
+
+    assert writer.buffer == [b''.join(m.pack() for m in msgs)]
+
+
+@pytest.mark.asyncio
+async def test_failed_send_closes_connection():
+    writer = MockWriter()
+    writer.transport = mock.MagicMock()
+    writer.writelines = mock.MagicMock(side_effect=RuntimeError("Write failed"))
+    owner = mock.MagicMock()
+    conn = Connection(MockReader(), writer, owner)
+
+    conn.send(Message(Message.Header(id=1)))
+    await asyncio.wait_for(conn.wait_closed(), 10)
+
+    # the error isn't left unnoticed in the finished send task
+    assert not conn.isActive
+    writer.transport.abort.assert_called_once()
+    owner.process_disconnect.assert_called_once_with(conn)
+
+
+@pytest.mark.asyncio
+async def test_transport_limits_follow_slow_state():
+    writer = MockWriter()
+    writer.transport = mock.MagicMock()
+    writer.transport.get_write_buffer_size.return_value = 0
+    conn = Connection(MockReader(), writer, mock.MagicMock())
+
+    # the transport buffers up to the high mark before drain() waits
+    conn.set_write_limits(1000, 100)
+    writer.transport.set_write_buffer_limits.assert_called_with(high=1000, low=100)
+
+    msg = Message()
+    msg.append(b'x' * 2000)
+    conn.send(msg)
+    assert conn.isSlow
+    writer.transport.set_write_buffer_limits.assert_called_with(high=100, low=100)
+
+    while conn.isSlow:
+        await asyncio.sleep(0.01)
+    writer.transport.set_write_buffer_limits.assert_called_with(high=1000, low=100)
+
+
+@pytest.mark.asyncio
+async def test_slow_connection_keeps_reading():
+    writer = MockWriter()
+    writer.transport = mock.MagicMock()
+    writer.transport.get_write_buffer_size.return_value = 0
+    conn = Connection(MockReader(), writer, mock.MagicMock())
+    conn.set_write_limits(1000, 100, pauseReading=False)
+
+    msg = Message()
+    msg.append(b'x' * 2000)
+    conn.send(msg)
+    assert conn.isSlow
+    assert not conn._readingPaused
+
+    # a pause requested while the connection is slow is lifted by its own resume
+    conn.pause_reading()
+    conn.resume_reading()
+    assert not conn._readingPaused
+
+    while conn.isSlow:
+        await asyncio.sleep(0.01)
+    assert not conn._readingPaused
+
+
+@pytest.mark.asyncio
+async def test_send_file_without_sendfile(tmp_path):
+    path = tmp_path / 'file'
+    path.write_bytes(b'x' * 100)
+    writer = MockWriter()
+    writer.transport = mock.MagicMock()
+    writer.transport.get_write_buffer_size.return_value = 0
+    conn = Connection(MockReader(), writer, mock.MagicMock())
+
+    # uvloop doesn't implement loop.sendfile()
+    loop = asyncio.get_running_loop()
+    with mock.patch.object(loop, 'sendfile', side_effect=NotImplementedError):
+        conn.send_file(1, path, 10, 50)
+        expected = Message.Header(id=1, size=50).pack() + b'x' * 50
+        while len(b''.join(writer.buffer)) < len(expected) and conn.isActive:
+            await asyncio.sleep(0.01)
+
+    assert conn.isActive
+    assert b''.join(writer.buffer) == expected
+
+
+@pytest.mark.asyncio
+async def test_packed_msgs_sent_in_order():
+    writer = MockWriter()
+    writer.transport = mock.MagicMock()
+    writer.transport.get_write_buffer_size.return_value = 0
+    conn = Connection(MockReader(), writer, mock.MagicMock())
+    msgs = [Message(Message.Header(id=i, size=1), payload=bytearray(b'x')) for i in range(5)]
+
+    # send task is idle once the first msg is written
+    conn.send(msgs[0])
+    while not conn._sendIdle:
+        await asyncio.sleep(0.01)
+
+    conn.send(msgs[1])
+    conn.send_packed(msgs[2].pack())
+    conn.send(msgs[3])
+    conn.send_packed(msgs[4].pack())
+
+    expected = b''.join(msg.pack() for msg in msgs)
+    while len(b''.join(writer.buffer)) < len(expected):
+        await asyncio.sleep(0.01)
+    assert b''.join(writer.buffer) == expected
+
+
+@pytest.mark.asyncio
+async def test_received_msgs_taken_from_pool():
+    msgs = [Message(Message.Header(id=i, size=1), payload=bytearray(b'x')) for i in range(3)]
+    reader = MockReader(*[m.pack() for m in msgs], asyncio.IncompleteReadError(b'', None))
+    writer = MockWriter()
+
+    received = []
+    class Owner(ConnOwner):
+        def process_msg(self, msg: OwnedMessage):
+            received.append((msg.msg, msg.msg.hdr.id))
+            msg.msg.release()
+
+    pool = MessagePool(maxSize=1)
+    conn = Connection(reader, writer, Owner(), pool)
+    conn.recv()
+    await conn.wait_closed()
+
+    # every msg is released before the next one is received, so the first one is reused
+    assert [id for _, id in received] == [0, 1, 2]
+    assert all(msg is received[0][0] for msg, _ in received)
+
+
+@pytest.mark.asyncio
+async def test_oversized_msg_not_sent(tmp_path):
+    writer = MockWriter()
+    conn = Connection(MockReader(), writer, mock.MagicMock())
+    size = Message.Header.SIZE_MASK + 1
+
+    with pytest.raises(ValueError):
+        conn.send(Message(Message.Header(id=1, size=size)))
+
+    path = tmp_path / "file"
+    path.write_bytes(b'x')
+    with pytest.raises(ValueError):
+        conn.send_file(1, path, count=size)
+
+    await asyncio.sleep(0.01)
+    assert not writer.buffer
+
+
+@pytest.mark.asyncio
+async def test_on_messages_receives_batch():
+    msgs = [Message(Message.Header(id=i, size=1), payload=bytearray(b'x')) for i in range(3)]
+    reader = MockReader(*[m.pack() for m in msgs], asyncio.IncompleteReadError(b'', None))
+    writer = MockWriter()
+
+    class App:
+        def __init__(self):
+            self.batches = []
+        def on_client_connect(self, client):
+            return True
+        def on_client_disconnect(self, client):
+            pass
+        def on_message(self, msg):
+            assert False, "on_message must not be called if on_messages is implemented"
+        def on_messages(self, batch):
+            self.batches.append([m.msg for m in batch])
+
+    app = App()
+    worker = ServerWorker(mock.MagicMock(), mock.MagicMock(writeHighWater=0, compressMinSize=0), app, multiprocessing.Event())
+    await asyncio.create_task(worker._process_new_connection(reader, writer))
+
+    while len(worker._connections):
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0)
+
+    assert sum(app.batches, []) == msgs
+    assert len(app.batches) < len(msgs)
+
+
+class AsyncApp:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.running = 0
+        self.maxRunning = 0
+        self.handled = []
+        self.disconnected = False
+
+    async def on_client_connect(self, client):
+        await asyncio.sleep(0)
+        return True
+
+    async def on_client_disconnect(self, client):
+        # every msg received before the disconnect has been handled
+        assert len(self.handled) == 4
+        self.disconnected = True
+
+    async def on_message(self, msg):
+        self.running += 1
+        self.maxRunning = max(self.maxRunning, self.running)
+        # the first msgs take longer, so they would finish last if run concurrently
+        await asyncio.sleep(self.delay * (4 - msg.msg.hdr.id))
+        self.running -= 1
+        self.handled.append(msg.msg.hdr.id)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("concurrency", [1, 2])
+async def test_async_callbacks(concurrency):
+    msgs = [Message(Message.Header(id=i, size=1), payload=bytearray(b'x')) for i in range(4)]
+    reader = MockReader(*[m.pack() for m in msgs], asyncio.IncompleteReadError(b'', None))
+    writer = MockWriter()
+
+    app = AsyncApp(0.02)
+    worker = ServerWorker(mock.MagicMock(), mock.MagicMock(messageConcurrency=concurrency, writeHighWater=0, compressMinSize=0), 
+                          app, multiprocessing.Event())
+    await asyncio.create_task(worker._process_new_connection(reader, writer))
+
+    while not app.disconnected:
+        await asyncio.sleep(0.01)
+
+    assert app.maxRunning == concurrency
+    if concurrency == 1:
+        assert app.handled == [0, 1, 2, 3]
+    else:
+        assert app.handled != [0, 1, 2, 3]
+    assert not worker._handlerQueues
+
+
+class OffloadApp:
+    def __init__(self):
+        self.threads = set()
+
+    def on_client_connect(self, client):
+        return True
+
+    def on_client_disconnect(self, client):
+        pass
+
+    @offload
+    def on_message(self, msg):
+        self.threads.add(threading.get_ident())
+        # the first msgs take longer, replies still must be sent in order
+        time.sleep(0.02 * (4 - msg.msg.hdr.id))
+        return Message(Message.Header(id=msg.msg.hdr.id))
+
+
+@pytest.mark.asyncio
+async def test_offloaded_on_message():
+    msgs = [Message(Message.Header(id=i, size=1), payload=bytearray(b'x')) for i in range(4)]
+    reader = MockReader(*[m.pack() for m in msgs])
+    writer = MockWriter()
+
+    app = OffloadApp()
+    config = mock.MagicMock(messageConcurrency=4, offloadThreads=4, offloadQueueSize=4, writeHighWater=0, compressMinSize=0)
+    worker = ServerWorker(mock.MagicMock(), config, app, multiprocessing.Event())
+    await asyncio.create_task(worker._process_new_connection(reader, writer))
+
+    expected = b''.join(Message(Message.Header(id=i)).pack() for i in range(4))
+    while len(b''.join(writer.buffer)) < len(expected):
+        await asyncio.sleep(0.01)
+
+    assert b''.join(writer.buffer) == expected
+    assert len(app.threads) > 1 and threading.get_ident() not in app.threads
+    worker._offloadPool.shutdown()
+
+
+def test_async_handler_cant_be_offloaded():
+    with pytest.raises(TypeError):
+        offload(AsyncApp.on_message)
\ No newline at end of file
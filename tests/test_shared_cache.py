@@ -0,0 +1,99 @@
+import os
+import signal
+import pytest
+import multiprocessing
+
+from utils import run_server, run_client
+
+from netframe import SharedCache, Message, OwnedMessage, ServerApp, ContextT, Config
+
+
+def test_get_set_delete():
+    cache = SharedCache(64*1024)
+
+    assert cache.get("missing") is None
+    cache.set("key", b"value")
+    cache.set(b"large", bytes(range(256)) * 8)
+    assert cache.get(b"key") == b"value"
+    assert cache.get("large") == bytes(range(256)) * 8
+    assert "key" in cache and len(cache) == 2
+
+    cache.set("key", b"")
+    assert cache.get("key") == b""
+    assert cache.delete("key") and not cache.delete("key")
+    assert cache.get("key", b"default") == b"default"
+
+    stats = cache.stats()
+    assert (stats.entries, stats.hits, stats.misses) == (1, 3, 2)
+    with pytest.raises(ValueError):
+        cache.set("huge", bytes(64*1024))
+    cache.release(unlink=True)
+
+
+def test_least_recently_used_is_evicted():
+    # one stripe of 8 blocks, every entry takes 2 of them
+    cache = SharedCache(8*64, stripes=1, blockSize=64)
+    for i in range(4):
+        cache.set(f"key{i}", bytes(100))
+    cache.get("key0")
+    cache.set("key4", bytes(100))
+
+    assert "key1" not in cache
+    assert all(f"key{i}" in cache for i in (0, 2, 3, 4))
+    assert cache.stats().evictions == 1
+    cache.release(unlink=True)
+
+
+def fill(cache: SharedCache):
+    for i in range(100):
+        cache.set(f"key{i}", b"%d" % i * 100)
+
+
+def test_shared_between_processes():
+    cache = SharedCache(1024*1024)
+    proc = multiprocessing.Process(target=fill, args=(cache,))
+    proc.start()
+    proc.join()
+
+    assert all(cache.get(f"key{i}") == b"%d" % i * 100 for i in range(100))
+    cache.release(unlink=True)
+
+
+class cache_app(ServerApp):
+    def __init__(self, context: ContextT):
+        self.cache = context[SharedCache.CONTEXT_KEY]
+
+    def on_message(self, msg: OwnedMessage):
+        self.cache.set(str(msg.msg.hdr.id), msg.msg.pop(msg.msg.hdr.size))
+        msg.owner.send(msg.msg)
+
+
+def test_cache_in_context():
+    with run_server(Config(cache_app, workerNum=2, sharedCacheSize=1024*1024)) as server, run_client() as client:
+        msg = Message()
+        msg.hdr.id = 7
+        msg.append(b"cached")
+        client.send(msg)
+        client.recv(timeout=10)
+
+        assert server.shared_cache().get("7") == b"cached"
+
+
+def hold_lock_and_die(cache: SharedCache):
+    cache._locks[0].acquire()
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def test_lock_of_killed_process_times_out():
+    cache = SharedCache(64*1024, stripes=1, lockTimeout=0.2)
+    cache.set("key", b"value")
+    proc = multiprocessing.Process(target=hold_lock_and_die, args=(cache,))
+    proc.start()
+    proc.join()
+    assert proc.exitcode == -signal.SIGKILL
+
+    with pytest.raises(TimeoutError):
+        cache.get("key")
+    with pytest.raises(TimeoutError):
+        cache.set("key", b"other")
+    cache.release(unlink=True)
\ No newline at end of file
@@ -0,0 +1,88 @@
+import pytest
+import threading
+
+from netframe.shm_ring import ShmPipe
+
+
+def test_wraps_around():
+    reader, writer = ShmPipe(16)
+    buf = memoryview(bytearray(16))
+
+    received = b''
+    for i in range(10):
+        data = bytes([i]) * 11
+        writer.write([data[:5], data[5:]])
+        n = reader.read_into(buf)
+        received += buf[:n]
+        if n < len(data):
+            n = reader.read_into(buf)
+            received += buf[:n]
+
+    assert received == b''.join(bytes([i]) * 11 for i in range(10))
+    reader.release(unlink=True)
+    writer.release()
+
+
+def test_data_larger_than_ring():
+    reader, writer = ShmPipe(64)
+    data = bytes(range(256)) * 64
+
+    def write():
+        writer.write([data])
+        writer.close()
+    thread = threading.Thread(target=write)
+    thread.start()
+
+    received = bytearray()
+    buf = memoryview(bytearray(100))
+    while n := reader.read_into(buf, timeout=10):
+        received += buf[:n]
+    thread.join()
+
+    assert received == data
+    reader.release(unlink=True)
+    writer.release()
+
+
+def test_nonblocking_and_close():
+    reader, writer = ShmPipe(8)
+    buf = memoryview(bytearray(8))
+
+    with pytest.raises(TimeoutError):
+        reader.read_into(buf, timeout=0)
+    assert reader.try_read_into(buf) is None
+
+    rest = writer.try_write([b'0123456789'])
+    assert bytes(b''.join(rest)) == b'89'
+    assert reader.try_read_into(buf) == 8
+    assert writer.try_write(rest) == []
+
+    reader.close()
+    with pytest.raises(BrokenPipeError):
+        writer.write([b'x'])
+    assert reader.read_into(buf) == 0
+
+    reader.release(unlink=True)
+    writer.release()
+
+
+def test_whole_frames():
+    reader, writer = ShmPipe(16)
+    buf = memoryview(bytearray(16))
+
+    frames = [[b'abc', b'de'], [b'fghij'], [b'klmnopq']]
+    # the third frame doesn't fit, so it isn't written even partially
+    assert writer.try_write_frames(frames) == 2
+    assert writer.try_write_frames(frames[2:]) == 0
+    assert reader.try_read_into(buf) == 10
+    assert bytes(buf[:10]) == b'abcdefghij'
+
+    # reader has freed the space, the frame fits now
+    assert writer.try_write_frames(frames[2:]) == 1
+    writer.try_write_frames([[b'rest']])
+    # data left by the previous reader is dropped
+    reader.skip()
+    assert reader.try_read_into(buf) is None
+
+    reader.release(unlink=True)
+    writer.release()
\ No newline at end of file
@@ -0,0 +1,134 @@
+import socket
+import asyncio
+import hashlib
+import pytest
+
+from utils import run_server, run_client, recv_exactly, TEST_IP, TEST_PORT
+
+from netframe import Config, ServerApp, ContextT, Message, OwnedMessage, RECV_ENGINE
+
+
+class test_streaming_app(ServerApp):
+    def __init__(self, context: ContextT):
+        self.hashes = {}
+        self.chunks = 0
+
+    def on_message(self, msg: OwnedMessage):
+        msg.owner.send(msg.msg)
+
+    def on_message_start(self, msg: OwnedMessage):
+        assert msg.msg.payload == bytearray()
+        self.hashes[msg.owner] = hashlib.sha256()
+
+    def on_message_chunk(self, msg: OwnedMessage, chunk: bytes):
+        self.hashes[msg.owner].update(chunk)
+        self.chunks += 1
+
+    def on_message_end(self, msg: OwnedMessage):
+        # reply with the digest of the payload and the number of chunks it came in
+        reply = Message(Message.Header(id=msg.msg.hdr.id))
+        reply.append(self.hashes.pop(msg.owner).digest())
+        reply.append(self.chunks.to_bytes(4, 'little'))
+        msg.reply(reply)
+
+
+class test_async_streaming_app(test_streaming_app):
+    async def on_message_chunk(self, msg: OwnedMessage, chunk: bytes):
+        # the next chunk isn't read until this one is handled
+        await asyncio.sleep(0)
+        super().on_message_chunk(msg, chunk)
+
+
+@pytest.mark.parametrize("recvEngine", (RECV_ENGINE.STREAM, RECV_ENGINE.BUFFERED))
+@pytest.mark.parametrize("app", (test_streaming_app, test_async_streaming_app))
+def test_large_payload_streamed(app: type, recvEngine: RECV_ENGINE):
+    config = Config(app, recvEngine=recvEngine, streamThreshold=64*1024)
+    payload = bytes(range(256)) * 32 * 1024
+
+    with run_server(config):
+        with run_client() as client:
+            small = Message(Message.Header(id=1))
+            small.append(b'small')
+            large = Message(Message.Header(id=2))
+            large.append(payload)
+
+            client.send(small)
+            client.send(large)
+            client.send(small)
+
+            assert client.recv(timeout=10) == small
+            reply = client.recv(timeout=10)
+            assert reply.hdr.id == 2
+            assert reply.payload[:32] == hashlib.sha256(payload).digest()
+            assert int.from_bytes(reply.payload[32:], 'little') > 1
+            assert client.recv(timeout=10) == small
+
+
+class test_async_echo_streaming_app(test_streaming_app):
+    async def on_message(self, msg: OwnedMessage):
+        await asyncio.sleep(0.2)
+        msg.owner.send(msg.msg)
+
+
+@pytest.mark.parametrize("recvEngine", (RECV_ENGINE.STREAM, RECV_ENGINE.BUFFERED))
+def test_streamed_msg_waits_for_handlers(recvEngine: RECV_ENGINE):
+    config = Config(test_async_echo_streaming_app, recvEngine=recvEngine, streamThreshold=64*1024)
+
+    with run_server(config):
+        with run_client() as client:
+            small = Message(Message.Header(id=1))
+            small.append(b'small')
+            large = Message(Message.Header(id=2))
+            large.append(b'x' * 256 * 1024)
+
+            client.send(small)
+            client.send(large)
+            client.send(small)
+
+            # on_message_end() replies at once, still after the slow handler of the first msg
+            assert client.recv(timeout=10) == small
+            assert client.recv(timeout=10).hdr.id == 2
+            assert client.recv(timeout=10) == small
+
+
+class test_batch_streaming_app(test_streaming_app):
+    def __init__(self, context: ContextT):
+        super().__init__(context)
+        self.seen = bytearray()
+
+    def on_messages(self, batch: list[OwnedMessage]):
+        self.seen += bytes(msg.msg.hdr.id for msg in batch)
+
+    def on_message_start(self, msg: OwnedMessage):
+        self.seenAtStart = bytes(self.seen)
+
+    def on_message_chunk(self, msg: OwnedMessage, chunk: bytes): ...
+
+    def on_message_end(self, msg: OwnedMessage):
+        # reply with ids of the msgs handled before the streamed one
+        reply = Message(Message.Header(id=msg.msg.hdr.id))
+        reply.append(self.seenAtStart)
+        msg.reply(reply)
+
+
+class test_async_batch_streaming_app(test_batch_streaming_app):
+    async def on_messages(self, batch: list[OwnedMessage]):
+        await asyncio.sleep(0.2)
+        super().on_messages(batch)
+
+
+@pytest.mark.parametrize("recvEngine", (RECV_ENGINE.STREAM, RECV_ENGINE.BUFFERED))
+@pytest.mark.parametrize("app", (test_batch_streaming_app, test_async_batch_streaming_app))
+def test_streamed_msg_waits_for_batch(app: type, recvEngine: RECV_ENGINE):
+    config = Config(app, recvEngine=recvEngine, streamThreshold=64*1024)
+
+    with run_server(config):
+        with socket.create_connection((TEST_IP, TEST_PORT), timeout=10) as sock:
+            large = Message(Message.Header(id=0xff))
+            large.append(b'x' * 256 * 1024)
+            # one write, so the batch and the streamed msg are parsed out of the same read
+            sock.sendall(b''.join(Message(Message.Header(id=i)).pack() for i in range(1, 4)) + large.pack())
+
+            hdr = Message.Header()
+            hdr.unpack(recv_exactly(sock, Message.Header.HEADER_LEN))
+            assert recv_exactly(sock, hdr.size) == bytes([1, 2, 3])
@@ -0,0 +1,96 @@
+import pytest
+
+from contextlib import ExitStack
+
+from utils import run_server, run_client
+
+from netframe import Server, Client, Message, OwnedMessage, ServerApp, ContextT, Config
+
+
+SUBSCRIBE = 1
+UNSUBSCRIBE = 2
+PUBLISH = 3
+PUBLISHED = 4
+WORKER = 5
+
+
+class topics_app(ServerApp):
+    def __init__(self, context: ContextT): ...
+
+    def on_message(self, msg: OwnedMessage):
+        id = msg.msg.hdr.id
+        if id == SUBSCRIBE:
+            msg.owner.subscribe(msg.msg.pop(msg.msg.hdr.size).decode())
+        elif id == UNSUBSCRIBE:
+            msg.owner.unsubscribe(msg.msg.pop(msg.msg.hdr.size).decode())
+        elif id == PUBLISH:
+            # topic, then the data published to it
+            topic, data = bytes(msg.msg.pop(msg.msg.hdr.size)).split(b':', 1)
+            published = Message()
+            published.hdr.id = PUBLISHED
+            published.append(data)
+            Server.publish(topic.decode(), published)
+        elif id == WORKER:
+            reply = Message()
+            reply.hdr.id = WORKER
+            reply.append(b'%d' % (msg.owner.id >> 48))
+            msg.owner.send(reply)
+
+
+def request(client: Client, id: int, data: bytes=b''):
+    msg = Message()
+    msg.hdr.id = id
+    msg.append(data)
+    client.send(msg)
+
+
+def worker_of(client: Client) -> int:
+    request(client, WORKER)
+    msg = client.recv(timeout=10)
+    return int(msg.pop(msg.hdr.size))
+
+
+def test_publish_to_subscribers_of_all_workers():
+    config = Config(topics_app, workerNum=2, acceptPauseConnections=1, busCapacity=4096)
+    with run_server(config), ExitStack() as stack:
+        clients = []
+        workers = set()
+        # a worker stops accepting once it has a connection, so clients land 
+        # on different workers, as soon as both of them are up
+        while len(workers) < 2 or len(clients) < 3:
+            assert len(clients) < 16
+            client = stack.enter_context(run_client())
+            clients.append(client)
+            workers.add(worker_of(client))
+
+        subscribers, other = clients[:-1], clients[-1]
+        for client in subscribers:
+            request(client, SUBSCRIBE, b'news')
+            # make sure the subscription is done before anything is published
+            worker_of(client)
+        request(other, SUBSCRIBE, b'sports')
+        worker_of(other)
+
+        request(other, PUBLISH, b'news:hello')
+        request(other, PUBLISH, b'nobody:listens')
+        for client in subscribers:
+            msg = client.recv(timeout=10)
+            assert msg.hdr.id == PUBLISHED
+            assert msg.pop(msg.hdr.size) == b'hello'
+
+        request(subscribers[0], UNSUBSCRIBE, b'news')
+        worker_of(subscribers[0])
+        request(other, PUBLISH, b'news:again')
+        request(other, PUBLISH, b'sports:score')
+        for client in subscribers[1:]:
+            assert client.recv(timeout=10).pop(5) == b'again'
+        assert other.recv(timeout=10).pop(5) == b'score'
+
+        # only the msg published to the topic that is still subscribed arrives
+        request(subscribers[0], WORKER)
+        assert subscribers[0].recv(timeout=10).hdr.id == WORKER
+
+
+def test_publish_outside_worker():
+    with pytest.raises(RuntimeError):
+        Server.publish("news", Message())
\ No newline at end of file
@@ -1,3 +1,4 @@
+import socket
 import asyncio
 import threading
 import multiprocessing
@@ -53,6 +54,10 @@ class MockWriter:
         assert self.closed == False
         self.buffer += [data]
 
+    def writelines(self, data: list[bytes]):
+        assert self.closed == False
+        self.buffer += [b''.join(data)]
+
     async def drain(self):
         pass
 
@@ -119,4 +124,14 @@ def client():
 
 @contextmanager
 def run_client():
-    yield from client()
\ No newline at end of file
+    yield from client()
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionResetError("Connection closed")
+        data += chunk
+    return bytes(data)